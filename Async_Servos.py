@@ -0,0 +1,172 @@
+'''
+asyncio version of the servo API in "Robotic_Servos.py".
+
+All coroutines go through one AsyncPortHandler per port, which queues the
+transactions and runs them one after another, so telemetry polling and motion
+commands can share a bus from many tasks without COMM_PORT_BUSY errors and
+without run_in_executor.
+
+example:
+    aport = await open_async_port("COM5")
+    servo = Async_Robotis_Servo(aport, 2)
+    await servo.goto(1500)
+    position, load = await asyncio.gather(servo.read_current_pos(), servo.read_load())
+'''
+
+import logging
+
+from Robotic_Servos import *
+
+logger = logging.getLogger(__name__)
+
+async def open_async_port(PORT_NUM):
+    # open the port and start its transaction queue
+    port = openport(PORT_NUM)
+    aport = AsyncPortHandler(port, openpacket())
+    await aport.start()
+    return aport
+
+
+async def sync_write_goal_async(aport, goals):
+    '''Asynchronous sync_write_goal, goals : dict of {servo_id: (position, speed, torque)}'''
+    data = {}
+    for servo_id, (position, speed, torque) in goals.items():
+        data[servo_id] = [DXL_LOBYTE(position), DXL_HIBYTE(position),
+                          DXL_LOBYTE(speed), DXL_HIBYTE(speed),
+                          DXL_LOBYTE(torque), DXL_HIBYTE(torque)]
+    dxl_comm_result = await aport.sync_write(ADDR_MX_GOAL_POSITION, 6, data)
+    if dxl_comm_result != COMM_SUCCESS:
+        logger.warning("%s", aport.ph.getTxRxResult(dxl_comm_result))
+        return False
+    return True
+
+
+async def bulk_read_status_async(aport, servo_ids):
+    '''Asynchronous bulk_read_status, same return value'''
+    data, dxl_comm_result = await aport.bulk_read([(servo_id, ADDR_MX_PRESENT_POSITION, MX_STATE_LENGTH) for servo_id in servo_ids])
+    if dxl_comm_result != COMM_SUCCESS:
+        logger.warning("%s", aport.ph.getTxRxResult(dxl_comm_result))
+        return None
+
+    status = {}
+    for servo_id in servo_ids:
+        block = data[servo_id]
+        status[servo_id] = {
+            'position': DXL_MAKEWORD(block[0], block[1]),
+            'speed': DXL_MAKEWORD(block[2], block[3]),
+            'load': DXL_MAKEWORD(block[4], block[5]),
+            'voltage': block[6] / 10.,
+            'moving': block[ADDR_MX_MOVING - ADDR_MX_PRESENT_POSITION],
+        }
+    return status
+
+
+class Async_Robotis_Servo():
+    def __init__(self, aport, servo_id, servo=None):
+        '''
+        Parameters
+        ----------
+        aport : AsyncPortHandler from open_async_port
+        servo_id : servo's ID, you can check it from dynamixel wizard.
+        servo : optional Robotis_Servo of the same servo, its control table shadow is shared
+        '''
+        self.aport = aport
+        self.servo_id = servo_id
+        # the shadow of the control table lives in a Robotis_Servo
+        self.servo = servo if servo is not None else Robotis_Servo(aport.port, aport.ph, servo_id)
+
+    # The following functions access the control table through the shadow
+    async def read_register(self, address, length):
+        if self.servo.is_cached(address, length):
+            return self.servo.shadow_value(address, length)
+        data, dxl_result, dxl_error = await self.aport.read(self.servo_id, address, length)
+        if self.servo.check_com(dxl_result, dxl_error):
+            self.servo.update_shadow(address, data)
+            return data[0] if length == 1 else DXL_MAKEWORD(data[0], data[1])
+
+    async def write_register(self, address, length, value):
+        data = [DXL_LOBYTE(value), DXL_HIBYTE(value)][:length]
+        if self.servo.is_cached(address, length) and list(self.servo.shadow[address:address + length]) == data:
+            return 1
+        dxl_result, dxl_error = await self.aport.write(self.servo_id, address, data)
+        if self.servo.check_com(dxl_result, dxl_error):
+            self.servo.update_shadow(address, data)
+            return 1
+        self.servo.invalidate_cache(address, length)
+        return 0
+
+    # The following function can be applied to check the status of the servo
+    async def read_current_pos(self):
+        return await self.read_register(ADDR_MX_PRESENT_POSITION, 2)
+
+    async def read_goal_position(self):
+        return await self.read_register(ADDR_MX_GOAL_POSITION, 2)
+
+    async def is_moving(self):
+        return await self.read_register(ADDR_MX_MOVING, 1)
+
+    async def read_voltage(self):
+        dxl_voltage = await self.read_register(ADDR_MX_VOLTAGE, 1)
+        if dxl_voltage is not None:
+            return dxl_voltage / 10.
+
+    async def read_load(self):
+        # load (0~1023), negative in the CW direction
+        dxl_load = await self.read_register(ADDR_MX_LOAD, 2)
+        if dxl_load is not None:
+            return decode_load(dxl_load)
+
+    async def read_speed(self):
+        # speed in rpm, negative in the CW direction
+        dxl_speed = await self.read_register(ADDR_MX_SPEED, 2)
+        if dxl_speed is not None:
+            return decode_speed(dxl_speed)
+
+    # The following function can be applied for movement
+    async def check_move_mode(self):
+        cw_limit = await self.read_register(ADDR_MX_CW_LIMIT, 2)
+        ccw_limit = await self.read_register(ADDR_MX_CCW_LIMIT, 2)
+        if cw_limit is None or ccw_limit is None:
+            return None
+
+        if cw_limit==0 and ccw_limit==0:
+            return "wheel"
+
+        if cw_limit>0 and cw_limit<4095 and ccw_limit>0 and ccw_limit<4095:
+            return "joint"
+
+        if cw_limit==4095 and ccw_limit==4095:
+            return "multiturn"
+
+    async def goto(self, position):
+        mode = await self.check_move_mode()
+        if mode=='wheel':
+            logger.error("goto function cannot be applied on wheel mode, please change to another mode")
+        elif mode=='joint':
+            cw_limit = await self.read_register(ADDR_MX_CW_LIMIT, 2)
+            ccw_limit = await self.read_register(ADDR_MX_CCW_LIMIT, 2)
+            if position>max(cw_limit,ccw_limit) or position<min(cw_limit,ccw_limit):
+                logger.error("The input position value is invalid, which is out of the range of cw and ccw angle limit")
+            else:
+                return await self.write_register(ADDR_MX_GOAL_POSITION, 2, position)
+        elif mode=='multiturn':
+            if position>28672 or position<-28672:
+                logger.error("The input position is invalid, which is out of range, valid range is -28672~28672")
+            else:
+                return await self.write_register(ADDR_MX_GOAL_POSITION, 2, position)
+        return 0
+
+    async def set_speed(self, speed):
+        # moving speed in joint and multi-turn mode, 0~1023
+        if speed<0 or speed>1023:
+            logger.error("Input speed is not valid, which is out of range. The valid range is [0,1023]")
+            return 0
+        return await self.write_register(ADDR_MX_MOVING_SPEED, 2, speed)
+
+    async def enable_torque(self):
+        if await self.write_register(ADDR_MX_TORQUE_ENABLE, 1, 1) == 0:
+            logger.error("Unable to enable torque")
+
+    async def disable_torque(self):
+        if await self.write_register(ADDR_MX_TORQUE_ENABLE, 1, 0) == 0:
+            logger.error("Unable to disable torque")
@@ -0,0 +1,367 @@
+'''
+Thread-safe scheduler for a serial bus shared by several threads.
+
+Bus_Scheduler owns a PortHandler and runs every transaction on one bus
+thread. Stop commands go first, then motion commands, then telemetry. Reads
+queued from different threads are coalesced into one BULK_READ (one READ if
+they all target the same servo). Queue depth and wait time are exposed by
+metrics().
+
+The easiest way to use it is through its packet handler proxy, which can be
+given to Robotis_Servo in place of the packet handler:
+
+    scheduler = Bus_Scheduler(openport("COM5"), openpacket())
+    servo = Robotis_Servo(scheduler.port, scheduler.packet_handler(), 2)
+    # servo can now be used from any thread, e.g. read_load() in a telemetry
+    # thread while the main thread calls goto()
+
+A function run by the scheduler (see submit) may use the proxy too: calls from
+the bus thread run at once instead of waiting for the bus thread itself.
+Split transactions (e.g. bulkReadTx then readRx) must be made inside one such
+function, so nothing else gets on the bus between them.
+
+acquire_port/release_port keep one opened port and scheduler per port number
+for the whole process, so grippers on the same port share them:
+
+    shared = acquire_port("COM5")
+    servo = Robotis_Servo(shared.port, shared.scheduler.packet_handler(), 2)
+    ...
+    release_port(shared)  # the port is closed when its last user releases it
+'''
+
+import heapq
+import threading
+import time
+import collections
+from concurrent.futures import Future
+
+from Robotic_Servos import *
+
+PRIORITY_STOP = 0
+PRIORITY_MOTION = 1
+PRIORITY_TELEMETRY = 2
+PRIORITY_NAMES = {PRIORITY_STOP: 'stop', PRIORITY_MOTION: 'motion', PRIORITY_TELEMETRY: 'telemetry'}
+
+WAIT_SAMPLES = 1000  # wait times kept per priority for the percentiles
+
+# packet handler methods that don't use the bus, Scheduled_Packet calls them directly
+LOCAL_METHODS = ('getProtocolVersion', 'getTxRxResult', 'getRxPacketError', 'makeTxPacket', 'getTxTemplate',
+                 'patchTxTemplate', 'parseRxPacket', 'isReadStatus', 'getStatsIds')
+
+
+class Bus_Scheduler():
+    def __init__(self, port, packet):
+        '''
+        Parameters
+        ----------
+        port : the opened port from openport, only the scheduler may use it from now on
+        packet : the packet handler from openpacket
+        '''
+        self.port = port
+        self.packet = packet
+        self.condition = threading.Condition()
+        self.jobs = []  # heap of (priority, sequence, enqueue time, func, future)
+        self.reads = []  # pending telemetry reads: (enqueue time, servo_id, address, length, future)
+        self.sequence = 0
+        self.running = True
+
+        self.max_queue_depth = 0
+        self.bus_transactions = 0
+        self.coalesced_reads = 0
+        self.wait_times = dict((priority, collections.deque(maxlen=WAIT_SAMPLES)) for priority in PRIORITY_NAMES)
+        self.wait_counts = dict((priority, 0) for priority in PRIORITY_NAMES)
+
+        self.thread = threading.Thread(target=self.serve, name="Bus_Scheduler %s" % port.getPortName())
+        self.thread.daemon = True
+        self.thread.start()
+
+    def close(self):
+        # cancel the queued transactions, the one on the bus finishes first
+        with self.condition:
+            self.running = False
+            for job in self.jobs:
+                job[-1].cancel()
+            for read in self.reads:
+                read[-1].cancel()
+            self.jobs = []
+            self.reads = []
+            self.condition.notify()
+        self.thread.join()
+
+    def closed_error(self):
+        return IOError("Bus_Scheduler of %s is closed" % self.port.getPortName())
+
+    # The following functions queue transactions
+    def submit(self, func, priority=PRIORITY_MOTION):
+        '''Run func(port, packet) on the bus thread, return a Future of its result.
+        The future fails with IOError once the scheduler is closed.'''
+        future = Future()
+        if self.on_bus_thread():
+            # called from a job, which already has the bus
+            self.run_job(func, future)
+            return future
+        with self.condition:
+            if not self.running:
+                future.set_exception(self.closed_error())
+                return future
+            self.sequence += 1
+            heapq.heappush(self.jobs, (priority, self.sequence, time.monotonic(), func, future))
+            self.track_depth()
+            self.condition.notify()
+        return future
+
+    def call(self, func, priority=PRIORITY_MOTION):
+        # submit and wait for the result
+        return self.submit(func, priority).result()
+
+    def submit_read(self, servo_id, address, length):
+        '''Queue a telemetry read, return a Future of (data, result, error).'''
+        future = Future()
+        if self.on_bus_thread():
+            self.run_reads([(time.monotonic(), servo_id, address, length, future)])
+            return future
+        with self.condition:
+            if not self.running:
+                future.set_exception(self.closed_error())
+                return future
+            self.reads.append((time.monotonic(), servo_id, address, length, future))
+            self.track_depth()
+            self.condition.notify()
+        return future
+
+    def read(self, servo_id, address, length):
+        return self.submit_read(servo_id, address, length).result()
+
+    def packet_handler(self):
+        return Scheduled_Packet(self)
+
+    def on_bus_thread(self):
+        return threading.current_thread() is self.thread
+
+    # The following functions run on the bus thread
+    def serve(self):
+        while True:
+            with self.condition:
+                while self.running and not self.jobs and not self.reads:
+                    self.condition.wait()
+                if not self.running:
+                    break
+                if self.jobs:
+                    priority, _, enqueue_time, func, future = heapq.heappop(self.jobs)
+                    reads = None
+                else:
+                    reads, self.reads = self.reads, []
+
+            if reads is None:
+                self.record_wait(priority, enqueue_time)
+                self.run_job(func, future)
+                self.bus_transactions += 1
+            else:
+                self.run_reads(reads)
+
+    def run_job(self, func, future):
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(func(self.port, self.packet))
+            except Exception as e:
+                future.set_exception(e)
+
+    def run_reads(self, reads):
+        # serve all pending reads with one READ or one BULK_READ
+        spans = collections.OrderedDict()  # servo_id -> [start address, end address]
+        for enqueue_time, servo_id, address, length, future in reads:
+            self.record_wait(PRIORITY_TELEMETRY, enqueue_time)
+            span = spans.setdefault(servo_id, [address, address + length])
+            span[0] = min(span[0], address)
+            span[1] = max(span[1], address + length)
+
+        if len(spans) == 1:
+            servo_id, (start, end) = list(spans.items())[0]
+            data, dxl_result, dxl_error = self.packet.readTxRx(self.port, servo_id, start, end - start)
+            replies = {servo_id: (data, dxl_result, dxl_error)}
+        else:
+            replies = self.bulk_read(spans)
+            self.retry_replies(spans, replies)
+        self.bus_transactions += 1
+        self.coalesced_reads += len(reads) - 1
+
+        for enqueue_time, servo_id, address, length, future in reads:
+            data, dxl_result, dxl_error = replies[servo_id]
+            offset = address - spans[servo_id][0]
+            if future.set_running_or_notify_cancel():
+                future.set_result((list(data[offset:offset + length]) if dxl_result == COMM_SUCCESS else [],
+                                   dxl_result, dxl_error))
+
+    def bulk_read(self, spans):
+        # return {servo_id: (data, result, error)}
+        param = []
+        for servo_id, (start, end) in spans.items():
+            param.extend([end - start, servo_id, start])
+
+        replies = {}
+        dxl_result = self.packet.bulkReadTx(self.port, param, len(param))
+        for servo_id, (start, end) in spans.items():
+            if dxl_result == COMM_SUCCESS:
+                data, dxl_result, dxl_error = self.packet.readRx(self.port, servo_id, end - start)
+                replies[servo_id] = (bytes(data), dxl_result, dxl_error)
+            else:
+                replies[servo_id] = ([], dxl_result, 0)
+        self.port.is_using = False
+        return replies
+
+    def retry_replies(self, spans, replies):
+        # read a lost or corrupted reply of a BULK_READ again on its own, with the retries of readTxRx
+        policy = self.port.retry_policy
+        if policy is None:
+            return
+        for servo_id, (start, end) in spans.items():
+            data, dxl_result, dxl_error = replies[servo_id]
+            if policy.isRetryable(INST_READ, dxl_result, dxl_error):
+                self.port.packet_stats.addRetry(servo_id, INST_BULK_READ)
+                self.port.resyncPort()
+                data, dxl_result, dxl_error = self.packet.readTxRx(self.port, servo_id, start, end - start)
+                replies[servo_id] = (bytes(data), dxl_result, dxl_error)
+                self.bus_transactions += 1
+
+    # The following functions collect the metrics
+    def track_depth(self):
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth())
+
+    def queue_depth(self):
+        return len(self.jobs) + len(self.reads)
+
+    def record_wait(self, priority, enqueue_time):
+        self.wait_times[priority].append(time.monotonic() - enqueue_time)
+        self.wait_counts[priority] += 1
+
+    def metrics(self):
+        '''Queue depth, bus usage and wait time (ms) per priority.'''
+        with self.condition:
+            metrics = {
+                'queue_depth': self.queue_depth(),
+                'max_queue_depth': self.max_queue_depth,
+                'bus_transactions': self.bus_transactions,
+                'coalesced_reads': self.coalesced_reads,
+                'wait_ms': {},
+            }
+            for priority, name in PRIORITY_NAMES.items():
+                samples = sorted(self.wait_times[priority])
+                if samples:
+                    metrics['wait_ms'][name] = {
+                        'count': self.wait_counts[priority],
+                        'mean': 1000.0 * sum(samples) / len(samples),
+                        'p50': 1000.0 * samples[len(samples) // 2],
+                        'p99': 1000.0 * samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+                        'max': 1000.0 * samples[-1],
+                    }
+                else:
+                    metrics['wait_ms'][name] = {'count': 0}
+        return metrics
+
+
+class Scheduled_Packet():
+    '''Packet handler proxy that sends every transaction through a Bus_Scheduler.
+
+    Reads are telemetry and can be coalesced, writes are motion commands,
+    disabling the torque (PT_O.stop) is a stop command. The other methods of
+    the packet handler run as motion commands, or directly if they don't use
+    the bus (LOCAL_METHODS).'''
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self.packet = scheduler.packet
+
+    def __getattr__(self, name):
+        # the rest of the packet handler API
+        method = getattr(self.packet, name)
+        if name in LOCAL_METHODS or not callable(method):
+            return method
+
+        def scheduled(port, *args):
+            return self.scheduler.call(lambda port, packet: getattr(packet, name)(port, *args))
+        return scheduled
+
+    def readTxRx(self, port, dxl_id, address, length):
+        return self.scheduler.read(dxl_id, address, length)
+
+    def read1ByteTxRx(self, port, dxl_id, address):
+        data, result, error = self.readTxRx(port, dxl_id, address, 1)
+        data_read = data[0] if (result == COMM_SUCCESS) else 0
+        return data_read, result, error
+
+    def read2ByteTxRx(self, port, dxl_id, address):
+        data, result, error = self.readTxRx(port, dxl_id, address, 2)
+        data_read = DXL_MAKEWORD(data[0], data[1]) if (result == COMM_SUCCESS) else 0
+        return data_read, result, error
+
+    def read4ByteTxRx(self, port, dxl_id, address):
+        data, result, error = self.readTxRx(port, dxl_id, address, 4)
+        data_read = DXL_MAKEDWORD(DXL_MAKEWORD(data[0], data[1]),
+                                  DXL_MAKEWORD(data[2], data[3])) if (result == COMM_SUCCESS) else 0
+        return data_read, result, error
+
+    def writeTxRx(self, port, dxl_id, address, length, data):
+        priority = PRIORITY_MOTION
+        if address == ADDR_MX_TORQUE_ENABLE and data[0] == 0:
+            priority = PRIORITY_STOP
+        return self.scheduler.call(lambda port, packet: packet.writeTxRx(port, dxl_id, address, length, data),
+                                   priority)
+
+    def write1ByteTxRx(self, port, dxl_id, address, data):
+        return self.writeTxRx(port, dxl_id, address, 1, [data])
+
+    def write2ByteTxRx(self, port, dxl_id, address, data):
+        return self.writeTxRx(port, dxl_id, address, 2, [DXL_LOBYTE(data), DXL_HIBYTE(data)])
+
+    def write4ByteTxRx(self, port, dxl_id, address, data):
+        return self.writeTxRx(port, dxl_id, address, 4, [DXL_LOBYTE(DXL_LOWORD(data)), DXL_HIBYTE(DXL_LOWORD(data)),
+                                                         DXL_LOBYTE(DXL_HIWORD(data)), DXL_HIBYTE(DXL_HIWORD(data))])
+
+    def regWriteTxRx(self, port, dxl_id, address, length, data):
+        return self.scheduler.call(lambda port, packet: packet.regWriteTxRx(port, dxl_id, address, length, data))
+
+    def action(self, port, dxl_id):
+        return self.scheduler.call(lambda port, packet: packet.action(port, dxl_id))
+
+    def ping(self, port, dxl_id):
+        return self.scheduler.call(lambda port, packet: packet.ping(port, dxl_id))
+
+    def syncWriteTxOnly(self, port, start_address, data_length, param, param_length):
+        return self.scheduler.call(lambda port, packet: packet.syncWriteTxOnly(port, start_address, data_length,
+                                                                               param, param_length))
+
+
+class Shared_Port():
+    # an opened port, its scheduler and the number of users, see acquire_port
+    def __init__(self, port_num):
+        self.port_num = port_num
+        self.port = openport(port_num)
+        if self.port is None:
+            raise IOError("Failed to open %s" % port_num)
+        self.packet = openpacket()
+        self.scheduler = Bus_Scheduler(self.port, self.packet)
+        self.users = 0
+
+
+PORT_REGISTRY = {}  # port number -> Shared_Port
+REGISTRY_LOCK = threading.Lock()
+
+
+def acquire_port(port_num):
+    # the Shared_Port of port_num, opened on first use
+    with REGISTRY_LOCK:
+        shared = PORT_REGISTRY.get(port_num)
+        if shared is None:
+            shared = PORT_REGISTRY[port_num] = Shared_Port(port_num)
+        shared.users += 1
+        return shared
+
+
+def release_port(shared):
+    # give back a Shared_Port from acquire_port, the last user closes the port
+    with REGISTRY_LOCK:
+        shared.users -= 1
+        if shared.users > 0:
+            return
+        del PORT_REGISTRY[shared.port_num]
+    shared.scheduler.close()
+    shared.port.closePort()
@@ -0,0 +1,220 @@
+'''
+Automatic baud rate and return delay tuning for the MX-28 servos on a port.
+
+The servos leave the factory at 57600 bps with a return delay of 250 (500 usec),
+both of which dominate the time of every transaction. This routine finds the
+servos at every baud rate (a broadcast ping, then a ping of every ID wherever
+the broadcast heard anything, since the replies of several servos collide), moves them to the fastest baud
+rate and the shortest return delay that pass a burst of checksum verified reads,
+and saves the result to BUS_SETTINGS_FILE, so openport reopens the port at the
+tuned baud rate.
+
+Run it like Calibaration.py and follow the instructions:
+    python Bus_Tuning.py
+'''
+
+from Robotic_Servos import *
+import os
+import time
+import logging
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Return delays to try, register values (2 usec each), shortest first
+RETURN_DELAYS = [0, 5, 25, 50, 125, 250]
+# Reads per servo that must all succeed for a setting to count as reliable
+VALIDATION_READS = 100
+# Broadcasts of a new baud rate, the servos switch right away and cannot confirm it
+BAUDRATE_WRITES = 3
+# Unicast writes of the new baud rate to a servo that missed the broadcasts
+BAUDRATE_RETRIES = 3
+SETTLE_TIME = 0.05
+# IDs pinged one by one when a broadcast ping heard something, 0~253
+SCAN_IDS = range(BROADCAST_ID)
+
+
+def mx_baudrates():
+    # baud rates of the port handler that an MX-28 can run at, fastest first
+    return sorted([baudrate for baudrate in SUPPORTED_BAUDRATES if baudrate_to_register(baudrate) is not None],
+                  reverse=True)
+
+
+def scan_bus(port, packet, baudrates=None):
+    '''Find the servos at every baud rate.
+    In Protocol 1.0 all servos answer a broadcast ping at once and their replies collide, so
+    the broadcast only tells whether anything listens at a baud rate; if so every ID in
+    SCAN_IDS is pinged on its own.
+    return : {servo_id: baudrate}'''
+    found = {}
+    # a missing servo is the normal case here, retrying its ping would only slow the scan down
+    retry_policy = port.retry_policy
+    port.setRetryPolicy(None)
+    try:
+        for baudrate in (baudrates or mx_baudrates()):
+            port.setBaudRate(baudrate)
+            data_list, dxl_result = packet.broadcastPing(port)
+            if dxl_result == COMM_RX_TIMEOUT:
+                continue
+            servo_ids = set(data_list)
+            for servo_id in SCAN_IDS:
+                if servo_id in servo_ids or servo_id in found:
+                    continue
+                dxl_model, dxl_result, dxl_error = packet.ping(port, servo_id)
+                if dxl_result == COMM_SUCCESS:
+                    servo_ids.add(servo_id)
+            for servo_id in servo_ids:
+                found.setdefault(servo_id, baudrate)
+            if servo_ids:
+                logger.info("Found servo(s) %s at %d bps", sorted(servo_ids), baudrate)
+    finally:
+        port.setRetryPolicy(retry_policy)
+    return found
+
+
+def validate(port, packet, servo_ids, count=VALIDATION_READS):
+    # burst of state block reads, status packets with a wrong checksum are rejected by the
+    # packet handler and instruction packets with a wrong one are flagged by the servo
+    # return : number of failed reads
+    # the retries are turned off meanwhile, they would hide the failures
+    retry_policy = port.retry_policy
+    port.setRetryPolicy(None)
+    failures = 0
+    try:
+        for _ in range(count):
+            for servo_id in servo_ids:
+                data, dxl_result, dxl_error = packet.readTxRx(port, servo_id, ADDR_MX_PRESENT_POSITION, MX_STATE_LENGTH)
+                if dxl_result != COMM_SUCCESS or dxl_error & ERRBIT_CHECKSUM:
+                    failures += 1
+    finally:
+        port.setRetryPolicy(retry_policy)
+    return failures
+
+
+def ping_servos(port, packet, servo_ids, baudrate):
+    # the IDs of servo_ids that answer a ping at baudrate
+    port.setBaudRate(baudrate)
+    return set(servo_id for servo_id in servo_ids if packet.ping(port, servo_id)[1] == COMM_SUCCESS)
+
+
+def set_baudrate(port, packet, servo_ids, current, baudrate, broadcast=True):
+    '''Move servo_ids from current to baudrate, with broadcast all the servos listening at current.
+    The writes get no status packet, so every servo is pinged at baudrate
+    afterwards, and the ones still answering at current get the write again
+    on their own, up to BAUDRATE_RETRIES times.
+    return : the IDs of servo_ids that answer at baudrate, the port is left at baudrate'''
+    moved = set()
+    if broadcast:
+        port.setBaudRate(current)
+        for _ in range(BAUDRATE_WRITES):
+            packet.write1ByteTxOnly(port, BROADCAST_ID, ADDR_MX_BAUD_RATE, baudrate_to_register(baudrate))
+        time.sleep(SETTLE_TIME)
+        moved = ping_servos(port, packet, servo_ids, baudrate)
+
+    for _ in range(BAUDRATE_RETRIES):
+        stuck = ping_servos(port, packet, [servo_id for servo_id in servo_ids if servo_id not in moved], current)
+        if not stuck:
+            break
+        for servo_id in stuck:
+            packet.write1ByteTxOnly(port, servo_id, ADDR_MX_BAUD_RATE, baudrate_to_register(baudrate))
+        time.sleep(SETTLE_TIME)
+        moved |= ping_servos(port, packet, stuck, baudrate)
+    port.setBaudRate(baudrate)
+    return moved
+
+
+def tune_bus(port, packet, baudrates=None, return_delays=RETURN_DELAYS, count=VALIDATION_READS):
+    '''Move all servos on the port to the fastest reliable baud rate, then to the
+    shortest reliable return delay.
+    return : baud rate, return delay register value, (None, None) if no reliable baud rate was found'''
+    found = scan_bus(port, packet, baudrates)
+    if not found:
+        logger.error("No servo found on %s", port.getPortName())
+        return None, None
+    servo_ids = sorted(found)
+
+    tuned_baudrate = None
+    for baudrate in (baudrates or mx_baudrates()):
+        previous = dict(found)
+        for current in set(previous.values()):
+            if current != baudrate:
+                ids = [servo_id for servo_id in servo_ids if previous[servo_id] == current]
+                for servo_id in set_baudrate(port, packet, ids, current, baudrate):
+                    found[servo_id] = baudrate
+        port.setBaudRate(baudrate)
+
+        split = [servo_id for servo_id in servo_ids if found[servo_id] != baudrate]
+        if split:
+            # don't leave the bus split across two baud rates, move the others back
+            logger.warning("Servo(s) %s did not switch to %d bps, moving the others back", split, baudrate)
+            for servo_id in servo_ids:
+                if found[servo_id] == baudrate and previous[servo_id] != baudrate:
+                    if servo_id in set_baudrate(port, packet, [servo_id], baudrate, previous[servo_id], False):
+                        found[servo_id] = previous[servo_id]
+                    else:
+                        logger.error("Servo %d is stuck at %d bps", servo_id, baudrate)
+            continue
+
+        failures = validate(port, packet, servo_ids, count)
+        if failures == 0:
+            tuned_baudrate = baudrate
+            logger.info("%d bps is reliable", baudrate)
+            break
+        logger.warning("%d bps is not reliable, %d of %d reads failed", baudrate, failures, count * len(servo_ids))
+
+    if tuned_baudrate is None:
+        logger.error("No reliable baud rate, please check the cable and the power supply")
+        return None, None
+
+    tuned_return_delay = None
+    for return_delay in sorted(return_delays):
+        for servo_id in servo_ids:
+            packet.write1ByteTxRx(port, servo_id, ADDR_MX_RETURN_DELAY, return_delay)
+        failures = validate(port, packet, servo_ids, count)
+        if failures == 0:
+            tuned_return_delay = return_delay
+            logger.info("Return delay %d (%d usec) is reliable", return_delay, return_delay * 2)
+            break
+        logger.warning("Return delay %d (%d usec) is not reliable, %d of %d reads failed",
+                       return_delay, return_delay * 2, failures, count * len(servo_ids))
+
+    if tuned_return_delay is None:
+        # the servos are left at the longest one
+        tuned_return_delay = max(return_delays)
+        logger.warning("No reliable return delay, keeping %d (%d usec)", tuned_return_delay, tuned_return_delay * 2)
+
+    return tuned_baudrate, tuned_return_delay
+
+
+def save_bus_settings(port_name, baudrate, return_delay):
+    # store the tuned settings of the port, replacing its previous ones
+    settings = pd.DataFrame([{'port': port_name, 'baudrate': baudrate, 'return_delay': return_delay}],
+                            columns=['port', 'baudrate', 'return_delay'])
+    if os.path.exists(BUS_SETTINGS_FILE):
+        df = pd.read_csv(BUS_SETTINGS_FILE)
+        settings = pd.concat([df[df['port'] != port_name], settings], ignore_index=True)
+    settings.to_csv(BUS_SETTINGS_FILE, index=False)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    print("--------------------------------------------------------------------")
+    print("This tunes the baud rate and the return delay of all the servos on a")
+    print("port. It writes to the EEPROM of the servos, please don't unplug the")
+    print("power or the USB cable until it has finished.")
+    print("--------------------------------------------------------------------")
+
+    com = input("Please enter the com port number from your PC and press 'Enter' for confirmation,e.g. 5\nYour input:")
+    port_num = "COM%s" % com
+
+    port = openport(port_num)
+    packet = openpacket()
+    baudrate, return_delay = tune_bus(port, packet)
+    port.closePort()
+
+    if baudrate is None:
+        print("\nThe tuning failed, the port settings were not saved")
+    else:
+        save_bus_settings(port_num, baudrate, return_delay)
+        print("\nThe servos now run at %d bps with a return delay of %d usec, saved to %s" % (
+            baudrate, return_delay * 2, BUS_SETTINGS_FILE))
@@ -2,6 +2,9 @@ from Robotic_Servos import *
 import time
 import sys
 import pandas as pd
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(message)s')
 
 print("--------------------------------------------------------------------")
 print("README")
@@ -0,0 +1,46 @@
+'''
+Export the Grasp variables of a TensorFlow checkpoint to a .npz for grasp_numpy.py.
+
+The NumPy model is then run on a random batch next to test_one_batch and the
+largest difference of the fc8 outputs is printed.
+
+Template run:
+    python export_weights.py --model {'Model path'} --out {'npz path'} --gpu {-1,0,1,...}
+Example run:
+    python export_weights.py --model ./models/Grasp_model --out ./models/Grasp_model.npz --gpu -1
+'''
+import argparse
+import time
+import numpy as np
+from grasp_learner import grasp_obj
+import grasp_numpy
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--model', type=str, default='./models/Grasp_model', help='Grasp model you want to export')
+parser.add_argument('--out', type=str, default='./models/Grasp_model.npz', help='The .npz to write')
+parser.add_argument('--gpu', type=int, default=-1, help='GPU device id; -1 for cpu')
+parser.add_argument('--tolerance', type=float, default=1e-3, help='Largest fc8 difference relative to the fc8 range')
+args = parser.parse_args()
+
+print('Loading grasp model')
+G = grasp_obj(args.model, args.gpu)
+G.test_init()
+G.export_weights(args.out, grasp_numpy.WEIGHT_NAMES)
+print('Saved {}'.format(args.out))
+
+## Compare both models on a batch of random patches, mean already subtracted
+Is = np.random.uniform(-111, 144, size=(G.BATCH_SIZE, G.IMAGE_SIZE, G.IMAGE_SIZE, G.NUM_CHANNELS)).astype(np.float32)
+st_time = time.time()
+tf_pred = G.test_one_batch(Is)
+tf_time = time.time()-st_time
+G.test_close()
+
+N = grasp_numpy.grasp_obj(args.out)
+N.test_init()
+st_time = time.time()
+np_pred = N.test_one_batch(Is)
+np_time = time.time()-st_time
+
+error = np.abs(tf_pred-np_pred).max()/max(np.ptp(tf_pred), 1e-6)
+print('TensorFlow {:.3f}s, NumPy {:.3f}s per batch of {}'.format(tf_time, np_time, G.BATCH_SIZE))
+print('Largest fc8 difference: {:.3g} of the fc8 range, {}'.format(error, 'OK' if error < args.tolerance else 'TOO LARGE'))
@@ -68,12 +68,12 @@ class model:
         self.dropfc6 = tf.placeholder(tf.float32, name="dropoutfc6_keep_prob")
         self.dropfc7 = tf.placeholder(tf.float32, name="dropoutfc7_keep_prob")
 
-    def gen_model(self, image_batch):
+    def gen_trunk(self, image_batch):
+        # conv1 to maxpool5, shared by gen_model and gen_dense_model, returns conv1_in, conv5 and maxpool5
         #conv1
         #conv(11, 11, 96, 4, 4, padding='VALID', name='conv1')
         k_h = 11; k_w = 11; c_o = 96; s_h = 4; s_w = 4
         conv1_in = conv(image_batch, self.conv1W, self.conv1b, k_h, k_w, c_o, s_h, s_w, padding="SAME", group=1)
-        self.conv1_in = conv1_in
         conv1 = tf.nn.relu(conv1_in)
         #lrn1
         #lrn(2, 2e-05, 0.75, name='norm1')
@@ -115,6 +115,10 @@ class model:
         #max_pool(3, 3, 2, 2, padding='VALID', name='pool5')
         k_h = 3; k_w = 3; s_h = 2; s_w = 2; padding = 'VALID'
         maxpool5 = tf.nn.max_pool(conv5, ksize=[1, k_h, k_w, 1], strides=[1, s_h, s_w, 1], padding=padding)
+        return conv1_in, conv5, maxpool5
+
+    def gen_model(self, image_batch):
+        conv1_in, conv5, maxpool5 = self.gen_trunk(image_batch)
         #fc6
         #fc(4096, name='fc6')
         fc6 = tf.nn.relu_layer(tf.reshape(maxpool5, [-1, int(np.prod(maxpool5.get_shape()[1:]))]),
@@ -130,12 +134,37 @@ class model:
         #fc(1000, relu=False, name='fc8')
         fc8 = tf.nn.xw_plus_b(drop7, self.fc8W, self.fc8b)
         #Debug stuff
+        self.conv1_in = conv1_in
         self.fc7 = fc7
         self.fc6 = fc6
         self.conv5 = conv5
         #End Debug
         return fc8
 
+    def gen_dense_model(self, image):
+        '''
+        Fully convolutional version of gen_model for a whole image.
+        fc6-fc8 run as convolutions with the same weights, so every cell of the
+        output scores the 224x224 window under it, with a stride of 32 pixels.
+        The scores approximate those of the patches: conv1-conv5 pad with SAME,
+        so at the border of a patch they see zeros where the whole image has
+        its neighbouring pixels, and every cell, not only those at the border
+        of the image, differs from gen_model on the same window.
+        Returns the fc8 map, [batch, H, W, THETA_SIZE]; dropout is left out.
+        The debug tensors of gen_model (conv5, ...) are left alone.
+        '''
+        _, _, maxpool5 = self.gen_trunk(image)
+        #fc6 as a 6x6 convolution over maxpool5, flattened in the same (h, w, c) order
+        k_h = 6; k_w = 6; c_i = 256
+        fc6W = tf.reshape(self.fc6W, [k_h, k_w, c_i, -1])
+        fc6 = tf.nn.relu(tf.nn.bias_add(tf.nn.conv2d(maxpool5, fc6W, [1, 1, 1, 1], padding='VALID'), self.fc6b))
+        #fc7 and fc8 as 1x1 convolutions
+        fc7W = tf.reshape(self.fc7W, [1, 1, 4096, -1])
+        fc7 = tf.nn.relu(tf.nn.bias_add(tf.nn.conv2d(fc6, fc7W, [1, 1, 1, 1], padding='VALID'), self.fc7b))
+        fc8W = tf.reshape(self.fc8W, [1, 1, 1024, -1])
+        fc8 = tf.nn.bias_add(tf.nn.conv2d(fc7, fc8W, [1, 1, 1, 1], padding='VALID'), self.fc8b)
+        return fc8
+
     def gen_loss(self, fc8, theta_label_batch, grasp_label_batch):
         fc8_shape = tf.shape(fc8)
         input_batch_size = tf.gather(fc8_shape, 0) # computiong batch size as an op from the output
@@ -12,11 +12,15 @@ Template run:
     python grasp_image.py --im {'Image path'} --model {'Model path'} --nbest {1,2,...} --nsamples {1,2,...} --gscale {0, ..., 1.0} --gpu {-1,0,1,...}
 Example run:
     python grasp_image.py --im ./approach.jpg --model ./models/Grasp_model --nbest 100 --nsamples 250 --gscale 0.1 --gpu 0
+Dense run, every window of the image in one pass instead of random patches (approximate scores, see
+graspNet.model.gen_dense_model):
+    python grasp_image.py --im ./approach.jpg --model ./models/Grasp_model --nbest 100 --gscale 0.1 --gpu 0 --dense
+NumPy run, no TensorFlow needed (weights from export_weights.py):
+    python grasp_image.py --im ./approach.jpg --model ./models/Grasp_model.npz --nbest 100 --nsamples 250 --gscale 0.1 --backend numpy
 '''
 import argparse
 import cv2
 import numpy as np
-from grasp_learner import grasp_obj
 from grasp_predictor import Predictors
 import time
 
@@ -66,6 +70,10 @@ parser.add_argument('--gscale', type=float, default=0.234375, help='Scale of gra
 #抓取的框的大小
 parser.add_argument('--gpu', type=int, default=0, help='GPU device id; -1 for cpu')
 #是否调用GPU
+parser.add_argument('--dense', action='store_true', help='Score the whole image in one pass instead of sampling patches, the scores are approximate; --nsamples is ignored')
+#全卷积地评估整张图片
+parser.add_argument('--backend', type=str, default='tf', choices=['tf', 'numpy'], help='tf, or numpy to run the .npz from export_weights.py without TensorFlow')
+#用TensorFlow还是NumPy进行推理
 
 ## Parse arguments
 args = parser.parse_args()
@@ -78,6 +86,11 @@ imsize = max(I.shape[:2])
 gsize = int(gscale*imsize) # Size of grasp patch
 max_batchsize = 128
 gpu_id = args.gpu
+dense = args.dense
+if args.backend == 'numpy':
+    from grasp_numpy import grasp_obj
+else:
+    from grasp_learner import grasp_obj
 #传入参数
 
 
@@ -108,9 +121,13 @@ print('Predicting on samples')
 st_time = time.time()
 
 #将预测结果进行输出
-for _ in range(nbatches):
-    P.graspNet_grasp(patch_size=gsize, num_samples=batchsize);
-    fc8_predictions.append(P.fc8_norm_vals)
+for _ in range(1 if dense else nbatches):
+    if dense:
+        P.graspNet_dense(patch_size=gsize)
+    else:
+        P.graspNet_grasp(patch_size=gsize, num_samples=batchsize);
+    #fc8_norm_vals is reused by the next batch
+    fc8_predictions.append(P.fc8_norm_vals.copy())
     patch_Hs.append(P.patch_hs)
     patch_Ws.append(P.patch_ws)
 
@@ -118,19 +135,13 @@ fc8_predictions = np.concatenate(fc8_predictions)
 patch_Hs = np.concatenate(patch_Hs)
 patch_Ws = np.concatenate(patch_Ws)
 
-#将预测结果进行排序
-r = np.sort(fc8_predictions, axis = None)
-#取出其中预测最好的n个
-r_no_keep = r[-nbest]
+#取出其中预测最好的n个，只需要部分排序
+r_no_keep = np.partition(fc8_predictions, -nbest, axis = None)[-nbest]
 print('Time taken: {}s'.format(time.time()-st_time))
 
 #将预测结果最好的n个结果画在图片上
-for pindex in range(fc8_predictions.shape[0]):
-    for tindex in range(fc8_predictions.shape[1]):
-        if fc8_predictions[pindex, tindex] < r_no_keep:
-            continue
-        else:
-            I = drawRectangle(I, patch_Hs[pindex], patch_Ws[pindex], tindex, gsize)
+for pindex, tindex in np.argwhere(fc8_predictions >= r_no_keep):
+    I = drawRectangle(I, patch_Hs[pindex], patch_Ws[pindex], tindex, gsize)
 
 #来吧，展示
 print('displaying image')
@@ -27,6 +27,10 @@ class grasp_obj:
         self.INTER_OP_THREADS = 1
         self.SOFT_PLACEMENT = False
 
+        # dense graphs by image shape, see dense_init
+        self.dense_images = {}
+        self.dense_preds = {}
+
         tf.set_random_seed(self.SEED)
 
         self.config = tf.ConfigProto(allow_soft_placement=self.SOFT_PLACEMENT,
@@ -57,5 +61,29 @@ class grasp_obj:
             g_pred = self.sess.run(self.grasp_pred, feed_dict=grasp_feed_dict)
         return g_pred
 
+    def dense_init(self, height, width):
+        # graph of gen_dense_model for height x width images, reuses the weights restored by test_init
+        if (height, width) in self.dense_preds:
+            return
+        with tf.device(self.dev_name):
+            with tf.name_scope('Grasp_dense'):
+                image = tf.placeholder(tf.float32, shape=[1,height,width,self.NUM_CHANNELS])
+                self.dense_images[(height, width)] = image
+                self.dense_preds[(height, width)] = self.M.gen_dense_model(image)
+
+    def test_dense(self,I):
+        # fc8 map of a whole image, [H, W, GRASP_ACTION_SIZE]
+        shape = I.shape[:2]
+        self.dense_init(*shape)
+        with tf.device(self.dev_name):
+            g_pred = self.sess.run(self.dense_preds[shape], feed_dict={self.dense_images[shape] : I[np.newaxis]})
+        return g_pred[0]
+
+    def export_weights(self, path, names):
+        # save the variables of the model (after test_init) to a .npz, one array per attribute name of self.M
+        with tf.device(self.dev_name):
+            values = self.sess.run([getattr(self.M, name) for name in names])
+        np.savez(path, **dict(zip(names, values)))
+
     def test_close(self):
         self.sess.close()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+'''
+NumPy version of the graspNet model for CPU inference without TensorFlow.
+
+The weights come from a .npz written by export_weights.py, one array per
+variable of graspNet.model (WEIGHT_NAMES). Convolutions are im2col + one BLAS
+matrix product per group, the layers follow graspNet.model.gen_model with the
+dropouts off, so test_one_batch returns what grasp_obj.test_one_batch returns,
+and test_dense what it returns for gen_dense_model.
+
+grasp_obj has the interface of grasp_learner.grasp_obj:
+    G = grasp_obj('./models/Grasp_model.npz')
+    G.test_init()
+    P = Predictors(I, G)
+'''
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+WEIGHT_NAMES = ['conv1W', 'conv1b', 'conv2W', 'conv2b', 'conv3W', 'conv3b', 'conv4W', 'conv4b',
+                'conv5W', 'conv5b', 'fc6W', 'fc6b', 'fc7W', 'fc7b', 'fc8W', 'fc8b']
+# images per pass through the network, bounds the size of the im2col matrices
+CHUNK_SIZE = 16
+
+
+def same_padding(size, k, s):
+    # (before, after) padding of tf SAME
+    out = -(-size // s)
+    total = max((out - 1) * s + k - size, 0)
+    return total // 2, total - total // 2
+
+
+def conv2d(x, kernel, biases, s_h, s_w, padding="VALID", group=1):
+    '''tf.nn.conv2d (NHWC, HWIO kernel) split in groups like graspNet.conv, plus biases.'''
+    k_h, k_w, c_g, c_o = kernel.shape
+    if padding == "SAME":
+        x = np.pad(x, ((0, 0), same_padding(x.shape[1], k_h, s_h), same_padding(x.shape[2], k_w, s_w), (0, 0)))
+    # [N, H_o, W_o, C, k_h, k_w] views of x, then one row of k_h*k_w*c_g values per output pixel and group
+    windows = sliding_window_view(x, (k_h, k_w), axis=(1, 2))[:, ::s_h, ::s_w]
+    n, h_o, w_o = windows.shape[:3]
+    out = np.empty((n * h_o * w_o, c_o), dtype=np.float32)
+    c_og = c_o // group
+    for g in range(group):
+        cols = windows[:, :, :, g * c_g:(g + 1) * c_g].transpose(0, 1, 2, 4, 5, 3).reshape(-1, k_h * k_w * c_g)
+        out[:, g * c_og:(g + 1) * c_og] = np.dot(cols, kernel[:, :, :, g * c_og:(g + 1) * c_og].reshape(-1, c_og))
+    out += biases
+    return out.reshape(n, h_o, w_o, c_o)
+
+
+def relu(x):
+    return np.maximum(x, 0, out=x)
+
+
+def local_response_normalization(x, depth_radius=5, bias=1.0, alpha=1.0, beta=0.5):
+    # tf.nn.local_response_normalization: x / (bias + alpha * sum of x^2 over 2*depth_radius+1 channels)^beta
+    sq = np.zeros(x.shape[:3] + (x.shape[3] + 1,), dtype=np.float64)
+    np.cumsum(np.square(x, dtype=np.float64), axis=3, out=sq[..., 1:])
+    c = np.arange(x.shape[3])
+    sqr_sum = sq[..., np.minimum(c + depth_radius + 1, x.shape[3])] - sq[..., np.maximum(c - depth_radius, 0)]
+    return (x / (bias + alpha * sqr_sum) ** beta).astype(np.float32)
+
+
+def max_pool(x, k_h, k_w, s_h, s_w):
+    # tf.nn.max_pool with VALID padding
+    return sliding_window_view(x, (k_h, k_w), axis=(1, 2))[:, ::s_h, ::s_w].max(axis=(4, 5))
+
+
+class model:
+    def __init__(self, weights):
+        '''weights: dict of WEIGHT_NAMES to arrays, as saved by export_weights.py'''
+        for name in WEIGHT_NAMES:
+            setattr(self, name, np.ascontiguousarray(weights[name], dtype=np.float32))
+
+    def gen_trunk(self, image_batch):
+        # same layers as graspNet.model.gen_trunk, see there for the parameters
+        conv1 = relu(conv2d(image_batch, self.conv1W, self.conv1b, 4, 4, padding="SAME", group=1))
+        lrn1 = local_response_normalization(conv1, depth_radius=2, alpha=2e-05, beta=0.75, bias=1.0)
+        maxpool1 = max_pool(lrn1, 3, 3, 2, 2)
+        conv2 = relu(conv2d(maxpool1, self.conv2W, self.conv2b, 1, 1, padding="SAME", group=2))
+        lrn2 = local_response_normalization(conv2, depth_radius=2, alpha=2e-05, beta=0.75, bias=1.0)
+        maxpool2 = max_pool(lrn2, 3, 3, 2, 2)
+        conv3 = relu(conv2d(maxpool2, self.conv3W, self.conv3b, 1, 1, padding="SAME", group=1))
+        conv4 = relu(conv2d(conv3, self.conv4W, self.conv4b, 1, 1, padding="SAME", group=2))
+        conv5 = relu(conv2d(conv4, self.conv5W, self.conv5b, 1, 1, padding="SAME", group=2))
+        return max_pool(conv5, 3, 3, 2, 2)
+
+    def gen_model(self, image_batch):
+        maxpool5 = self.gen_trunk(image_batch)
+        fc6 = relu(np.dot(maxpool5.reshape(len(maxpool5), -1), self.fc6W) + self.fc6b)
+        fc7 = relu(np.dot(fc6, self.fc7W) + self.fc7b)
+        fc8 = np.dot(fc7, self.fc8W) + self.fc8b
+        return fc8
+
+    def gen_dense_model(self, image):
+        # graspNet.model.gen_dense_model: fc6 as a 6x6 convolution over maxpool5, fc7 and fc8 per cell
+        maxpool5 = self.gen_trunk(image)
+        fc6 = relu(conv2d(maxpool5, self.fc6W.reshape(6, 6, maxpool5.shape[3], -1), self.fc6b, 1, 1))
+        fc7 = relu(np.dot(fc6, self.fc7W) + self.fc7b)
+        fc8 = np.dot(fc7, self.fc8W) + self.fc8b
+        return fc8
+
+
+class grasp_obj:
+    def __init__(self, weights_path='./models/Grasp_model.npz', gpu_id=-1):
+        # gpu_id is ignored, the model runs on the CPU
+        self.weights_path = weights_path
+
+        self.IMAGE_SIZE = 224
+        self.NUM_CHANNELS = 3
+        self.GRASP_ACTION_SIZE = 18
+        self.BATCH_SIZE = 128
+
+    def sigmoid_array(self,x):
+        return 1 / (1 + np.exp(-x))
+
+    def test_init(self):
+        with np.load(self.weights_path) as weights:
+            self.M = model(weights)
+
+    def test_one_batch(self,Is):
+        Is = np.asarray(Is, dtype=np.float32)
+        g_pred = np.empty((len(Is), self.GRASP_ACTION_SIZE), dtype=np.float32)
+        for start in range(0, len(Is), CHUNK_SIZE):
+            g_pred[start:start+CHUNK_SIZE] = self.M.gen_model(Is[start:start+CHUNK_SIZE])
+        return g_pred
+
+    def test_dense(self,I):
+        # fc8 map of a whole image, [H, W, GRASP_ACTION_SIZE]
+        return self.M.gen_dense_model(np.asarray(I, dtype=np.float32)[np.newaxis])[0]
+
+    def test_close(self):
+        self.M = None
@@ -2,8 +2,20 @@
 
 import numpy as np
 import cv2
-import copy
 from sys import stdout
+
+# patches whose pixels have a smaller standard deviation are resampled
+MIN_PATCH_STD = 15
+# candidate centers drawn per missing patch in every sampling round
+CANDIDATES_PER_PATCH = 2
+# rounds before low contrast patches are accepted, so a plain image can't loop forever
+MAX_SAMPLE_ROUNDS = 50
+# weights of the angle and its two neighbours when smoothing the angle uncertainty
+ANGLE_WEIGHTS = (0.25, 0.5, 0.25)
+# grasps kept in the probability map, the others get 0
+NO_KEEP = 20
+# pixels between the windows scored by graspNet_dense, in the resized image
+DENSE_STRIDE = 32
 # Given image, returns image point and theta to grasp
 # 输入图片，和实例化后的预测模型。Prefictor负责将图片传入实例化后的预测模型，
 class Predictors:
@@ -14,73 +26,170 @@ class Predictors:
         self.I_h, self.I_w, self.I_c = self.I.shape
         #传入实例化后的预测模型
         self.learner = learner
-    def sigmoid_array(self, x):
-        #sigmoid函数
-        return 1 / (1 + np.exp(-x))
-    def to_prob_map(self, fc8_vals):
+        # float32 copy and integral images of I, computed on the first graspNet_grasp
+        self.I_float = None
+        self.I_sum = None
+        self.I_sqsum = None
+        # resized patches, reused by every graspNet_grasp with the same number of samples
+        self.patch_buffer = None
+        # post-processing buffers, see postprocess
+        self.fc8_norm_vals = None
+        self.fc8_prob_vals = None
+    def sigmoid_array(self, x, out=None):
+        #sigmoid函数, out=x works in place
+        out = np.negative(x, out=out)
+        np.exp(out, out=out)
+        out += 1
+        return np.reciprocal(out, out=out)
+    def smooth_angles(self, fc8_vals, out=None):
+        # circular convolution of every row (one sample, all angles) with ANGLE_WEIGHTS
+        out = np.multiply(fc8_vals, ANGLE_WEIGHTS[1], out=out)
+        out += ANGLE_WEIGHTS[0]*np.roll(fc8_vals, 1, axis=1)
+        out += ANGLE_WEIGHTS[2]*np.roll(fc8_vals, -1, axis=1)
+        return out
+    def to_prob_map(self, fc8_vals, out=None):
+        # keep the NO_KEEP largest values after the sigmoid, normalized to a distribution
         sig_scale = 1
-        no_keep = 20
-        fc8_sig = self.sigmoid_array(sig_scale*fc8_vals)
-        r = np.sort(fc8_sig, axis = None)
-        r_no_keep = r[-no_keep]
+        no_keep = min(NO_KEEP, fc8_vals.size)
+        fc8_sig = self.sigmoid_array(np.multiply(fc8_vals, sig_scale, out=out), out=out)
+        r_no_keep = np.partition(fc8_sig, -no_keep, axis=None)[-no_keep]
         fc8_sig[fc8_sig<r_no_keep] = 0.0
-        fc8_prob_map = fc8_sig/fc8_sig.sum()
-        return fc8_prob_map
+        fc8_sig /= fc8_sig.sum()
+        return fc8_sig
     def sample_from_map(self, prob_map):
-        prob_map_contig = np.ravel(prob_map)
-        arg_map_contig = np.array(range(prob_map_contig.size))
-        smp = np.random.choice(arg_map_contig, p=prob_map_contig)
+        # only the kept grasps can be drawn, so choose among the nonzero ones
+        keep = np.flatnonzero(prob_map)
+        prob_keep = prob_map.ravel()[keep]
+        smp = keep[np.random.choice(len(keep), p=prob_keep/prob_keep.sum())]
         return np.unravel_index(smp,prob_map.shape)
+    def postprocess(self, fc8_vals):
+        # smoothed predictions, probability map and the sampled grasp (patch index, angle index)
+        if self.fc8_norm_vals is None or self.fc8_norm_vals.shape != fc8_vals.shape:
+            self.fc8_norm_vals = np.empty(fc8_vals.shape)
+            self.fc8_prob_vals = np.empty(fc8_vals.shape)
+        # Normalizing angle uncertainity
+        self.smooth_angles(fc8_vals, out=self.fc8_norm_vals)
+        # Normalize to probability distribution
+        self.to_prob_map(self.fc8_norm_vals, out=self.fc8_prob_vals)
+        # Sample from probability distribution
+        return self.sample_from_map(self.fc8_prob_vals)
     def random_grasp(self, num_angle=18):
         h_g = np.random.randint(self.I_h)
         w_g = np.random.randint(self.I_w)
         t_g = np.random.randint(num_angle)
         return h_g, w_g, t_g
     def center_grasp(self, num_angle=18):
-        h_g = np.int(self.I_h/2)
-        w_g = np.int(self.I_w/2)
-        t_g = np.int(num_angle/2)
+        h_g = int(self.I_h/2)
+        w_g = int(self.I_w/2)
+        t_g = int(num_angle/2)
         return h_g, w_g, t_g
-    def graspNet_grasp(self, num_angle=18, patch_size=300, num_samples=128):
-        self.patch_size = patch_size
-        half_patch_size = np.int(patch_size/2) + 1
+    def init_integral(self):
+        # sums of I and I^2 over all channels, I_sum[h, w] is the sum of I[:h, :w]
+        self.I_float = np.ascontiguousarray(self.I, dtype=np.float32)
+        I_gray_sum = self.I.astype(np.float64).sum(axis=2)
+        I_gray_sqsum = (self.I.astype(np.float64)**2).sum(axis=2)
+        self.I_sum = np.zeros((self.I_h+1, self.I_w+1))
+        self.I_sqsum = np.zeros((self.I_h+1, self.I_w+1))
+        self.I_sum[1:, 1:] = I_gray_sum.cumsum(axis=0).cumsum(axis=1)
+        self.I_sqsum[1:, 1:] = I_gray_sqsum.cumsum(axis=0).cumsum(axis=1)
+    def patch_std(self, tops, lefts, patch_size):
+        # standard deviation of the pixels of every patch, from the integral images
+        bottoms = tops + patch_size
+        rights = lefts + patch_size
+        n = float(patch_size*patch_size*self.I_c)
+        s = self.I_sum[bottoms, rights] - self.I_sum[tops, rights] - self.I_sum[bottoms, lefts] + self.I_sum[tops, lefts]
+        sq = (self.I_sqsum[bottoms, rights] - self.I_sqsum[tops, rights] - self.I_sqsum[bottoms, lefts]
+              + self.I_sqsum[tops, lefts])
+        mean = s/n
+        return np.sqrt(np.maximum(sq/n - mean**2, 0.0))
+    def sample_patches(self, num_samples, patch_size):
+        # top left corners of num_samples random patches with enough contrast
         h_range = self.I_h - patch_size -2
         w_range = self.I_w - patch_size -2
+        tops = np.zeros(num_samples, dtype=np.int64)
+        lefts = np.zeros(num_samples, dtype=np.int64)
+        found = 0
+        for _ in range(MAX_SAMPLE_ROUNDS):
+            missing = num_samples - found
+            cand_tops = np.random.randint(h_range, size=missing*CANDIDATES_PER_PATCH)
+            cand_lefts = np.random.randint(w_range, size=missing*CANDIDATES_PER_PATCH)
+            keep = np.flatnonzero(self.patch_std(cand_tops, cand_lefts, patch_size) > MIN_PATCH_STD)[:missing]
+            tops[found:found+len(keep)] = cand_tops[keep]
+            lefts[found:found+len(keep)] = cand_lefts[keep]
+            found += len(keep)
+            if found == num_samples:
+                return tops, lefts
+        # not enough contrast in the image, take the rest as they come
+        tops[found:] = np.random.randint(h_range, size=num_samples-found)
+        lefts[found:] = np.random.randint(w_range, size=num_samples-found)
+        return tops, lefts
+    def dense_window_starts(self, size, cells):
+        # first row (or column) of the 224x224 window of every cell of the dense map, in an image of the
+        # given size; conv1 pads with SAME, so the windows move by the padding it adds before the image
+        image_size = self.learner.IMAGE_SIZE
+        pad = max((int(np.ceil(size/4.0))-1)*4 + 11 - size, 0)//2
+        patch_pad = max((image_size//4-1)*4 + 11 - image_size, 0)//2
+        return np.arange(cells)*DENSE_STRIDE + patch_pad - pad
+    def graspNet_dense(self, num_angle=18, patch_size=300):
+        # score the whole image in one pass of gen_dense_model, one grasp per cell and angle
+        self.patch_size = patch_size
+        image_size = self.learner.IMAGE_SIZE
+        if self.I_float is None:
+            self.init_integral()
+        # scale the image so a patch_size window becomes image_size, as in graspNet_grasp
+        scale = float(image_size)/patch_size
+        I_resized = cv2.resize(self.I_float, (int(round(self.I_w*scale)), int(round(self.I_h*scale))),
+                               interpolation=cv2.INTER_CUBIC)
+        #subtract mean
+        I_resized -= 111
+        fc8_map = self.learner.test_dense(I_resized)
+        grid_h, grid_w = fc8_map.shape[:2]
+
+        # centres of the windows in the original image
+        centre_hs = (self.dense_window_starts(I_resized.shape[0], grid_h) + image_size/2.0)/scale
+        centre_ws = (self.dense_window_starts(I_resized.shape[1], grid_w) + image_size/2.0)/scale
+        patch_hs = np.repeat(np.clip(centre_hs, 0, self.I_h-1).astype(int), grid_w)
+        patch_ws = np.tile(np.clip(centre_ws, 0, self.I_w-1).astype(int), grid_h)
+
+        self.fc8_vals = fc8_map.reshape(grid_h*grid_w, -1)
+        self.patch_id, self.theta_id = self.postprocess(self.fc8_vals)
+        # grasp probability of every cell and angle
+        self.grasp_map = self.sigmoid_array(self.fc8_norm_vals).reshape(grid_h, grid_w, -1)
+        self.patch_hs = patch_hs
+        self.patch_ws = patch_ws
+        self.best_patch_h = patch_hs[self.patch_id]
+        self.best_patch_w = patch_ws[self.patch_id]
+        return self.best_patch_h, self.best_patch_w, self.theta_id
+    def prepare_patches(self, num_samples, patch_size, image_size=224):
+        # centres, crops and mean subtracted network inputs of num_samples random patches
+        half_patch_size = int(patch_size/2) + 1
+        if self.I_sum is None:
+            self.init_integral()
 
-        #Initialize random patch points
-        patch_hs = np.random.randint(h_range,size=num_samples) + half_patch_size
-        patch_ws = np.random.randint(w_range,size=num_samples) + half_patch_size
+        # Draw the patches in bulk, the ones with too little standard deviation from mean are
+        # resampled
+        tops, lefts = self.sample_patches(num_samples, patch_size)
+        patch_hs = tops + half_patch_size
+        patch_ws = lefts + half_patch_size
 
-        patch_Is = np.zeros((num_samples,patch_size,patch_size,self.I_c))
-        patch_Is_resized = np.zeros((num_samples,self.learner.IMAGE_SIZE,self.learner.IMAGE_SIZE,self.I_c))
-        for looper in xrange(num_samples):
-            isWhiteFlag = 1
-            while isWhiteFlag==1:
-                patch_hs[looper] = np.random.randint(h_range) + half_patch_size
-                patch_ws[looper] = np.random.randint(w_range) + half_patch_size
-                patch_Is[looper] = self.I[patch_hs[looper]-half_patch_size:patch_hs[looper]-half_patch_size+patch_size, patch_ws[looper]-half_patch_size:patch_ws[looper]-half_patch_size+patch_size]
-                # Make sure that the input has a minimal amount of standard deviation from mean. If
-                # not resample
-                if patch_Is[looper].std() > 15:
-                    isWhiteFlag = 0
-                else:
-                    isWhiteFlag = 1
-            patch_Is_resized[looper] = cv2.resize(patch_Is[looper],(self.learner.IMAGE_SIZE,self.learner.IMAGE_SIZE), interpolation=cv2.INTER_CUBIC)
+        # Crop through views of I and resize straight into the reused float32 buffer
+        if self.patch_buffer is None or len(self.patch_buffer) != num_samples:
+            self.patch_buffer = np.empty((num_samples,image_size,image_size,self.I_c), dtype=np.float32)
+        patch_Is_resized = self.patch_buffer
+        patch_Is = []
+        for looper in range(num_samples):
+            patch_I = self.I_float[tops[looper]:tops[looper]+patch_size, lefts[looper]:lefts[looper]+patch_size]
+            cv2.resize(patch_I, (image_size,image_size), dst=patch_Is_resized[looper], interpolation=cv2.INTER_CUBIC)
+            patch_Is.append(patch_I)
         #subtract mean
-        patch_Is_resized = patch_Is_resized - 111
+        patch_Is_resized -= 111
+        return patch_hs, patch_ws, patch_Is, patch_Is_resized
+    def graspNet_grasp(self, num_angle=18, patch_size=300, num_samples=128):
+        self.patch_size = patch_size
+        patch_hs, patch_ws, patch_Is, patch_Is_resized = self.prepare_patches(num_samples, patch_size,
+                                                                              self.learner.IMAGE_SIZE)
         self.fc8_vals = self.learner.test_one_batch(patch_Is_resized)
-        # Normalizing angle uncertainity
-        wf = [0.25, 0.5, 0.25]
-        self.fc8_norm_vals = copy.deepcopy(self.fc8_vals)
-        for looper in xrange(num_samples):
-            for norm_looper in xrange(num_angle):
-                self.fc8_norm_vals[looper,norm_looper] = (wf[1]*self.fc8_norm_vals[looper,norm_looper] +
-                        wf[0]*self.fc8_norm_vals[looper,(norm_looper-1)%num_angle] +
-                        wf[2]*self.fc8_norm_vals[looper,(norm_looper+1)%num_angle])
-        # Normalize to probability distribution
-        self.fc8_prob_vals = self.to_prob_map(self.fc8_norm_vals)
-        # Sample from probability distribution
-        self.patch_id, self.theta_id = self.sample_from_map(self.fc8_prob_vals)
+        self.patch_id, self.theta_id = self.postprocess(self.fc8_vals)
         #self.patch_id, self.theta_id = np.unravel_index(self.fc8_prob_vals.argmax(), self.fc8_prob_vals.shape)
         self.patch_hs = patch_hs
         self.patch_ws = patch_ws
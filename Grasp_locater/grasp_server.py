@@ -0,0 +1,367 @@
+'''
+Long-lived grasp inference service.
+
+The model is loaded once. Images are queued from any thread (or sent over a
+local TCP socket), their patches are sampled in the caller's thread, and one
+batch thread packs the patches of concurrent requests into batches of
+BATCH_SIZE. A partial batch is run once its oldest patch has waited
+latency_budget seconds. Every request gets its nbest grasps, best first.
+Queue time, batch fill ratio and inference time are exposed by metrics().
+
+Template run:
+    python grasp_server.py --model {'Model path'} --gpu {-1,0,1,...} --port {port}
+Example run:
+    python grasp_server.py --model ./models/Grasp_model --gpu 0 --port 5555
+    python grasp_server.py --model ./models/Grasp_model.npz --backend numpy --port 5555
+
+In process:
+    G = grasp_obj(model_path, gpu_id)
+    G.test_init()
+    server = Grasp_Server(G)
+    grasps = server.grasp(I, num_samples=250, patch_size=300, nbest=10)
+    print(grasps[0]['h'], grasps[0]['w'], grasps[0]['theta'], grasps[0]['score'])
+
+Over the socket:
+    grasps = request_grasps(('127.0.0.1', 5555), I, num_samples=250, patch_size=300, nbest=10)
+'''
+import time
+import json
+import socket
+import struct
+import argparse
+import threading
+import collections
+import socketserver
+from concurrent.futures import Future
+
+import numpy as np
+
+from grasp_predictor import Predictors
+
+# seconds a partial batch waits for more patches
+LATENCY_BUDGET = 0.02
+# samples kept for the percentiles of metrics()
+METRIC_SAMPLES = 1000
+# largest header and image accepted over the socket
+MAX_HEADER_BYTES = 1 << 16
+MAX_IMAGE_BYTES = 64 << 20
+
+
+class Grasp_Request():
+    # patches of one image and the fc8 rows scored so far
+    def __init__(self, patch_hs, patch_ws, patches, nbest):
+        self.patch_hs = patch_hs
+        self.patch_ws = patch_ws
+        self.patches = patches
+        self.nbest = nbest
+        self.fc8_vals = np.empty((len(patches), 0))
+        self.queued = 0  # patches handed to a batch
+        self.scored = 0  # patches with their fc8 row
+        self.enqueue_time = time.monotonic()
+        self.future = Future()
+
+
+def rank_grasps(fc8_vals, patch_hs, patch_ws, nbest):
+    '''The nbest grasps, best first, as dicts of h, w, theta (angle index) and score (probability).'''
+    P = Predictors(np.zeros((1, 1, 1)))
+    scores = P.sigmoid_array(P.smooth_angles(fc8_vals))
+    nbest = min(nbest, scores.size)
+    best = np.argpartition(scores, -nbest, axis=None)[-nbest:]
+    best = best[np.argsort(-scores.ravel()[best], kind='stable')]
+    grasps = []
+    for pindex, tindex in zip(*np.unravel_index(best, scores.shape)):
+        grasps.append({'h': int(patch_hs[pindex]), 'w': int(patch_ws[pindex]), 'theta': int(tindex),
+                       'score': float(scores[pindex, tindex])})
+    return grasps
+
+
+def summary(samples, scale=1.0):
+    # mean and percentiles of the recent samples
+    samples = sorted(samples)
+    if not samples:
+        return {'count': 0}
+    return {
+        'count': len(samples),
+        'mean': scale * sum(samples) / len(samples),
+        'p50': scale * samples[len(samples) // 2],
+        'p99': scale * samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+        'max': scale * samples[-1],
+    }
+
+
+class Grasp_Server():
+    def __init__(self, learner, latency_budget=LATENCY_BUDGET):
+        '''
+        learner: grasp_obj after test_init, test_one_batch takes exactly learner.BATCH_SIZE patches
+        latency_budget: seconds a partial batch waits for more patches, default: LATENCY_BUDGET
+        '''
+        self.learner = learner
+        self.batch_size = learner.BATCH_SIZE
+        self.image_size = learner.IMAGE_SIZE
+        self.latency_budget = latency_budget
+        self.batch = np.zeros((self.batch_size, self.image_size, self.image_size, learner.NUM_CHANNELS),
+                              dtype=np.float32)
+        self.condition = threading.Condition()
+        self.requests = collections.deque()  # requests with patches not handed to a batch yet
+        self.pending_patches = 0
+        self.running = True
+
+        self.batches = 0
+        self.completed_requests = 0
+        self.queue_times = collections.deque(maxlen=METRIC_SAMPLES)
+        self.fill_ratios = collections.deque(maxlen=METRIC_SAMPLES)
+        self.inference_times = collections.deque(maxlen=METRIC_SAMPLES)
+
+        self.thread = threading.Thread(target=self.serve, name="Grasp_Server")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def close(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join()
+
+    # The following functions queue requests, from any thread
+    def submit(self, I, num_samples=128, patch_size=300, nbest=10):
+        '''Queue image I, return a Future of its nbest grasps (see rank_grasps).'''
+        patch_hs, patch_ws, _, patches = Predictors(I).prepare_patches(num_samples, patch_size, self.image_size)
+        request = Grasp_Request(patch_hs, patch_ws, patches, nbest)
+        with self.condition:
+            if not self.running:
+                request.future.cancel()
+                return request.future
+            self.requests.append(request)
+            self.pending_patches += num_samples
+            self.condition.notify()
+        return request.future
+
+    def grasp(self, I, num_samples=128, patch_size=300, nbest=10):
+        # submit and wait for the grasps
+        return self.submit(I, num_samples, patch_size, nbest).result()
+
+    # The following functions run on the batch thread
+    def serve(self):
+        while True:
+            with self.condition:
+                while self.running:
+                    if self.pending_patches >= self.batch_size:
+                        break
+                    if self.requests:
+                        delay = self.requests[0].enqueue_time + self.latency_budget - time.monotonic()
+                        if delay <= 0:
+                            break
+                        self.condition.wait(delay)
+                    else:
+                        self.condition.wait()
+                if not self.running:
+                    break
+                spans = self.take_batch()
+            self.run_batch(spans)
+
+        with self.condition:
+            for request in self.requests:
+                request.future.cancel()
+
+    def take_batch(self):
+        # (request, first patch, number of patches) of the next batch, oldest requests first
+        spans = []
+        free = self.batch_size
+        now = time.monotonic()
+        while self.requests and free > 0:
+            request = self.requests[0]
+            if request.queued == 0:
+                self.queue_times.append(now - request.enqueue_time)
+            count = min(free, len(request.patches) - request.queued)
+            spans.append((request, request.queued, count))
+            request.queued += count
+            free -= count
+            self.pending_patches -= count
+            if request.queued == len(request.patches):
+                self.requests.popleft()
+        return spans
+
+    def run_batch(self, spans):
+        filled = 0
+        for request, first, count in spans:
+            self.batch[filled:filled + count] = request.patches[first:first + count]
+            filled += count
+        self.batch[filled:] = 0
+
+        start = time.monotonic()
+        try:
+            fc8_vals = self.learner.test_one_batch(self.batch)
+        except Exception as e:
+            for request, _, _ in spans:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+        self.inference_times.append(time.monotonic() - start)
+        self.fill_ratios.append(float(filled) / self.batch_size)
+        self.batches += 1
+
+        filled = 0
+        for request, first, count in spans:
+            if request.future.done():
+                filled += count
+                continue
+            if first == 0:
+                request.fc8_vals = np.empty((len(request.patches), fc8_vals.shape[1]))
+            request.fc8_vals[first:first + count] = fc8_vals[filled:filled + count]
+            request.scored += count
+            filled += count
+            if request.scored == len(request.patches):
+                self.complete(request)
+
+    def complete(self, request):
+        if request.future.set_running_or_notify_cancel():
+            request.future.set_result(rank_grasps(request.fc8_vals, request.patch_hs, request.patch_ws,
+                                                  request.nbest))
+        request.patches = None
+        self.completed_requests += 1
+
+    def metrics(self):
+        '''Queue time and inference time (ms) and batch fill ratio of the recent batches.'''
+        with self.condition:
+            return {
+                'queue_depth': len(self.requests),
+                'pending_patches': self.pending_patches,
+                'batches': self.batches,
+                'completed_requests': self.completed_requests,
+                'queue_ms': summary(self.queue_times, 1000.0),
+                'inference_ms': summary(self.inference_times, 1000.0),
+                'batch_fill': summary(self.fill_ratios),
+            }
+
+
+# Local socket, one request per message: a 4 byte big endian length and a JSON header, then the image
+# bytes (uint8, header['shape']); the reply is a length and a JSON object with 'grasps' or 'error'
+def send_message(sock, header, payload=b''):
+    data = json.dumps(header).encode('utf-8')
+    sock.sendall(struct.pack('>I', len(data)) + data + payload)
+
+
+def recv_exactly(sock, length):
+    data = bytearray()
+    while len(data) < length:
+        chunk = sock.recv(length - len(data))
+        if not chunk:
+            raise EOFError("Connection closed")
+        data.extend(chunk)
+    return bytes(data)
+
+
+def recv_message(sock, max_length=None):
+    length, = struct.unpack('>I', recv_exactly(sock, 4))
+    if max_length is not None and length > max_length:
+        raise ValueError("Message of %d bytes, at most %d are accepted" % (length, max_length))
+    return json.loads(recv_exactly(sock, length).decode('utf-8'))
+
+
+def image_shape(header):
+    # the (height, width) or (height, width, channels) of a request header, ValueError if it has none
+    if not isinstance(header, dict):
+        raise ValueError("The header must be a JSON object")
+    shape = header.get('shape')
+    if (not isinstance(shape, list) or len(shape) not in (2, 3) or
+            not all(isinstance(size, int) and not isinstance(size, bool) and size > 0 for size in shape)):
+        raise ValueError("shape must be [height, width] or [height, width, channels] of positive integers")
+    if int(np.prod(shape)) > MAX_IMAGE_BYTES:
+        raise ValueError("The image is larger than %d bytes" % MAX_IMAGE_BYTES)
+    return tuple(shape)
+
+
+class Grasp_Handler(socketserver.BaseRequestHandler):
+    # serves the requests of one connection, concurrent connections are batched together
+    def handle(self):
+        while True:
+            try:
+                header = recv_message(self.request, MAX_HEADER_BYTES)
+            except EOFError:
+                return
+            except ValueError as e:
+                # not JSON, the rest of the stream can't be framed any more
+                self.reply_error("Malformed header: %s" % e)
+                return
+            try:
+                shape = image_shape(header)
+                I = np.frombuffer(recv_exactly(self.request, int(np.prod(shape))), dtype=np.uint8).reshape(shape)
+            except (ValueError, EOFError) as e:
+                self.reply_error(str(e))
+                return
+            try:
+                grasps = self.server.grasp_server.grasp(I, header.get('num_samples', 128),
+                                                        header.get('patch_size', 300), header.get('nbest', 10))
+                send_message(self.request, {'grasps': grasps})
+            except Exception as e:
+                send_message(self.request, {'error': str(e)})
+
+    def reply_error(self, message):
+        # last reply before the connection is closed, the client may be gone already
+        try:
+            send_message(self.request, {'error': message})
+        except OSError:
+            pass
+
+
+class Grasp_Socket_Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, grasp_server):
+        self.grasp_server = grasp_server
+        socketserver.ThreadingTCPServer.__init__(self, address, Grasp_Handler)
+
+
+def request_grasps(address, I, num_samples=128, patch_size=300, nbest=10, sock=None):
+    '''Send image I to a Grasp_Socket_Server, return its grasps; pass sock to reuse a connection.'''
+    I = np.ascontiguousarray(I, dtype=np.uint8)
+    own_sock = sock is None
+    if own_sock:
+        sock = socket.create_connection(address)
+    try:
+        send_message(sock, {'shape': list(I.shape), 'num_samples': num_samples, 'patch_size': patch_size,
+                            'nbest': nbest}, I.tobytes())
+        reply = recv_message(sock)
+    finally:
+        if own_sock:
+            sock.close()
+    if 'error' in reply:
+        raise RuntimeError(reply['error'])
+    return reply['grasps']
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', type=str, default='./models/Grasp_model', help='Grasp model you want to use')
+    parser.add_argument('--gpu', type=int, default=0, help='GPU device id; -1 for cpu')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=5555, help='Port to listen on')
+    parser.add_argument('--batchsize', type=int, default=128, help='Patches per batch')
+    parser.add_argument('--budget', type=float, default=LATENCY_BUDGET, help='Seconds a partial batch waits')
+    parser.add_argument('--backend', type=str, default='tf', choices=['tf', 'numpy'],
+                        help='tf, or numpy to run the .npz from export_weights.py without TensorFlow')
+    args = parser.parse_args()
+    if args.backend == 'numpy':
+        from grasp_numpy import grasp_obj
+    else:
+        from grasp_learner import grasp_obj
+
+    print('Loading grasp model')
+    st_time = time.time()
+    G = grasp_obj(args.model, args.gpu)
+    G.BATCH_SIZE = args.batchsize
+    G.test_init()
+    print('Time taken: {}s'.format(time.time()-st_time))
+
+    server = Grasp_Server(G, args.budget)
+    socket_server = Grasp_Socket_Server((args.host, args.port), server)
+    print('Serving on {}:{}'.format(args.host, args.port))
+    try:
+        socket_server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    socket_server.server_close()
+    server.close()
+    G.test_close()
+    print(json.dumps(server.metrics(), indent=2))
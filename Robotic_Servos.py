@@ -2,7 +2,12 @@
 
 
 from dynamixel_sdk import *
+import os
+import csv
 import time
+import struct
+import collections
+import logging
 import numpy as np
 import math
 
@@ -16,6 +21,10 @@ CW angle limit = 0 = 0°
 CWW angle limit = 4095 = 360°
 '''
 
+# messages go to the logging module, e.g. logging.basicConfig(level=logging.INFO) shows
+# the port messages and logging.DEBUG also the ones of every read
+logger = logging.getLogger(__name__)
+
 
 
 #%%
@@ -29,40 +38,172 @@ ADDR_MX_VOLTAGE = 42
 ADDR_MX_LOAD = 40
 ADDR_MX_SPEED = 38
 ADDR_MX_MOVING_SPEED = 32
+ADDR_MX_TORQUE_LIMIT = 34
 ADDR_MX_CW_LIMIT = 6
 ADDR_MX_CCW_LIMIT = 8
+ADDR_MX_MODEL_NUMBER = 0
+ADDR_MX_FIRMWARE = 2
+ADDR_MX_ID = 3
+ADDR_MX_BAUD_RATE = 4
+ADDR_MX_RETURN_DELAY = 5
+ADDR_MX_MAX_TORQUE = 14
+ADDR_MX_STATUS_RETURN_LEVEL = 16
+ADDR_MX_TEMPERATURE = 43
+ADDR_MX_REGISTERED = 44
+
+# Size of the MX-28 control table, EEPROM area is 0~23, RAM area is 24~73
+MX_CONTROL_TABLE_SIZE = 74
+# Registers that only change when we write them, so their shadow copy can be trusted:
+# the EEPROM area. The moving speed is left out, sync_write_goal and REG_WRITE/ACTION
+# change it behind the back of the Robotis_Servo of each servo.
+MX_STATIC_REGISTERS = set(range(0, ADDR_MX_TORQUE_ENABLE))
+
+# Present position ~ moving (36~46) in one READ: position, speed, load, voltage,
+# temperature, registered, (reserved), moving. The position is signed in multi-turn mode.
+MX_STATE_LENGTH = ADDR_MX_MOVING + 1 - ADDR_MX_PRESENT_POSITION
+MX_STATE_FORMAT = struct.Struct('<hHHBBBxB')
+Servo_State = collections.namedtuple('Servo_State', 'position speed load voltage temperature registered moving')
 
 BAUDRATE                   = 57600
+# Tuned baud rate and return delay per port, written by Bus_Tuning.py
+BUS_SETTINGS_FILE = 'bus_settings.csv'
+
+def baudrate_from_register(value):
+    # baud rate selected by a value of the MX series baud rate register
+    if value == 250:
+        return 2250000
+    if value == 251:
+        return 2500000
+    if value == 252:
+        return 3000000
+    return 2000000.0 / (value + 1)
+
+def baudrate_to_register(baudrate):
+    # baud rate register value for baudrate, None if the servo cannot get within 3% of it
+    candidates = [250, 251, 252] + [max(0, min(249, int(round(2000000.0 / baudrate - 1))))]
+    value = min(candidates, key=lambda v: abs(baudrate_from_register(v) - baudrate))
+    if abs(baudrate_from_register(value) - baudrate) > 0.03 * baudrate:
+        return None
+    return value
 
 PROTOCOL_VERSION = 1.0
 
 # Port operating
 
-def openport(PORT_NUM):
+def tuned_baudrate(PORT_NUM):
+    # baud rate saved for the port by Bus_Tuning.py, None if the port was never tuned
+    # (plain csv, so the servo layer does not need pandas)
+    if not os.path.exists(BUS_SETTINGS_FILE):
+        return None
+    with open(BUS_SETTINGS_FILE) as f:
+        for row in csv.DictReader(f):
+            if row['port'] == PORT_NUM:
+                return int(row['baudrate'])
+    return None
+
+def openport(PORT_NUM, baudrate=None):
     # open the port for communication
     '''port : port number for connecting the usb on your PC, you can check it
         in the device manager.
-    example: "COM5"'''
+    example: "COM5"
+    baudrate : default: the tuned baud rate of the port if Bus_Tuning.py was run, else BAUDRATE'''
     
+    if baudrate is None:
+        baudrate = tuned_baudrate(PORT_NUM) or BAUDRATE
     port = PortHandler(PORT_NUM)
     if port.openPort():
-        print("Succeeded to open the port")
+        logger.info("Succeeded to open the port")
     else:
-        print("Failed to open the port")
-    if port.setBaudRate(BAUDRATE):
-        print("Succeeded to change the baudrate to %d" % BAUDRATE)
+        logger.error("Failed to open the port")
+    if port.setBaudRate(baudrate):
+        logger.info("Succeeded to change the baudrate to %d", baudrate)
+        # wait for status packets on the port instead of spinning (no-op on Windows)
+        port.setRxBlocking(True)
         return port
     else:
-        print("Failed to change the baudrate")
+        logger.error("Failed to change the baudrate")
 
 def openpacket():
     # open the port for sending data
     packet = PacketHandler(PROTOCOL_VERSION)
     if packet:
-        print("Succeeded to open the Packet")
+        logger.info("Succeeded to open the Packet")
         return packet
     else:
-        print("Fail to open the Packet")
+        logger.error("Fail to open the Packet")
+
+def decode_speed(value):
+    # present speed register to rpm, negative in the CW direction
+    if value & 0x400:
+        return -(value & 0x3FF) * 0.11
+    return value * 0.11
+
+def decode_load(value):
+    # present load register to load (0~1023), negative in the CW direction
+    if value & 0x400:
+        return -(value & 0x3FF)
+    return value
+
+def decode_state(data):
+    # registers 36~46 to a Servo_State, speed in rpm, voltage in V
+    if not isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data)
+    position, speed, load, voltage, temperature, registered, moving = MX_STATE_FORMAT.unpack_from(memoryview(data))
+    return Servo_State(position, decode_speed(speed), decode_load(load), voltage / 10., temperature,
+                       registered, moving)
+
+# Group operating
+
+def sync_write_goal(port, packet, goals):
+    '''Write goal position, moving speed and torque limit of many servos in one
+    SYNC_WRITE broadcast packet (registers 30~35 are contiguous).
+
+    goals : dict of {servo_id: (position, speed, torque)}
+    return : True if the packet was sent
+    '''
+    groupSyncWrite = GroupSyncWrite(port, packet, ADDR_MX_GOAL_POSITION, 6)
+    for servo_id, (position, speed, torque) in goals.items():
+        param = [DXL_LOBYTE(position), DXL_HIBYTE(position),
+                 DXL_LOBYTE(speed), DXL_HIBYTE(speed),
+                 DXL_LOBYTE(torque), DXL_HIBYTE(torque)]
+        if not groupSyncWrite.addParam(servo_id, param):
+            logger.error("[ID:%03d] groupSyncWrite addparam failed", servo_id)
+            return False
+
+    dxl_comm_result = groupSyncWrite.txPacket()
+    if dxl_comm_result != COMM_SUCCESS:
+        logger.warning("%s", packet.getTxRxResult(dxl_comm_result))
+        return False
+    return True
+
+def bulk_read_status(port, packet, servo_ids):
+    '''Read present position, speed, load, voltage and the moving flag of many
+    servos with one BULK_READ instruction (registers 36~46 are contiguous).
+
+    return : dict of {servo_id: {'position', 'speed', 'load', 'voltage', 'moving'}},
+             position, speed and load are the raw register values, voltage is in V,
+             moving is the Moving register (1 until the goal position is reached).
+             None if the bulk read failed.
+    '''
+    groupBulkRead = GroupBulkRead(port, packet)
+    for servo_id in servo_ids:
+        groupBulkRead.addParam(servo_id, ADDR_MX_PRESENT_POSITION, MX_STATE_LENGTH)
+
+    dxl_comm_result = groupBulkRead.txRxPacket()
+    if dxl_comm_result != COMM_SUCCESS:
+        logger.warning("%s", packet.getTxRxResult(dxl_comm_result))
+        return None
+
+    status = {}
+    for servo_id in servo_ids:
+        status[servo_id] = {
+            'position': groupBulkRead.getData(servo_id, ADDR_MX_PRESENT_POSITION, 2),
+            'speed': groupBulkRead.getData(servo_id, ADDR_MX_SPEED, 2),
+            'load': groupBulkRead.getData(servo_id, ADDR_MX_LOAD, 2),
+            'voltage': groupBulkRead.getData(servo_id, ADDR_MX_VOLTAGE, 1) / 10.,
+            'moving': groupBulkRead.getData(servo_id, ADDR_MX_MOVING, 1),
+        }
+    return status
 
 class Robotis_Servo():
     def __init__(self, port, packet, servo_id):
@@ -88,6 +229,75 @@ class Robotis_Servo():
         self.port = port
         self.packet = packet
 
+        # shadow of the control table, static registers are served from here once known
+        self.shadow = bytearray(MX_CONTROL_TABLE_SIZE)
+        self.shadow_valid = [False] * MX_CONTROL_TABLE_SIZE
+        # goal position (and speed) staged by reg_goto, waiting for an ACTION
+        self.registered_write = None
+
+    # The following functions keep the shadow of the control table
+    def read_register(self, address, length):
+        # read a 1 or 2 byte register, static registers come from the shadow once known
+        if self.is_cached(address, length):
+            return self.shadow_value(address, length)
+        if length == 1:
+            value, dxl_result, dxl_error = self.packet.read1ByteTxRx(self.port, self.servo_id, address)
+        else:
+            value, dxl_result, dxl_error = self.packet.read2ByteTxRx(self.port, self.servo_id, address)
+        if self.check_com(dxl_result, dxl_error):
+            self.update_shadow(address, [DXL_LOBYTE(value), DXL_HIBYTE(value)][:length])
+            return value
+
+    def write_register(self, address, length, value):
+        # write a 1 or 2 byte register, writing a static register with its current value is skipped
+        data = [DXL_LOBYTE(value), DXL_HIBYTE(value)][:length]
+        if self.is_cached(address, length) and list(self.shadow[address:address + length]) == data:
+            return 1
+        if length == 1:
+            dxl_result, dxl_error = self.packet.write1ByteTxRx(self.port, self.servo_id, address, value)
+        else:
+            dxl_result, dxl_error = self.packet.write2ByteTxRx(self.port, self.servo_id, address, value)
+        if self.check_com(dxl_result, dxl_error):
+            self.update_shadow(address, data)
+            return 1
+        self.invalidate_cache(address, length)
+        return 0
+
+    def is_cached(self, address, length):
+        for addr in range(address, address + length):
+            if addr not in MX_STATIC_REGISTERS or not self.shadow_valid[addr]:
+                return False
+        return True
+
+    def shadow_value(self, address, length):
+        if length == 1:
+            return self.shadow[address]
+        return DXL_MAKEWORD(self.shadow[address], self.shadow[address + 1])
+
+    def update_shadow(self, address, data):
+        self.shadow[address:address + len(data)] = bytearray(data)
+        for addr in range(address, address + len(data)):
+            self.shadow_valid[addr] = True
+
+    def invalidate_cache(self, address=None, length=1):
+        '''Forget the shadow copy of some registers (all of them if address is None).
+        Call it when the servo was power cycled or configured by another program.
+        '''
+        if address is None:
+            self.shadow_valid = [False] * MX_CONTROL_TABLE_SIZE
+        else:
+            for addr in range(address, address + length):
+                self.shadow_valid[addr] = False
+
+    def refresh_cache(self):
+        # reload the shadow of registers 0~35 from the servo in a single READ
+        data, dxl_result, dxl_error = self.packet.readTxRx(self.port, self.servo_id, 0, ADDR_MX_TORQUE_LIMIT + 2)
+        self.invalidate_cache()
+        if self.check_com(dxl_result, dxl_error):
+            self.update_shadow(0, data)
+            return 1
+        return 0
+
     # The following function can be applied to check the status of the servo(s)
     def read_current_pos(self):
         dxl_present_position, dxl_result, dxl_error = self.packet.read2ByteTxRx(self.port, self.servo_id, ADDR_MX_PRESENT_POSITION)
@@ -99,6 +309,12 @@ class Robotis_Servo():
         if self.check_com(dxl_result, dxl_error):
             return dxl_goal_position
 
+    def read_state(self):
+        # position, speed, load, voltage, temperature and moving in a single READ, returns a Servo_State
+        data, dxl_result, dxl_error = self.packet.readTxRx(self.port, self.servo_id, ADDR_MX_PRESENT_POSITION, MX_STATE_LENGTH)
+        if self.check_com(dxl_result, dxl_error):
+            return decode_state(data)
+
     def is_moving(self):
         # check if the servo is moving
         dxl_is_moving, dxl_result, dxl_error = self.packet.read1ByteTxRx(self.port, self.servo_id,ADDR_MX_MOVING)
@@ -113,117 +329,152 @@ class Robotis_Servo():
     def read_load(self):
         dxl_load, dxl_result, dxl_error = self.packet.read2ByteTxRx(self.port, self.servo_id, ADDR_MX_LOAD)
         if self.check_com(dxl_result, dxl_error):
-            if dxl_load <=1023 and dxl_load != 0 :
-                print("Load works to the CCW direction")
-                return dxl_load
-            elif dxl_load > 1024:
-                print("Load works to the CW direction")
-                return 1024 - dxl_load
-            elif dxl_load == 0:
-                print("No load works")
-                return dxl_load
+            # bit 10 is the direction, 1024 is no load in the CW direction
+            load = decode_load(dxl_load)
+            if load > 0:
+                logger.debug("Load works to the CCW direction")
+            elif load < 0:
+                logger.debug("Load works to the CW direction")
+            else:
+                logger.debug("No load works")
+            return load
 
     def read_speed(self):
         dxl_speed, dxl_result, dxl_error = self.packet.read2ByteTxRx(self.port, self.servo_id, ADDR_MX_SPEED)
         if self.check_com(dxl_result, dxl_error):
-            if dxl_speed <=1023 and dxl_speed != 0 :
-                print("Servo is running in the CCW direction")
-                speed_rpm = dxl_speed * 0.11
-                return speed_rpm
-            elif dxl_speed > 1024:
-                print("Servo is running in the CW direction")
-                speed_rpm = (1024 - dxl_speed) * 0.11
-                return speed_rpm
-            elif dxl_speed == 0:
-                print("Servo is not running")
-                return dxl_speed
+            speed_rpm = decode_speed(dxl_speed)
+            if speed_rpm > 0:
+                logger.debug("Servo is running in the CCW direction")
+            elif speed_rpm < 0:
+                logger.debug("Servo is running in the CW direction")
+            else:
+                logger.debug("Servo is not running")
+            return speed_rpm
 
     # The following function can be applied for movement or change the parameters of movement
-    def goto(self, position):
-        # go to the position
+    def check_goal(self, position):
+        # check if the position can be reached in the current moving mode
         mode = self.check_move_mode()
         if mode=='wheel':
-            print("goto function cannot be applied on wheel mode, please change to another mode")
+            logger.error("goto function cannot be applied on wheel mode, please change to another mode")
         elif mode=='joint':
             cw_limit = self.check_cw_limit()
             ccw_limit = self.check_ccw_limit()
             if position>max(cw_limit,ccw_limit) or position<min(cw_limit,ccw_limit):
-                print("The input position value is invalid, which is out of the range of cw and ccw angle limit")
+                logger.error("The input position value is invalid, which is out of the range of cw and ccw angle limit")
             else:
-                dxl_result, dxl_error = self.packet.write2ByteTxRx(self.port, self.servo_id, ADDR_MX_GOAL_POSITION,position)
-                self.check_com(dxl_result, dxl_error)
+                return True
         elif mode=='multiturn':
             if position>28672 or position<-28672:
-                print("The input position is invalid, which is out of range, valid range is -28672~28672")
+                logger.error("The input position is invalid, which is out of range, valid range is -28672~28672")
             else:
-                dxl_result, dxl_error = self.packet.write2ByteTxRx(self.port, self.servo_id, ADDR_MX_GOAL_POSITION, position)
-                self.check_com(dxl_result, dxl_error)
+                return True
+        return False
+
+    def goto(self, position):
+        # go to the position, returns 1 if the goal was written
+        if self.check_goal(position):
+            return self.write_register(ADDR_MX_GOAL_POSITION, 2, position)
+        return 0
+
+    def reg_goto(self, position, speed=None):
+        '''
+        Stage the goal position (and the moving speed) with REG_WRITE, the servo
+        only starts moving on the next ACTION, see Motion_Transaction.
+        A servo keeps a single staged write, staging again replaces it.
+        '''
+        if not self.check_goal(position):
+            return 0
+        data = [DXL_LOBYTE(position), DXL_HIBYTE(position)]
+        if speed is not None:
+            if speed<0 or speed>1023:
+                logger.error("Input speed is not valid, which is out of range. The valid range is [0,1023]")
+                return 0
+            # goal position and moving speed are contiguous (30~33)
+            data += [DXL_LOBYTE(speed), DXL_HIBYTE(speed)]
+
+        dxl_result, dxl_error = self.packet.regWriteTxRx(self.port, self.servo_id, ADDR_MX_GOAL_POSITION, len(data), data)
+        if self.check_com(dxl_result, dxl_error):
+            self.registered_write = data
+            return 1
+        return 0
+
+    def unstage(self):
+        # replace the staged write by the current goal, so a later ACTION does not move the servo
+        if self.registered_write is None:
+            return 1
+        goal_position = self.read_goal_position()
+        if goal_position is None:
+            return 0
+        data = [DXL_LOBYTE(goal_position), DXL_HIBYTE(goal_position)]
+        dxl_result, dxl_error = self.packet.regWriteTxRx(self.port, self.servo_id, ADDR_MX_GOAL_POSITION, 2, data)
+        if self.check_com(dxl_result, dxl_error):
+            self.registered_write = None
+            return 1
+        return 0
+
+    def registered_done(self):
+        # the staged write was executed by an ACTION, keep the shadow in step
+        if self.registered_write is not None:
+            self.update_shadow(ADDR_MX_GOAL_POSITION, self.registered_write)
+            self.registered_write = None
 
     def enable_torque(self):
-        dxl_result, dxl_error = self.packet.write1ByteTxRx(self.port, self.servo_id, ADDR_MX_TORQUE_ENABLE,1)
-        if self.check_com(dxl_result, dxl_error) == 0:
-            print("Unable to enable torque")
+        if self.write_register(ADDR_MX_TORQUE_ENABLE, 1, 1) == 0:
+            logger.error("Unable to enable torque")
 
     def disable_torque(self):
-        dxl_result, dxl_error = self.packet.write1ByteTxRx(self.port, self.servo_id, ADDR_MX_TORQUE_ENABLE,0)
-        if self.check_com(dxl_result, dxl_error) ==0:
-            print("Unable to disable torque")
+        if self.write_register(ADDR_MX_TORQUE_ENABLE, 1, 0) == 0:
+            logger.error("Unable to disable torque")
 
     def wheel_set_speed(self, direction, speed):
         mode = self.check_move_mode()
         if mode=="wheel":
             if speed<0 or speed>2047:
-                print("Input speed is not valid, which is out of range. The valid range is [0,1023]")
+                logger.error("Input speed is not valid, which is out of range. The valid range is [0,1023]")
             elif direction == "CW":
                 speed += 1024
-                dxl_result, dxl_error = self.packet.write2ByteTxRx(self.port, self.servo_id, ADDR_MX_MOVING_SPEED, speed)
-                self.check_com(dxl_result, dxl_error)
+                self.write_register(ADDR_MX_MOVING_SPEED, 2, speed)
             elif direction == "CCW":
-                dxl_result, dxl_error = self.packet.write2ByteTxRx(self.port, self.servo_id, ADDR_MX_MOVING_SPEED, speed)
-                self.check_com(dxl_result, dxl_error)
+                self.write_register(ADDR_MX_MOVING_SPEED, 2, speed)
         else:
-            print("Current moving mode is not wheel mode, please change the mode to wheel mode and then use this function")
+            logger.error("Current moving mode is not wheel mode, please change the mode to wheel mode and then use this function")
 
     def joint_set_speed(self, speed):
         mode = self.check_move_mode()
         if mode=="joint":
             if speed<0 or speed>1023:
-                print("Input speed is not valid, which is out of range. The valid range is [0,1023]")
+                logger.error("Input speed is not valid, which is out of range. The valid range is [0,1023]")
             else:
-                dxl_result, dxl_error = self.packet.write2ByteTxRx(self.port, self.servo_id, ADDR_MX_MOVING_SPEED, speed)
-                self.check_com(dxl_result, dxl_error)
+                self.write_register(ADDR_MX_MOVING_SPEED, 2, speed)
         else:
-            print("Current moving mode is not joint mode, please change the mode to wheel mode and then use this function")
+            logger.error("Current moving mode is not joint mode, please change the mode to wheel mode and then use this function")
 
     def multiturn_set_speed(self, speed):
         mode = self.check_move_mode()
         if mode=="multiturn":
             if speed<0 or speed>1023:
-                print("Input speed is not valid, which is out of range. The valid range is [0,1023]")
+                logger.error("Input speed is not valid, which is out of range. The valid range is [0,1023]")
             else:
-                dxl_result, dxl_error = self.packet.write2ByteTxRx(self.port, self.servo_id, ADDR_MX_MOVING_SPEED, speed)
-                self.check_com(dxl_result, dxl_error)
+                self.write_register(ADDR_MX_MOVING_SPEED, 2, speed)
         else:
-            print("Current moving mode is not joint mode, please change the mode to wheel mode and then use this function")
+            logger.error("Current moving mode is not joint mode, please change the mode to wheel mode and then use this function")
 
     def set_torque(self,torque):
         if torque>1023 or torque<0:
-            print("Invalid input torque value")
+            logger.error("Invalid input torque value")
         else:
-            dxl_result, dxl_error = self.packet.write2ByteTxRx(self.port, self.servo_id, ADDR_MX_MOVING_SPEED, speed)
-            self.check_com(dxl_result, dxl_error)
+            self.write_register(ADDR_MX_TORQUE_LIMIT, 2, torque)
 
 
     # The following functions can be applied to Change the movement mode and working range
     def set_cw_limit(self,num):
-        dxl_result, dxl_error = self.packet.write2ByteTxRx(self.port, self.servo_id, ADDR_MX_CW_LIMIT, int(num))
-        if self.check_com(dxl_result, dxl_error)==0:
-            print("Fail to set CW limit to position %d" % int(num))
+        if self.write_register(ADDR_MX_CW_LIMIT, 2, int(num)) == 0:
+            logger.error("Fail to set CW limit to position %d", int(num))
 
     def set_ccw_limit(self, num):
-        dxl_result, dxl_error = self.packet.write2ByteTxRx(self.port, self.servo_id, ADDR_MX_CCW_LIMIT, int(num))
-        if self.check_com(dxl_result, dxl_error)==0:
-            print("Fail to set CW limit to position %d" % int(num))
+        if self.write_register(ADDR_MX_CCW_LIMIT, 2, int(num)) == 0:
+            logger.error("Fail to set CW limit to position %d", int(num))
 
     def init_joint_mode(self, cw_limit, cww_limit):
         self.set_cw_limit(cw_limit)
@@ -243,18 +494,17 @@ class Robotis_Servo():
 
     # The following functions can be applied to check the movement mode and working range
     def check_cw_limit(self):
-        cw_limit, dxl_result, dxl_error = self.packet.read2ByteTxRx(self.port, self.servo_id, ADDR_MX_CW_LIMIT)
-        if self.check_com(dxl_result, dxl_error):
-            return cw_limit
+        return self.read_register(ADDR_MX_CW_LIMIT, 2)
 
     def check_ccw_limit(self):
-        ccw_limit, dxl_result, dxl_error = self.packet.read2ByteTxRx(self.port, self.servo_id, ADDR_MX_CCW_LIMIT)
-        if self.check_com(dxl_result, dxl_error):
-            return ccw_limit
+        return self.read_register(ADDR_MX_CCW_LIMIT, 2)
 
     def check_move_mode(self):
         cw_limit = self.check_cw_limit()
         ccw_limit = self.check_ccw_limit()
+        if cw_limit is None or ccw_limit is None:
+            # the limits could not be read, even after the retries of the packet handler
+            return None
 
         if cw_limit==0 and ccw_limit==0:
             return "wheel"
@@ -267,10 +517,10 @@ class Robotis_Servo():
 
     def check_com(self,result,error):
         if result != COMM_SUCCESS:
-            print("%s" % self.packet.getTxRxResult(result))
+            logger.warning("[ID:%03d] %s", self.servo_id, self.packet.getTxRxResult(result))
             return 0
         elif error != 0:
-            print("%s" % self.packet.getRxPacketError(error))
+            logger.warning("[ID:%03d] %s", self.servo_id, self.packet.getRxPacketError(error))
             return 0
         else:
             return 1
@@ -284,32 +534,84 @@ class TwoServo(Robotis_Servo):
         self.id2 = id2
 
     def multigoto(self, ID1Pos, ID2Pos):
-        groupSyncWrite = GroupSyncWrite(self.port, self.packet,ADDR_MX_GOAL_POSITION,4)
+        # returns 1 if the goals were sent
+        groupSyncWrite = GroupSyncWrite(self.port, self.packet, ADDR_MX_GOAL_POSITION, 2)
 
-        param_id1pos = [DXL_LOBYTE(DXL_LOWORD(ID1Pos)),DXL_HIBYTE(DXL_LOWORD(ID1Pos)),DXL_LOBYTE(DXL_HIWORD(ID1Pos)),
-                        DXL_HIBYTE(DXL_HIWORD(ID1Pos))]
-        param_id2pos = [DXL_LOBYTE(DXL_LOWORD(ID2Pos)),DXL_HIBYTE(DXL_LOWORD(ID2Pos)),DXL_LOBYTE(DXL_HIWORD(ID2Pos)),
-                        DXL_HIBYTE(DXL_HIWORD(ID2Pos))]
+        param_id1pos = [DXL_LOBYTE(ID1Pos), DXL_HIBYTE(ID1Pos)]
+        param_id2pos = [DXL_LOBYTE(ID2Pos), DXL_HIBYTE(ID2Pos)]
 
         dxl_addparam_result = groupSyncWrite.addParam(self.id1, param_id1pos)
         if dxl_addparam_result != True:
-            print("[ID:%03d] groupSyncWrite addparam failed" % self.id1)
-            quit()
+            logger.error("[ID:%03d] groupSyncWrite addparam failed", self.id1)
+            return 0
         else:
-            print("[ID:%03d] groupSyncWrite addparam successed" % self.id1)
+            logger.debug("[ID:%03d] groupSyncWrite addparam successed", self.id1)
 
         dxl_addparam_result = groupSyncWrite.addParam(self.id2, param_id2pos)
         if dxl_addparam_result != True:
-            print("[ID:%03d] groupSyncWrite addparam failed" % self.id1)
-            quit()
+            logger.error("[ID:%03d] groupSyncWrite addparam failed", self.id2)
+            return 0
         else:
-            print("[ID:%03d] groupSyncWrite addparam successed" % self.id1)
+            logger.debug("[ID:%03d] groupSyncWrite addparam successed", self.id2)
 
         dxl_comm_result = groupSyncWrite.txPacket()
+        groupSyncWrite.clearParam()
         if dxl_comm_result != COMM_SUCCESS:
-            print("%s" % self.packet.getTxRxResult(dxl_comm_result))
+            logger.warning("%s", self.packet.getTxRxResult(dxl_comm_result))
+            return 0
+        return 1
+
+class Motion_Transaction():
+    '''
+    Start several servos on the same port at the same time: every servo is staged
+    with REG_WRITE, then a single broadcast ACTION starts all of them.
+
+    example:
+        with Motion_Transaction(port, packet) as motion:
+            motion.stage(servo1, 1500, 100)
+            motion.stage(servo2, 1200, 100)
+        # both servos start on leaving the block
+    '''
+    def __init__(self, port, packet):
+        self.port = port
+        self.packet = packet
+        self.staged = []
 
-        groupSyncWrite.clearParam()
+    def stage(self, servo, position, speed=None):
+        # goal position and optional moving speed of one servo, returns 1 if it was staged
+        if servo.reg_goto(position, speed):
+            if servo not in self.staged:
+                self.staged.append(servo)
+            return 1
+        return 0
+
+    def commit(self):
+        # start all the staged servos
+        if not self.staged:
+            return 0
+        dxl_result = self.packet.action(self.port, BROADCAST_ID)
+        if dxl_result != COMM_SUCCESS:
+            logger.warning("%s", self.packet.getTxRxResult(dxl_result))
+            return 0
+        for servo in self.staged:
+            servo.registered_done()
+        self.staged = []
+        return 1
+
+    def abort(self):
+        # drop the staged moves, a later ACTION will not move these servos
+        for servo in self.staged:
+            servo.unstage()
+        self.staged = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
 
 
 '''
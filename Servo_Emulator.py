@@ -0,0 +1,600 @@
+'''
+Software Dynamixel MX-28 speaking Protocol 1.0, so the code in
+"Robotic_Servos.py" and "UCD_Hand.py" can be run, load-tested and profiled
+without a gripper on the desk.
+
+- MX28_Emulator: one servo, with the MX-28 control table, position/speed
+  dynamics toward the goal, a load model (including a rigid obstacle to
+  simulate grasping an object) and fault injection (checksum corruption and
+  lost status packets).
+- Emulated_Bus: several emulated servos on one bus. It parses instruction
+  packets and returns the status packets together with the time they would
+  finish arriving at the host (return delay plus on-wire time).
+- EmulatedPortHandler: an in-memory, PortHandler-compatible transport, e.g.
+  Robotis_Servo(EmulatedPortHandler(bus), openpacket(), 1)
+- Pty_Bus: serves an Emulated_Bus on a pseudo terminal, so the normal
+  PortHandler/openport can be used on it, e.g. PT_O(pty_bus.port_name, 2)
+
+Run "python Servo_Emulator.py --ids 2" to start an emulated bus on a pty and
+print its device name.
+'''
+
+import os
+import time
+import random
+import select
+import threading
+import collections
+import multiprocessing
+
+from Robotic_Servos import *
+
+MX28_MODEL_NUMBER = 29
+MX28_FIRMWARE_VERSION = 41
+MX28_TICKS_PER_REV = 4096
+MX28_RPM_PER_UNIT = 0.114
+MX28_NO_LOAD_RPM = 55.0  # at 12V
+MX28_MULTITURN_RANGE = 28672
+POSITION_TOLERANCE = 1  # moving register clears when the position is this close to the goal
+
+# Status return level
+STATUS_RETURN_NONE = 0  # only PING is answered
+STATUS_RETURN_READ = 1  # only PING and READ are answered
+STATUS_RETURN_ALL = 2
+LATE_DELAY = 0.05  # sec, how much later than due a 'late' status packet arrives, past any learned slack
+
+TCGETS2 = 0x802C542A  # Linux ioctl to read the baud rate set on a pty
+
+
+def to_signed16(value):
+    return value - 0x10000 if value & 0x8000 else value
+
+
+def checksum(packet):
+    return ~sum(packet[2:]) & 0xFF
+
+
+def status_packet(servo_id, error, params=b''):
+    packet = bytearray([0xFF, 0xFF, servo_id, len(params) + 2, error]) + bytearray(params)
+    packet.append(checksum(packet))
+    return packet
+
+
+class MX28_Emulator():
+    def __init__(self, servo_id=1, baud_register=34, return_delay_register=250, voltage=12.0, seed=None):
+        '''
+        Parameters
+        ----------
+        servo_id : ID of the emulated servo
+        baud_register : value of the baud rate register, 34 = 57600 bps (factory default is 34)
+        return_delay_register : value of the return delay register, 2usec per unit (factory default is 250)
+        voltage : supply voltage in V
+        seed : seed of the random generator used by the fault injection and the load noise
+        '''
+        self.servo_id = servo_id
+        self.voltage = voltage
+        self.random = random.Random(seed)
+        self.reset(servo_id, baud_register, return_delay_register)
+
+        # fault injection, rates are probabilities per status packet
+        self.corrupt_rate = 0.0
+        self.timeout_rate = 0.0
+        self.faults = collections.deque()  # queued one-shot faults: 'corrupt', 'timeout' or 'late'
+        self.missed_instructions = 0  # instruction packets the servo won't hear, see miss_instructions
+
+        # load model: friction plus an optional rigid obstacle
+        self.load_noise = 0.0
+        self.obstacle = None
+        self.obstacle_direction = 1
+        self.stiffness = 2.0  # load units per tick the goal is pushed past the obstacle
+
+    def reset(self, servo_id=1, baud_register=34, return_delay_register=250):
+        # factory defaults of the MX-28 control table
+        self.table = bytearray(MX_CONTROL_TABLE_SIZE)
+        self.write_value(ADDR_MX_MODEL_NUMBER, 2, MX28_MODEL_NUMBER)
+        self.table[ADDR_MX_FIRMWARE] = MX28_FIRMWARE_VERSION
+        self.table[ADDR_MX_ID] = servo_id
+        self.table[ADDR_MX_BAUD_RATE] = baud_register
+        self.table[ADDR_MX_RETURN_DELAY] = return_delay_register
+        self.write_value(ADDR_MX_CW_LIMIT, 2, 0)
+        self.write_value(ADDR_MX_CCW_LIMIT, 2, 4095)
+        self.table[11] = 80  # highest limit temperature
+        self.table[12] = 60  # lowest limit voltage
+        self.table[13] = 160  # highest limit voltage
+        self.write_value(ADDR_MX_MAX_TORQUE, 2, 1023)
+        self.table[ADDR_MX_STATUS_RETURN_LEVEL] = STATUS_RETURN_ALL
+        self.table[17] = 36  # alarm LED
+        self.table[18] = 36  # alarm shutdown
+        self.table[22] = 1  # resolution divider
+        self.table[28] = 32  # P gain
+        self.write_value(ADDR_MX_TORQUE_LIMIT, 2, 1023)
+        self.table[ADDR_MX_VOLTAGE] = int(round(self.voltage * 10))
+        self.table[ADDR_MX_TEMPERATURE] = 35
+        self.registered = None
+        self.position = 2048.0
+        self.velocity = 0.0  # ticks per second
+        self.load = 0
+        self.update_present()
+
+    # The following functions access the control table
+    def read_value(self, address, length):
+        if length == 1:
+            return self.table[address]
+        return DXL_MAKEWORD(self.table[address], self.table[address + 1])
+
+    def write_value(self, address, length, value):
+        self.table[address] = DXL_LOBYTE(value)
+        if length == 2:
+            self.table[address + 1] = DXL_HIBYTE(value)
+
+    @property
+    def baudrate(self):
+        return baudrate_from_register(self.table[ADDR_MX_BAUD_RATE])
+
+    @property
+    def return_delay(self):
+        return self.table[ADDR_MX_RETURN_DELAY] * 2e-6
+
+    def mode(self):
+        cw_limit = self.read_value(ADDR_MX_CW_LIMIT, 2)
+        ccw_limit = self.read_value(ADDR_MX_CCW_LIMIT, 2)
+        if cw_limit == 0 and ccw_limit == 0:
+            return "wheel"
+        if cw_limit == 4095 and ccw_limit == 4095:
+            return "multiturn"
+        return "joint"
+
+    def goal(self):
+        goal = self.read_value(ADDR_MX_GOAL_POSITION, 2)
+        if self.mode() == "multiturn":
+            return to_signed16(goal)
+        return goal
+
+    def torque_enabled(self):
+        return self.table[ADDR_MX_TORQUE_ENABLE] != 0
+
+    # The following functions simulate the servo
+    def set_obstacle(self, position, stiffness=2.0):
+        '''Put a rigid object at position, it blocks any motion from the current
+        position across it, e.g. a part between the fingers. None removes it.'''
+        self.obstacle = position
+        self.stiffness = stiffness
+        if position is not None:
+            self.obstacle_direction = 1 if position >= self.position else -1
+
+    def step(self, dt):
+        # advance the dynamics by dt seconds
+        if dt <= 0:
+            return
+        max_rpm = MX28_NO_LOAD_RPM * self.voltage / 12.0
+        speed = self.read_value(ADDR_MX_MOVING_SPEED, 2)
+        previous = self.position
+        contact_load = 0
+
+        if not self.torque_enabled():
+            self.velocity = 0.0
+        elif self.mode() == "wheel":
+            rpm = min((speed & 0x3FF) * MX28_RPM_PER_UNIT, max_rpm)
+            direction = -1 if speed & 0x400 else 1
+            self.position += direction * rpm / 60.0 * MX28_TICKS_PER_REV * dt
+        else:
+            rpm = max_rpm if speed == 0 else min(speed * MX28_RPM_PER_UNIT, max_rpm)
+            max_step = rpm / 60.0 * MX28_TICKS_PER_REV * dt
+            error = self.goal() - self.position
+            self.position += max(-max_step, min(max_step, error))
+
+        if self.obstacle is not None:
+            if (self.position - self.obstacle) * self.obstacle_direction > 0:
+                self.position = float(self.obstacle)
+            if self.torque_enabled() and self.position == self.obstacle:
+                push = (self.goal() - self.obstacle) * self.obstacle_direction
+                contact_load = int(min(self.read_value(ADDR_MX_TORQUE_LIMIT, 2), max(0, push) * self.stiffness))
+
+        self.velocity = (self.position - previous) / dt
+        rpm = abs(self.velocity) * 60.0 / MX28_TICKS_PER_REV
+        friction_load = 30 + 100 * rpm / max_rpm if rpm > 0 else 0
+        load = max(friction_load, contact_load)
+        if self.load_noise:
+            load += self.random.gauss(0, self.load_noise)
+        load = int(max(0, min(1023, load)))
+        direction = self.velocity if self.velocity != 0 else contact_load * self.obstacle_direction
+        self.load = load if direction >= 0 else -load
+        self.update_present()
+
+    def update_present(self):
+        if not self.torque_enabled():
+            # goal follows the present position while the torque is off
+            self.write_value(ADDR_MX_GOAL_POSITION, 2, int(round(self.position)))
+        mode = self.mode()
+        if mode == "multiturn":
+            position = int(round(self.position))
+            position = max(-MX28_MULTITURN_RANGE, min(MX28_MULTITURN_RANGE, position))
+        elif mode == "wheel":
+            position = int(round(self.position)) % MX28_TICKS_PER_REV
+        else:
+            position = max(0, min(4095, int(round(self.position))))
+        self.write_value(ADDR_MX_PRESENT_POSITION, 2, position)
+
+        speed = min(1023, int(abs(self.velocity) * 60.0 / MX28_TICKS_PER_REV / MX28_RPM_PER_UNIT))
+        self.write_value(ADDR_MX_SPEED, 2, speed if self.velocity >= 0 else speed | 0x400)
+        self.write_value(ADDR_MX_LOAD, 2, self.load if self.load >= 0 else -self.load | 0x400)
+        self.table[ADDR_MX_VOLTAGE] = int(round(self.voltage * 10))
+
+        moving = self.torque_enabled() and mode != "wheel" and abs(self.goal() - self.position) > POSITION_TOLERANCE
+        self.table[ADDR_MX_MOVING] = 1 if moving or (mode == "wheel" and self.velocity != 0) else 0
+        self.table[ADDR_MX_REGISTERED] = 1 if self.registered is not None else 0
+
+    # The following functions execute instructions
+    def write(self, address, data):
+        # write data to the control table the way the firmware does, return the error bits
+        if address + len(data) > MX_CONTROL_TABLE_SIZE:
+            return ERRBIT_RANGE
+        if address <= ADDR_MX_GOAL_POSITION + 1 < address + len(data) and self.mode() == "joint":
+            goal = DXL_MAKEWORD(*self.peek(address, data, ADDR_MX_GOAL_POSITION))
+            cw_limit = self.read_value(ADDR_MX_CW_LIMIT, 2)
+            ccw_limit = self.read_value(ADDR_MX_CCW_LIMIT, 2)
+            if goal < min(cw_limit, ccw_limit) or goal > max(cw_limit, ccw_limit):
+                return ERRBIT_ANGLE
+
+        for offset, value in enumerate(bytearray(data)):
+            addr = address + offset
+            if addr <= ADDR_MX_FIRMWARE or ADDR_MX_PRESENT_POSITION <= addr <= ADDR_MX_MOVING:
+                continue  # read only
+            self.table[addr] = value
+
+        if address <= ADDR_MX_GOAL_POSITION + 1 < address + len(data):
+            self.table[ADDR_MX_TORQUE_ENABLE] = 1  # writing a goal turns the torque on
+        if address <= ADDR_MX_ID < address + len(data):
+            self.servo_id = self.table[ADDR_MX_ID]
+        self.update_present()
+        return 0
+
+    def peek(self, address, data, register):
+        # the two bytes of register after writing data at address
+        word = self.table[register:register + 2]
+        for offset, value in enumerate(bytearray(data)):
+            if register <= address + offset < register + 2:
+                word[address + offset - register] = value
+        return word
+
+    def execute(self, instruction, params, checksum_ok=True):
+        '''Execute one instruction addressed to this servo.
+        return : (error, status parameters) or None if the instruction is not answered'''
+        level = self.table[ADDR_MX_STATUS_RETURN_LEVEL]
+        if not checksum_ok:
+            return (ERRBIT_CHECKSUM, b'') if level == STATUS_RETURN_ALL else None
+
+        if instruction == INST_PING:
+            return 0, b''
+        elif instruction == INST_READ:
+            address, length = params[0], params[1]
+            if address + length > MX_CONTROL_TABLE_SIZE:
+                status = ERRBIT_RANGE, b''
+            else:
+                status = 0, bytes(self.table[address:address + length])
+            return status if level >= STATUS_RETURN_READ else None
+        elif instruction == INST_WRITE:
+            error = self.write(params[0], params[1:])
+        elif instruction == INST_REG_WRITE:
+            self.registered = (params[0], bytes(params[1:]))
+            self.update_present()
+            error = 0
+        elif instruction == INST_ACTION:
+            error = self.action()
+        elif instruction == INST_FACTORY_RESET:
+            self.reset()
+            self.servo_id = 1
+            error = 0
+        else:
+            error = ERRBIT_INSTRUCTION
+        return (error, b'') if level == STATUS_RETURN_ALL else None
+
+    def action(self):
+        if self.registered is None:
+            return ERRBIT_INSTRUCTION
+        address, data = self.registered
+        self.registered = None
+        return self.write(address, data)
+
+    def fault(self):
+        # the fault to apply to the next status packet: None, 'corrupt', 'timeout' or 'late'
+        if self.faults:
+            return self.faults.popleft()
+        if self.timeout_rate and self.random.random() < self.timeout_rate:
+            return 'timeout'
+        if self.corrupt_rate and self.random.random() < self.corrupt_rate:
+            return 'corrupt'
+        return None
+
+    def inject_fault(self, kind, count=1):
+        '''Make the next count status packets fail, kind is 'corrupt' (one byte of
+        the packet is flipped), 'timeout' (the packet is never sent) or 'late' (the
+        packet arrives LATE_DELAY seconds after it is due).'''
+        self.faults.extend([kind] * count)
+
+    def miss_instructions(self, count=1):
+        '''Make the servo miss the next count instruction packets sent at its baud
+        rate, e.g. a broadcast lost on the wire.'''
+        self.missed_instructions += count
+
+    def hears(self):
+        # False, once per missed instruction packet
+        if self.missed_instructions:
+            self.missed_instructions -= 1
+            return False
+        return True
+
+
+class Emulated_Bus():
+    def __init__(self, servos=(), baudrate=57600):
+        '''
+        servos : MX28_Emulator instances (or servo IDs) on the bus
+        baudrate : baud rate the host is using, servos with another baud rate do not hear it
+        '''
+        self.servos = collections.OrderedDict()
+        for servo in servos:
+            self.add_servo(servo if isinstance(servo, MX28_Emulator) else MX28_Emulator(servo))
+        self.baudrate = baudrate
+        self.stream = bytearray()
+        self.last_time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def add_servo(self, servo):
+        self.servos[servo.servo_id] = servo
+        return servo
+
+    def servo(self, servo_id):
+        for servo in self.servos.values():
+            if servo.servo_id == servo_id:
+                return servo
+        return None
+
+    def listening(self):
+        # servos whose baud rate is within 3% of the host's one
+        return [servo for servo in self.servos.values()
+                if abs(servo.baudrate - self.baudrate) <= 0.03 * self.baudrate]
+
+    def advance(self, now=None):
+        # run the servo dynamics up to now
+        now = time.monotonic() if now is None else now
+        dt = now - self.last_time
+        self.last_time = now
+        for servo in self.servos.values():
+            servo.step(dt)
+
+    def process(self, data, now=None):
+        '''Feed bytes written by the host.
+        return : list of (time the status packet is fully received, status packet)'''
+        with self.lock:
+            now = time.monotonic() if now is None else now
+            self.advance(now)
+            self.stream.extend(bytearray(data))
+            replies = []
+            byte_time = 10.0 / self.baudrate
+
+            while True:
+                start = self.stream.find(b'\xff\xff')
+                if start < 0:
+                    del self.stream[:max(0, len(self.stream) - 1)]
+                    break
+                del self.stream[:start]
+                if len(self.stream) < 4:
+                    break
+                end = self.stream[3] + 4
+                if len(self.stream) < end:
+                    break
+                packet = bytes(self.stream[:end])
+                del self.stream[:end]
+
+                ready_time = now + len(packet) * byte_time
+                answers = self.dispatch(packet)
+                if len(answers) > 1 and bytearray(packet)[2] == BROADCAST_ID and bytearray(packet)[4] == INST_PING:
+                    # Protocol 1.0 servos all answer a broadcast PING at once, the replies collide
+                    # on the wire (a low bit of any of them wins)
+                    collided = bytearray(b'\xff' * 6)
+                    for servo, status in answers:
+                        collided = bytearray(x & y for x, y in zip(collided, status_packet(servo.servo_id, status[0])))
+                    ready_time += max(servo.return_delay for servo, _ in answers) + len(collided) * byte_time
+                    replies.append((ready_time, bytes(collided)))
+                    continue
+                for servo, status in answers:
+                    fault = servo.fault()
+                    if fault == 'timeout':
+                        continue
+                    reply = status_packet(servo.servo_id, status[0], status[1])
+                    if fault == 'corrupt':
+                        index = servo.random.randrange(2, len(reply))
+                        reply[index] ^= 1 << servo.random.randrange(8)
+                    ready_time += servo.return_delay + len(reply) * byte_time
+                    replies.append((ready_time + (LATE_DELAY if fault == 'late' else 0.0), bytes(reply)))
+            return replies
+
+    def dispatch(self, packet):
+        # return [(servo, (error, params))] in the order the servos answer
+        servo_id, instruction = bytearray(packet)[2], bytearray(packet)[4]
+        params = bytearray(packet[5:-1])
+        checksum_ok = bytearray(packet)[-1] == checksum(bytearray(packet[:-1]))
+        servos = [servo for servo in self.listening() if servo.hears()]
+        answers = []
+
+        if servo_id != BROADCAST_ID:
+            for servo in servos:
+                if servo.servo_id == servo_id:
+                    status = servo.execute(instruction, params, checksum_ok)
+                    if status is not None:
+                        answers.append((servo, status))
+            return answers
+
+        if not checksum_ok:
+            return answers
+        if instruction == INST_PING:
+            answers = [(servo, (0, b'')) for servo in servos]
+        elif instruction in (INST_WRITE, INST_REG_WRITE, INST_ACTION):
+            for servo in servos:
+                servo.execute(instruction, params)
+        elif instruction == INST_SYNC_WRITE:
+            address, length = params[0], params[1]
+            for idx in range(2, len(params), length + 1):
+                for servo in servos:
+                    if servo.servo_id == params[idx]:
+                        servo.write(address, params[idx + 1:idx + 1 + length])
+        elif instruction == INST_BULK_READ:
+            for idx in range(1, len(params), 3):
+                length, target, address = params[idx], params[idx + 1], params[idx + 2]
+                for servo in servos:
+                    if servo.servo_id == target:
+                        status = servo.execute(INST_READ, bytearray([address, length]))
+                        if status is not None:
+                            answers.append((servo, status))
+        return answers
+
+
+class EmulatedPortHandler(PortHandler):
+    # In-memory transport to an Emulated_Bus with the PortHandler interface
+    def __init__(self, bus, port_name='emulated'):
+        PortHandler.__init__(self, port_name)
+        self.bus = bus
+        self.incoming = collections.deque()  # (ready time, status packet)
+
+    def setupPort(self, cflag_baud):
+        self.is_open = True
+        self.bus.baudrate = self.baudrate
+        self.incoming.clear()
+        self.rx_buffer_length = 0
+        self.tx_time_per_byte = (1000.0 / self.baudrate) * 10.0
+        return True
+
+    def closePort(self):
+        self.is_open = False
+
+    def clearPort(self):
+        pass
+
+    def resyncPort(self):
+        # drop the status packets that have arrived, the ones still on their way stay
+        now = time.monotonic()
+        while self.incoming and self.incoming[0][0] <= now:
+            self.incoming.popleft()
+        self.rx_buffer_length = 0
+
+    def canWaitPort(self):
+        return True
+
+    def waitPort(self):
+        time_left = self.packet_timeout - self.getTimeSinceStart()
+        if time_left <= 0.0:
+            return False
+        if self.incoming:
+            time_left = min(time_left, (self.incoming[0][0] - time.monotonic()) * 1000.0)
+        if time_left > 0.0:
+            time.sleep(time_left / 1000.0)
+        return self.getBytesAvailable() > 0
+
+    def getBytesAvailable(self):
+        now = time.monotonic()
+        return sum(len(reply) for ready_time, reply in self.incoming if ready_time <= now)
+
+    def readPort(self, length):
+        now = time.monotonic()
+        data = bytearray()
+        while self.incoming and self.incoming[0][0] <= now and len(data) < length:
+            ready_time, reply = self.incoming.popleft()
+            take = length - len(data)
+            data.extend(reply[:take])
+            if len(reply) > take:
+                self.incoming.appendleft((ready_time, reply[take:]))
+        return bytes(data)
+
+    def writePort(self, packet):
+        replies = self.bus.process(bytes(bytearray(packet)))
+        if self.incoming and replies and replies[0][0] < self.incoming[-1][0]:
+            # a late status packet is still on its way, the bytes arrive in time order
+            replies = sorted(list(self.incoming) + replies, key=lambda reply: reply[0])
+            self.incoming.clear()
+        self.incoming.extend(replies)
+        return len(packet)
+
+
+class Pty_Bus():
+    def __init__(self, bus, use_process=False):
+        '''Serve an Emulated_Bus on a pseudo terminal (POSIX only).
+
+        bus : the Emulated_Bus to serve
+        use_process : serve from a child process instead of a thread, so CPU time
+            measured in this process only covers the host side. The bus state is
+            then a copy living in the child.
+        '''
+        self.bus = bus
+        self.use_process = use_process
+        self.master_fd = None
+        self.slave_fd = None
+        self.worker = None
+        self.port_name = None
+
+    def start(self):
+        import tty
+        self.master_fd, self.slave_fd = os.openpty()
+        tty.setraw(self.master_fd)
+        self.port_name = os.ttyname(self.slave_fd)
+        if self.use_process:
+            self.worker = multiprocessing.Process(target=self.serve)
+        else:
+            self.worker = threading.Thread(target=self.serve)
+        self.worker.daemon = True
+        self.worker.start()
+        return self.port_name
+
+    def stop(self):
+        if self.use_process:
+            self.worker.terminate()
+        os.close(self.slave_fd)
+        os.close(self.master_fd)
+
+    def host_baudrate(self):
+        try:
+            import fcntl
+            import array
+            termios2 = array.array('i', [0] * 64)
+            fcntl.ioctl(self.master_fd, TCGETS2, termios2)
+            return termios2[9]
+        except (ImportError, IOError, OSError):
+            return self.bus.baudrate
+
+    def serve(self):
+        outgoing = []  # (ready time, status packet), sorted
+        while True:
+            timeout = None
+            if outgoing:
+                timeout = max(0.0, outgoing[0][0] - time.monotonic())
+            try:
+                readable, _, _ = select.select([self.master_fd], [], [], timeout)
+                if readable:
+                    data = os.read(self.master_fd, 1024)
+                    if not data:
+                        return
+                    self.bus.baudrate = self.host_baudrate() or self.bus.baudrate
+                    outgoing.extend(self.bus.process(data))
+                    outgoing.sort(key=lambda reply: reply[0])
+                now = time.monotonic()
+                while outgoing and outgoing[0][0] <= now:
+                    os.write(self.master_fd, outgoing.pop(0)[1])
+            except (OSError, ValueError):
+                return
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--ids', type=int, nargs='+', default=[1], help='IDs of the emulated servos')
+    parser.add_argument('--return-delay', type=int, default=250, help='Return delay register, 2usec per unit')
+    args = parser.parse_args()
+
+    servos = [MX28_Emulator(servo_id, return_delay_register=args.return_delay) for servo_id in args.ids]
+    pty_bus = Pty_Bus(Emulated_Bus(servos))
+    print("Emulated MX-28 bus with ID(s) %s on %s" % (args.ids, pty_bus.start()))
+    print("Press Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pty_bus.stop()
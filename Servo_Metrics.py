@@ -0,0 +1,191 @@
+'''
+Metrics of the servo stack as a Prometheus text snapshot or JSON.
+
+The port handler of every port counts the transactions, the communication
+errors (COMM_*), the hardware error bits of the status packets and the retries,
+per servo ID and instruction, the error rate of every servo, and keeps the
+histograms of the status packet latency. A Bus_Scheduler adds its queue depth and wait times.
+
+example:
+    gripper = PT_O("COM5", 2)
+    ...
+    print(prometheus_snapshot([gripper.scheduler]))
+    with open('metrics.json', 'w') as f:
+        f.write(json_snapshot([gripper.scheduler]))
+
+Ports can be given in place of schedulers, without the scheduler metrics.
+The latency histogram counts every status packet since the port was opened;
+its recent percentiles and the learned slack, which follow the halved counts of
+the last LATENCY_MAX_SAMPLES or so samples, are separate gauges.
+'''
+
+import json
+
+from Robotic_Servos import *
+
+INSTRUCTION_NAMES = {
+    INST_PING: 'ping',
+    INST_READ: 'read',
+    INST_WRITE: 'write',
+    INST_REG_WRITE: 'reg_write',
+    INST_ACTION: 'action',
+    INST_FACTORY_RESET: 'factory_reset',
+    INST_REBOOT: 'reboot',
+    INST_SYNC_WRITE: 'sync_write',
+    INST_BULK_READ: 'bulk_read',
+}
+
+COMM_NAMES = {
+    COMM_PORT_BUSY: 'port_busy',
+    COMM_TX_FAIL: 'tx_fail',
+    COMM_RX_FAIL: 'rx_fail',
+    COMM_TX_ERROR: 'tx_error',
+    COMM_RX_WAITING: 'rx_waiting',
+    COMM_RX_TIMEOUT: 'rx_timeout',
+    COMM_RX_CORRUPT: 'rx_corrupt',
+    COMM_NOT_AVAILABLE: 'not_available',
+}
+
+ERROR_BIT_NAMES = {
+    ERRBIT_VOLTAGE: 'voltage',
+    ERRBIT_ANGLE: 'angle',
+    ERRBIT_OVERHEAT: 'overheat',
+    ERRBIT_RANGE: 'range',
+    ERRBIT_CHECKSUM: 'checksum',
+    ERRBIT_OVERLOAD: 'overload',
+    ERRBIT_INSTRUCTION: 'instruction',
+}
+
+
+def split_source(source):
+    # (port, scheduler) of a port or a Bus_Scheduler
+    if hasattr(source, 'metrics'):
+        return source.port, source
+    return source, None
+
+
+def collect_metrics(source):
+    '''Counters and latency histograms of one port (or Bus_Scheduler) as plain dicts.'''
+    port, scheduler = split_source(source)
+    counters = port.getPacketStats()
+    metrics = {
+        'port': port.getPortName(),
+        'transactions': [],
+        'comm_errors': [],
+        'hardware_errors': [],
+        'retries': [],
+        'error_rates': [],
+        'latency': [],
+    }
+    for (dxl_id, instruction), count in sorted(counters['transactions'].items()):
+        metrics['transactions'].append({'id': dxl_id, 'instruction': INSTRUCTION_NAMES.get(instruction, str(instruction)),
+                                        'count': count})
+    for (dxl_id, instruction, result), count in sorted(counters['comm_errors'].items()):
+        metrics['comm_errors'].append({'id': dxl_id, 'instruction': INSTRUCTION_NAMES.get(instruction, str(instruction)),
+                                       'result': COMM_NAMES.get(result, str(result)), 'count': count})
+    for (dxl_id, bit), count in sorted(counters['hardware_errors'].items()):
+        metrics['hardware_errors'].append({'id': dxl_id, 'error': ERROR_BIT_NAMES.get(bit, str(bit)), 'count': count})
+    for (dxl_id, instruction), count in sorted(counters['retries'].items()):
+        metrics['retries'].append({'id': dxl_id, 'instruction': INSTRUCTION_NAMES.get(instruction, str(instruction)),
+                                   'count': count})
+    for dxl_id, rate in sorted(port.getErrorRates().items()):
+        metrics['error_rates'].append({'id': dxl_id, 'rate': rate})
+    for (dxl_id, instruction), histogram in sorted(port.getLatencyHistograms().items()):
+        entry = {'id': dxl_id, 'instruction': INSTRUCTION_NAMES.get(instruction, str(instruction))}
+        entry.update(histogram)
+        metrics['latency'].append(entry)
+    if scheduler is not None:
+        metrics['scheduler'] = scheduler.metrics()
+    return metrics
+
+
+def json_snapshot(sources, indent=None):
+    # JSON list with the collect_metrics of every port or Bus_Scheduler
+    return json.dumps([collect_metrics(source) for source in sources], indent=indent)
+
+
+def prometheus_snapshot(sources):
+    '''Prometheus text exposition format of the metrics of the ports or Bus_Schedulers.'''
+    families = []  # (name, type, help), in the order of the output
+    samples = {}  # name -> sample lines
+
+    def family(name, kind, text):
+        families.append((name, kind, text))
+        samples[name] = []
+
+    def sample(name, labels, value, suffix=''):
+        label_text = ','.join('%s="%s"' % (key, str(label).replace('\\', '\\\\').replace('"', '\\"'))
+                              for key, label in labels)
+        value_text = repr(value) if isinstance(value, float) else str(value)
+        samples[name].append('%s%s{%s} %s' % (name, suffix, label_text, value_text))
+
+    family('dynamixel_transactions_total', 'counter', 'Instruction packets sent')
+    family('dynamixel_comm_errors_total', 'counter', 'Transactions that failed, by COMM_* result')
+    family('dynamixel_hardware_errors_total', 'counter', 'Error bits set in status packets')
+    family('dynamixel_retries_total', 'counter', 'Transactions sent again after a failure')
+    family('dynamixel_error_rate', 'gauge', 'Failed transactions per transaction, every attempt counts')
+    family('dynamixel_status_timeouts_total', 'counter', 'Status packets that missed their learned deadline')
+    family('dynamixel_status_latency_ms', 'histogram', 'Status packet latency without the wire time')
+    family('dynamixel_status_latency_recent_ms', 'gauge', 'Status packet latency percentiles of the recent samples')
+    family('dynamixel_status_slack_ms', 'gauge', 'Deadline slack learned from the recent samples')
+    family('dynamixel_scheduler_queue_depth', 'gauge', 'Transactions waiting for the bus')
+    family('dynamixel_scheduler_max_queue_depth', 'gauge', 'Largest number of transactions that waited for the bus')
+    family('dynamixel_scheduler_bus_transactions_total', 'counter', 'Transactions run by the scheduler')
+    family('dynamixel_scheduler_coalesced_reads_total', 'counter', 'Reads served by the transaction of another read')
+    family('dynamixel_scheduler_wait_ms', 'summary', 'Time from queueing to running, recent samples')
+
+    for source in sources:
+        metrics = collect_metrics(source)
+        port = metrics['port']
+        for entry in metrics['transactions']:
+            sample('dynamixel_transactions_total',
+                   [('port', port), ('id', entry['id']), ('instruction', entry['instruction'])], entry['count'])
+        for entry in metrics['comm_errors']:
+            sample('dynamixel_comm_errors_total', [('port', port), ('id', entry['id']),
+                   ('instruction', entry['instruction']), ('result', entry['result'])], entry['count'])
+        for entry in metrics['hardware_errors']:
+            sample('dynamixel_hardware_errors_total',
+                   [('port', port), ('id', entry['id']), ('error', entry['error'])], entry['count'])
+        for entry in metrics['retries']:
+            sample('dynamixel_retries_total',
+                   [('port', port), ('id', entry['id']), ('instruction', entry['instruction'])], entry['count'])
+        for entry in metrics['error_rates']:
+            sample('dynamixel_error_rate', [('port', port), ('id', entry['id'])], entry['rate'])
+        for entry in metrics['latency']:
+            labels = [('port', port), ('id', entry['id']), ('instruction', entry['instruction'])]
+            sample('dynamixel_status_timeouts_total', labels, entry['timeouts'])
+            # cumulative counts, they never decrease
+            total = 0
+            for edge, count in zip(entry['edges_ms'], entry['total_counts']):
+                total += count
+                sample('dynamixel_status_latency_ms', labels + [('le', '%.4g' % edge)], total, '_bucket')
+            sample('dynamixel_status_latency_ms', labels + [('le', '+Inf')], total, '_bucket')
+            sample('dynamixel_status_latency_ms', labels, entry['total_sum_ms'], '_sum')
+            sample('dynamixel_status_latency_ms', labels, total, '_count')
+            for quantile, name in (('0.5', 'p50_ms'), ('0.99', 'p99_ms')):
+                if entry[name] is not None:
+                    sample('dynamixel_status_latency_recent_ms', labels + [('quantile', quantile)], entry[name])
+            if entry['slack_ms'] is not None:
+                sample('dynamixel_status_slack_ms', labels, entry['slack_ms'])
+
+        scheduler = metrics.get('scheduler')
+        if scheduler is None:
+            continue
+        sample('dynamixel_scheduler_queue_depth', [('port', port)], scheduler['queue_depth'])
+        sample('dynamixel_scheduler_max_queue_depth', [('port', port)], scheduler['max_queue_depth'])
+        sample('dynamixel_scheduler_bus_transactions_total', [('port', port)], scheduler['bus_transactions'])
+        sample('dynamixel_scheduler_coalesced_reads_total', [('port', port)], scheduler['coalesced_reads'])
+        for priority, wait in scheduler['wait_ms'].items():
+            labels = [('port', port), ('priority', priority)]
+            if wait['count']:
+                sample('dynamixel_scheduler_wait_ms', labels + [('quantile', '0.5')], wait['p50'])
+                sample('dynamixel_scheduler_wait_ms', labels + [('quantile', '0.99')], wait['p99'])
+            sample('dynamixel_scheduler_wait_ms', labels, wait['count'], '_count')
+
+    lines = []
+    for name, kind, text in families:
+        if samples[name]:
+            lines.append('# HELP %s %s' % (name, text))
+            lines.append('# TYPE %s %s' % (name, kind))
+            lines.extend(samples[name])
+    return '\n'.join(lines) + '\n'
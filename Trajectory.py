@@ -0,0 +1,153 @@
+'''
+Time-parameterized goal profiles for PT_O.
+
+A profile is a NumPy array of goal positions, one per control period. The
+executor sends them at a fixed rate against absolute deadlines, so a late tick
+does not shift the rest of the profile: when a deadline is missed, the goal of
+the current time is sent and the skipped ones are dropped. Tracking error and
+missed deadlines are reported by metrics().
+
+example:
+    gripper = PT_O("COM5", 2)
+    executor = Trajectory_Executor(gripper, rate=100)
+    executor.run(min_jerk_profile(gripper.open_limit, gripper.close_limit, 1.5, 100))
+    print(executor.metrics())
+'''
+
+import time
+import logging
+import threading
+import numpy as np
+
+from Robotic_Servos import *
+
+logger = logging.getLogger(__name__)
+
+
+def min_jerk_profile(start, goal, duration, rate):
+    # smooth move from start to goal in duration seconds, zero speed and acceleration at both ends
+    tau = np.linspace(0.0, 1.0, max(int(round(duration * rate)), 1) + 1)
+    return start + (goal - start) * (10 * tau ** 3 - 15 * tau ** 4 + 6 * tau ** 5)
+
+
+def sample_profile(times, positions, rate):
+    # piecewise linear profile through (time, position) waypoints, times in seconds from the start
+    times = np.asarray(times, dtype=np.float64)
+    samples = np.arange(0.0, times[-1] + 0.5 / rate, 1.0 / rate)
+    return np.interp(samples, times, np.asarray(positions, dtype=np.float64))
+
+
+class Trajectory_Executor():
+    def __init__(self, gripper, rate=100):
+        '''
+        gripper: PT_O
+        rate: control rate in Hz, default: 100
+        '''
+        self.gripper = gripper
+        self.servo = gripper.servo
+        self.rate = rate
+        self.period = 1.0 / rate
+        self.thread = None
+        self.cancelled = False
+
+        # log of the last run, one entry per tick
+        self.reference = np.zeros(0)
+        self.measured = np.zeros(0)
+        self.lateness = np.zeros(0)
+        self.ticks = 0
+        self.missed_deadlines = 0
+        self.skipped_goals = 0
+
+    def check_profile(self, profile):
+        low = min(self.gripper.open_limit, self.gripper.close_limit)
+        high = max(self.gripper.open_limit, self.gripper.close_limit)
+        if len(profile) == 0 or np.min(profile) < low or np.max(profile) > high:
+            logger.error("Invalid profile, all the positions must be within the working range [%d, %d]", low, high)
+            return False
+        return True
+
+    def start(self, profile, speed=0):
+        '''
+        Follow the profile in the background, see wait() and cancel().
+        profile: goal positions, one per control period
+        speed: moving speed while following, default: 0 (no limit, the profile sets the speed)
+        '''
+        profile = np.rint(np.asarray(profile, dtype=np.float64)).astype(np.int64)
+        if self.thread is not None or not self.check_profile(profile):
+            return 0
+        if self.servo.write_register(ADDR_MX_MOVING_SPEED, 2, speed) == 0:
+            return 0
+
+        n = len(profile)
+        self.reference = profile
+        self.measured = np.full(n, np.nan)
+        self.lateness = np.full(n, np.nan)
+        self.ticks = 0
+        self.missed_deadlines = 0
+        self.skipped_goals = 0
+        self.cancelled = False
+        self.thread = threading.Thread(target=self.execute, name="Trajectory %d" % self.servo.servo_id)
+        self.thread.daemon = True
+        self.thread.start()
+        return 1
+
+    def wait(self):
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def cancel(self):
+        # stop sending goals, the servo finishes the move to the last goal sent
+        self.cancelled = True
+        self.wait()
+
+    def run(self, profile, speed=0):
+        # follow the profile and return when it is done
+        if self.start(profile, speed):
+            self.wait()
+            return 1
+        return 0
+
+    def execute(self):
+        n = len(self.reference)
+        start_time = time.monotonic()
+        k = 0
+        while k < n and not self.cancelled:
+            deadline = start_time + k * self.period
+            now = time.monotonic()
+            if now > deadline + self.period:
+                # late by more than a period: jump to the goal of the current time
+                self.missed_deadlines += 1
+                late_k = min(int((now - start_time) / self.period), n - 1)
+                self.skipped_goals += late_k - k
+                k = late_k
+                deadline = start_time + k * self.period
+            self.lateness[k] = now - deadline
+
+            state = self.servo.read_state()
+            if state is not None:
+                self.measured[k] = state.position
+            self.servo.write_register(ADDR_MX_GOAL_POSITION, 2, int(self.reference[k]))
+            self.ticks += 1
+
+            k += 1
+            delay = start_time + k * self.period - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+    def metrics(self):
+        # tracking error (position units) and deadline statistics (ms) of the last run
+        # the error of a tick compares the measured position with the goal sent on the previous one
+        error = self.measured[1:] - self.reference[:-1]
+        error = error[~np.isnan(error)]
+        lateness = self.lateness[~np.isnan(self.lateness)] * 1000.0
+        return {
+            'ticks': self.ticks,
+            'missed_deadlines': self.missed_deadlines,
+            'skipped_goals': self.skipped_goals,
+            'lateness_ms_mean': float(np.mean(lateness)) if len(lateness) else None,
+            'lateness_ms_p99': float(np.percentile(lateness, 99)) if len(lateness) else None,
+            'lateness_ms_max': float(np.max(lateness)) if len(lateness) else None,
+            'tracking_error_rms': float(np.sqrt(np.mean(error ** 2))) if len(error) else None,
+            'tracking_error_max': float(np.max(np.abs(error))) if len(error) else None,
+        }
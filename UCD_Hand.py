@@ -1,14 +1,211 @@
+import os
 import sys  
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from Robotic_Servos import *
+from Bus_Scheduler import acquire_port, release_port
 import time
+import numpy as np
 import pandas as pd
 
+logger = logging.getLogger(__name__)
+
 '''
 This is the main class you can use for controling the gripper, for the up-to-date
 version, there are just a few functions you can use, but you can self-customize
 your own funcstions based on 'Robotic_Servo'.
 '''
 
+# columns of the streaming history, time is time.monotonic() in seconds, speed in rpm
+STREAM_FIELDS = ('time', 'position', 'speed', 'load', 'voltage')
+
+# move completion, see Move_Poller
+POLL_MIN = 0.005  # sec, right after a command and close to the goal
+POLL_MAX = 0.05  # sec, while the goal is still far away
+POSITION_TOLERANCE = 10  # position units
+LOAD_TOLERANCE = 20  # load change between two polls that still counts as stable
+SETTLE_POLLS = 3  # polls in a row with a stable load
+POLL_TIMEOUT = 1.0  # sec, a poll that takes longer fails its move
+
+# grasp until contact, see Contact_Detector
+FAST_ALPHA = 0.5  # smoothing of the load
+SLOW_ALPHA = 0.05  # smoothing of the free motion baseline
+CONTACT_THRESHOLD = 60  # smoothed load above the baseline that counts as a contact
+CONTACT_SAMPLES = 3  # samples in a row above the threshold
+CONTACT_WARMUP = 5  # samples to learn the baseline while the fingers speed up
+MAX_TORQUE = 1023
+
+def load_calibration():
+    # close and open limits written by Calibaration.py
+    file = pd.read_csv(os.path.join('.', 'calibaration.csv'))
+    df = pd.DataFrame(file)
+    return int(df['close_limit'].iloc[0]), int(df['open_limit'].iloc[0])
+
+class Move_Poller():
+    '''
+    Watches the moves of all the grippers with one thread.
+
+    A move is done when the servo clears its moving register, or when the
+    position is within tolerance of the goal (or the fingers stopped on an
+    object) and the load has been stable for SETTLE_POLLS polls. Each move is
+    polled again after about half of the time it still needs at its current
+    speed, between POLL_MIN and POLL_MAX. The polls due at the same time are
+    queued together, so the port's scheduler serves the ones on the same port
+    with one BULK_READ.
+    '''
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.moves = []
+        self.thread = None
+
+    def watch(self, gripper, goal, tolerance = POSITION_TOLERANCE, timeout = None):
+        '''
+        gripper: PT_O whose goal has just been written
+        goal: goal position
+        timeout: seconds until the future fails with TimeoutError, default: None (no limit)
+        return: Future of the last Servo_State of the move
+        '''
+        now = time.monotonic()
+        move = {
+            'gripper': gripper,
+            'goal': goal,
+            'tolerance': tolerance,
+            'future': Future(),
+            'deadline': None if timeout is None else now + timeout,
+            'next_poll': now + POLL_MIN,
+            'last_load': None,
+            'stable_polls': 0,
+        }
+        with self.condition:
+            self.moves.append(move)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.serve, name="Move_Poller")
+                self.thread.daemon = True
+                self.thread.start()
+            self.condition.notify()
+        return move['future']
+
+    def unwatch(self, gripper):
+        # stop watching the moves of gripper, their futures are cancelled
+        with self.condition:
+            for move in self.moves:
+                if move['gripper'] is gripper:
+                    move['future'].cancel()
+            self.moves = [move for move in self.moves if move['gripper'] is not gripper]
+
+    def serve(self):
+        while True:
+            with self.condition:
+                while not self.moves:
+                    self.condition.wait()
+                delay = min(move['next_poll'] for move in self.moves) - time.monotonic()
+                if delay > 0:
+                    # woken early by a new move, recompute the next poll
+                    self.condition.wait(delay)
+                    continue
+                now = time.monotonic()
+                due = [move for move in self.moves if move['next_poll'] <= now]
+
+            # queue all the reads first, the schedulers coalesce them per port
+            reads = [(move, move['gripper'].scheduler.submit_read(move['gripper'].id, ADDR_MX_PRESENT_POSITION,
+                                                                  MX_STATE_LENGTH)) for move in due]
+            for move, read in reads:
+                try:
+                    data, dxl_result, dxl_error = read.result(POLL_TIMEOUT)
+                except Exception as e:
+                    # the port was closed while the move was watched, or the bus is stuck
+                    with self.condition:
+                        if not move['future'].done():
+                            move['future'].set_exception(e)
+                    continue
+                # under the lock, so unwatch can't cancel the future in between
+                with self.condition:
+                    if not move['future'].done():
+                        self.poll(move, data, dxl_result)
+
+            with self.condition:
+                self.moves = [move for move in self.moves if not move['future'].done()]
+
+    def poll(self, move, data, dxl_result):
+        now = time.monotonic()
+        if dxl_result == COMM_SUCCESS and len(data) == MX_STATE_LENGTH:
+            state = decode_state(data)
+            if move['last_load'] is not None and abs(state.load - move['last_load']) <= LOAD_TOLERANCE:
+                move['stable_polls'] += 1
+            else:
+                move['stable_polls'] = 0
+            move['last_load'] = state.load
+
+            distance = abs(move['goal'] - state.position)
+            stable = move['stable_polls'] >= SETTLE_POLLS
+            if not state.moving or (stable and (distance <= move['tolerance'] or state.speed == 0)):
+                move['future'].set_result(state)
+                return
+
+            # speed in rpm, 4096 position units per turn
+            if state.speed != 0:
+                remaining = distance / (abs(state.speed) * 4096 / 60.0)
+                interval = min(POLL_MAX, max(POLL_MIN, remaining / 2))
+            else:
+                interval = POLL_MIN
+        else:
+            interval = POLL_MIN
+
+        if move['deadline'] is not None and now + interval > move['deadline']:
+            move['future'].set_exception(TimeoutError("Gripper %d did not settle at %d" % (move['gripper'].id, move['goal'])))
+            return
+        move['next_poll'] = now + interval
+
+
+MOVE_POLLER = Move_Poller()
+
+
+class Contact_Detector():
+    '''
+    Online detection of the knee of the load when the fingers touch an object.
+
+    A fast and a slow exponential average follow the size of the load, the slow
+    one is the free motion baseline and stops following once the fast one is
+    above it. A contact is the fast average CONTACT_THRESHOLD above the baseline
+    for CONTACT_SAMPLES samples in a row, or the load reaching the force limit.
+    Neither counts during the first CONTACT_WARMUP samples, where the load peaks
+    while the fingers speed up.
+    '''
+
+    def __init__(self, force, threshold = CONTACT_THRESHOLD, samples = CONTACT_SAMPLES, warmup = CONTACT_WARMUP):
+        self.force = force
+        self.threshold = threshold
+        self.samples = samples
+        self.warmup = warmup
+        self.count = 0
+        self.fast = None
+        self.slow = None
+        self.above = 0
+        self.knee = None  # index of the first sample of the contact
+
+    def update(self, load):
+        # add a sample, return True once there is a contact
+        load = abs(load)
+        self.count += 1
+        if self.fast is None:
+            self.fast = self.slow = float(load)
+        self.fast += FAST_ALPHA * (load - self.fast)
+        if self.count > self.warmup and self.fast - self.slow > self.threshold:
+            self.above += 1
+            if self.above == 1:
+                self.knee = self.count - 1
+        else:
+            self.above = 0
+            self.slow += SLOW_ALPHA * (load - self.slow)
+        if self.count > self.warmup and load >= self.force:
+            if self.above == 0:
+                self.knee = self.count - 1
+            return True
+        return self.above >= self.samples
+
+
 class PT_O():
     '''
     Important!!!!!!!!!!!!!!!!!!!!!
@@ -22,42 +219,327 @@ class PT_O():
         '''
         self.id = id
         self.port_num = port_num
-        self.port = openport(port_num)
-        self.packet = openpacket()
+        # grippers on the same port share it, every transaction goes through its scheduler
+        self.shared_port = acquire_port(port_num)
+        self.port = self.shared_port.port
+        self.scheduler = self.shared_port.scheduler
+        self.packet = self.scheduler.packet_handler()
         self.servo = Robotis_Servo(self.port, self.packet, self.id)
         self.servo.init_multiturn_mode()
 
-        file = pd.read_csv(r'.\calibaration.csv')
-        df = pd.DataFrame(file)
-        self.close_limit = int(df['close_limit'])
-        self.open_limit = int(df['open_limit'])
+        self.close_limit, self.open_limit = load_calibration()
+
+        self.stream_thread = None
+        # empty until start_stream, so latest_state/stream_history work before streaming
+        self.stream_buffer = np.full((2, len(STREAM_FIELDS)), np.nan)
+        self.stream_count = 0
+        self.move = None  # Future of the last close/open/moveto
+        self.hold_force = None  # torque limit left by grasp
         
         
-    def close(self, speed = 100):
-        # speed: moving speed, default: 100
+    def close(self, speed = 100, timeout = None):
+        '''
+        speed: moving speed, default: 100
+        timeout: seconds until the returned future fails with TimeoutError, default: None (no limit)
+        Returns right after the goal is written, with a future of the final Servo_State
+        that is done when the fingers have stopped, see wait_until_settled.
+        '''
+        self.release_hold()
         self.servo.multiturn_set_speed(speed)
         self.servo.goto(self.close_limit)
-        print("Gripper is Successfully closed")
+        return self.watch_move(self.close_limit, timeout)
 
-    def open(self, speed = 100):
-        # speed: moving speed, default: 100
+    def open(self, speed = 100, timeout = None):
+        # speed: moving speed, default: 100, returns a future like close
+        self.release_hold()
         self.servo.multiturn_set_speed(speed)
         self.servo.goto(self.open_limit)
-        print("Gripper is Successfully opened")
+        return self.watch_move(self.open_limit, timeout)
       
-    def moveto(self, pos, speed = 100):
-        # speed: moving speed, default: 100
+    def moveto(self, pos, speed = 100, timeout = None):
+        # speed: moving speed, default: 100, returns a future like close
+        self.release_hold()
         self.servo.multiturn_set_speed(speed)
         if pos <= self.close_limit and pos>=self.open_limit:
             self.servo.goto(pos)
         else:
-            print("Invalid input, The input pos must be within the working range")
+            logger.error("Invalid input, The input pos must be within the working range")
             sys.exit(0)
+        return self.watch_move(pos, timeout)
+
+    def grasp(self, force = 300, speed = 50, rate = 200, timeout = 10.0):
+        '''
+        Close until the fingers touch an object, then hold it with at most force.
+        force: torque limit while holding (0~1023), default: 300
+        speed: closing speed, default: 50
+        rate: load samples per second, default: 200
+        timeout: seconds, the fingers are held at force if they are still closing by then, default: 10
+        return: dict with contact (False if the fingers closed on nothing), position and load at the
+        contact, detect_ms (from the knee of the load to its detection) and stop_ms (from the
+        detection to the torque limit being written)
+        '''
+        self.release_hold()
+        detector = Contact_Detector(force)
+        self.servo.multiturn_set_speed(speed)
+        self.servo.goto(self.close_limit)
+
+        result = {'contact': False, 'position': None, 'load': None, 'detect_ms': None, 'stop_ms': None}
+        times = []
+        period = 1.0 / rate
+        start = next_time = time.monotonic()
+        while True:
+            state = self.servo.read_state()
+            now = time.monotonic()
+            if state is not None:
+                times.append(now)
+                result['position'], result['load'] = state.position, state.load
+                if detector.update(state.load):
+                    self.hold(force)
+                    result['contact'] = True
+                    result['detect_ms'] = (now - times[detector.knee]) * 1000.0
+                    result['stop_ms'] = (time.monotonic() - now) * 1000.0
+                    break
+                if not state.moving:
+                    # reached close_limit without touching anything
+                    break
+            if now - start > timeout:
+                # stalled or too slow, don't keep pushing at full torque
+                self.hold(force)
+                logger.warning("Grasp timed out, holding at force %d", force)
+                break
+
+            next_time += period
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_time = time.monotonic()
+        result['samples'] = len(times)
+        return result
+
+    def hold(self, force):
+        # limit the torque, the fingers keep pressing towards the goal with at most force
+        self.servo.set_torque(force)
+        self.hold_force = force
+
+    def release_hold(self):
+        # full torque again after a grasp
+        if self.hold_force is not None:
+            self.servo.set_torque(MAX_TORQUE)
+            self.hold_force = None
+
+    def watch_move(self, goal, timeout = None):
+        self.move = MOVE_POLLER.watch(self, goal, timeout = timeout)
+        return self.move
+
+    def wait_until_settled(self, timeout = None):
+        '''
+        Wait for the last close/open/moveto to finish.
+        timeout: seconds, default: None (wait as long as the move's own timeout)
+        return: the final Servo_State, None if nothing was moved
+        '''
+        if self.move is None:
+            return None
+        return self.move.result(timeout)
             
     def stop(self):
         #stop the servo anytime
         self.servo.disable_torque()
         self.servo.enable_torque()
+
+    def start_stream(self, rate = 100, history = 1000):
+        '''
+        Sample position, speed, load and voltage in the background.
+        rate: samples per second, default: 100
+        history: number of samples kept in the ring buffer, default: 1000
+        The samples are telemetry for the port's scheduler, so close/open/moveto/stop
+        still go first while streaming.
+        '''
+        if self.stream_thread is not None:
+            return
+        self.stream_period = 1.0 / rate
+        self.stream_buffer = np.full((max(history, 2), len(STREAM_FIELDS)), np.nan)
+        self.stream_count = 0
+        self.stream_running = True
+        self.stream_thread = threading.Thread(target=self.stream_loop, name="PT_O stream %d" % self.id)
+        self.stream_thread.daemon = True
+        self.stream_thread.start()
+
+    def stop_stream(self):
+        if self.stream_thread is None:
+            return
+        self.stream_running = False
+        self.stream_thread.join()
+        self.stream_thread = None
+
+    def disconnect(self):
+        # stop streaming and watching the moves, then give back the port, it is closed with its last gripper
+        self.stop_stream()
+        MOVE_POLLER.unwatch(self)
+        if self.shared_port is not None:
+            release_port(self.shared_port)
+            self.shared_port = None
+
+    def stream_loop(self):
+        next_time = time.monotonic()
+        while self.stream_running:
+            # the whole state block is a single READ
+            state = self.servo.read_state()
+            if state is not None:
+                row = self.stream_count % len(self.stream_buffer)
+                self.stream_buffer[row] = (time.monotonic(), state.position, state.speed, state.load, state.voltage)
+                # counted after the row is written, readers never see a half-written sample
+                self.stream_count += 1
+
+            next_time += self.stream_period
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # running late, skip the missed samples instead of bursting
+                next_time = time.monotonic()
+
+    def latest_state(self):
+        # latest streamed sample as a dict, None if there is none yet, never waits for the bus
+        count = self.stream_count
+        if count == 0:
+            return None
+        sample = self.stream_buffer[(count - 1) % len(self.stream_buffer)].copy()
+        return dict(zip(STREAM_FIELDS, sample))
+
+    def stream_history(self, window = None):
+        '''
+        Streamed samples in time order, one row per sample with the columns of STREAM_FIELDS.
+        window: only the samples of the last window seconds, default: the whole ring buffer
+        '''
+        count = self.stream_count
+        size = len(self.stream_buffer)
+        rows = np.arange(max(0, count - size), count) % size
+        history = self.stream_buffer[rows]
+        if window is not None and len(history):
+            history = history[history[:, 0] >= history[-1, 0] - window]
+        return history
+
+
+class GripperArray():
+    '''
+    Many grippers on a few buses, driven together.
+
+    Goals and limits are NumPy arrays with one entry per gripper. Every tick()
+    sends one SYNC_WRITE and one BULK_READ per bus, the buses run in parallel
+    threads, so a tick takes as long as the slowest bus.
+
+    example:
+        grippers = GripperArray([("COM5", 1), ("COM5", 2), ("COM6", 1)])
+        grippers.close()
+        while grippers.tick():
+            print(grippers.position)
+    '''
+
+    def __init__(self, grippers, limits = None):
+        '''
+        grippers: list of (port_num, id), see PT_O
+        limits: list of (close_limit, open_limit) per gripper, default: calibaration.csv for all of them
+        '''
+        count = len(grippers)
+        if limits is None:
+            limits = [load_calibration()] * count
+        self.port_nums = [port_num for port_num, _ in grippers]
+        self.ids = np.array([servo_id for _, servo_id in grippers], dtype=np.int64)
+        self.close_limits = np.array([close_limit for close_limit, _ in limits], dtype=np.int64)
+        self.open_limits = np.array([open_limit for _, open_limit in limits], dtype=np.int64)
+
+        # commands, written every tick
+        self.goals = np.zeros(count, dtype=np.int64)
+        self.speeds = np.full(count, 100, dtype=np.int64)
+        self.torques = np.full(count, 1023, dtype=np.int64)
+
+        # state, read every tick (NaN until the first good read)
+        self.position = np.full(count, np.nan)
+        self.speed = np.full(count, np.nan)
+        self.load = np.full(count, np.nan)
+        self.voltage = np.full(count, np.nan)
+        self.moving = np.zeros(count, dtype=bool)
+        self.read_ok = np.zeros(count, dtype=bool)  # False where the last read failed
+
+        # one shared port and index array per bus
+        self.buses = []
+        for port_num in sorted(set(self.port_nums)):
+            index = np.array([i for i in range(count) if self.port_nums[i] == port_num], dtype=np.int64)
+            shared = acquire_port(port_num)
+            for i in index:
+                Robotis_Servo(shared.port, shared.scheduler.packet_handler(), int(self.ids[i])).init_multiturn_mode()
+            self.buses.append({'port_num': port_num, 'shared': shared, 'index': index})
+        self.executor = ThreadPoolExecutor(max_workers=len(self.buses))
+
+        # hold the current positions until the first command
+        self.tick(write=False)
+        self.goals[:] = np.where(np.isnan(self.position), self.open_limits, self.position)
+
+    def select(self, grippers):
+        # indices of the grippers, all of them if grippers is None
+        return slice(None) if grippers is None else np.asarray(grippers)
+
+    def close(self, grippers = None, speed = 100):
+        idx = self.select(grippers)
+        self.goals[idx] = self.close_limits[idx]
+        self.speeds[idx] = speed
+
+    def open(self, grippers = None, speed = 100):
+        idx = self.select(grippers)
+        self.goals[idx] = self.open_limits[idx]
+        self.speeds[idx] = speed
+
+    def moveto(self, pos, grippers = None, speed = 100):
+        # pos: a position or one per selected gripper, clipped to the working range
+        idx = self.select(grippers)
+        low = np.minimum(self.open_limits[idx], self.close_limits[idx])
+        high = np.maximum(self.open_limits[idx], self.close_limits[idx])
+        self.goals[idx] = np.clip(pos, low, high)
+        self.speeds[idx] = speed
+
+    def tick(self, write = True):
+        # send the goals and read the state of every bus, returns True if any gripper is still moving,
+        # None if a read failed and no other gripper is moving (see read_ok), False once all have stopped
+        moving = list(self.executor.map(lambda bus: self.tick_bus(bus, write), self.buses))
+        if any(moving):
+            return True
+        if None in moving:
+            return None
+        return False
+
+    def tick_bus(self, bus, write):
+        # one job on the bus thread, PT_O instances sharing the port are kept off the bus meanwhile
+        return bus['shared'].scheduler.call(lambda port, packet: self.run_tick(port, packet, bus['index'], write))
+
+    def run_tick(self, port, packet, index, write):
+        ids = self.ids[index].tolist()
+
+        if write:
+            goals = dict(zip(ids, zip(self.goals[index].tolist(), self.speeds[index].tolist(),
+                                      self.torques[index].tolist())))
+            sync_write_goal(port, packet, goals)
+
+        status = bulk_read_status(port, packet, ids)
+        if status is None:
+            self.read_ok[index] = False
+            return None
+        # positions are signed in multi-turn mode
+        self.position[index] = np.array([status[servo_id]['position'] for servo_id in ids],
+                                        dtype=np.uint16).astype(np.int16)
+        self.speed[index] = [decode_speed(status[servo_id]['speed']) for servo_id in ids]
+        self.load[index] = [decode_load(status[servo_id]['load']) for servo_id in ids]
+        self.voltage[index] = [status[servo_id]['voltage'] for servo_id in ids]
+        # the Moving register is set by the goal write itself, the speed is still 0 until the servo starts
+        self.moving[index] = [status[servo_id]['moving'] != 0 for servo_id in ids]
+        self.read_ok[index] = True
+        return bool(np.any(self.moving[index]))
+
+    def shutdown(self):
+        self.executor.shutdown()
+        for bus in self.buses:
+            release_port(bus['shared'])
+        self.buses = []
         
     
         
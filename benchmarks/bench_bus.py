@@ -0,0 +1,156 @@
+'''
+Round-trip latency and throughput of every Protocol 1.0 instruction type.
+
+For each baud rate and servo return delay the benchmark times PING, READ,
+WRITE, REG_WRITE + ACTION, SYNC_WRITE and BULK_READ through PortHandler and
+Protocol1PacketHandler against emulated MX-28s served on a pty, and writes p50/p99
+latency and transactions per second to a JSON file so runs of different
+releases can be compared.
+
+Example run:
+    python benchmarks/bench_bus.py --count 200 --servos 2 --baudrates 57600 1000000 --return-delays 0 500 --out bench.json
+'''
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from dynamixel_sdk import *
+from Robotic_Servos import ADDR_MX_RETURN_DELAY, ADDR_MX_GOAL_POSITION, ADDR_MX_PRESENT_POSITION, \
+    baudrate_to_register
+from Servo_Emulator import MX28_Emulator, Emulated_Bus, Pty_Bus
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(q / 100.0 * (len(ordered) - 1))))]
+
+
+def instructions(port, packet, dxl_ids):
+    # every entry is a callable doing one transaction and returning True on success
+    dxl_id = dxl_ids[0]
+
+    def ping():
+        _, result, _ = packet.txRxPacket(port, [0, 0, dxl_id, 2, INST_PING, 0])
+        return result == COMM_SUCCESS
+
+    def read():
+        _, result, error = packet.read2ByteTxRx(port, dxl_id, ADDR_MX_PRESENT_POSITION)
+        return result == COMM_SUCCESS and error == 0
+
+    def write():
+        result, error = packet.write2ByteTxRx(port, dxl_id, ADDR_MX_GOAL_POSITION, 2048)
+        return result == COMM_SUCCESS and error == 0
+
+    def reg_write_action():
+        for target in dxl_ids:
+            result, error = packet.regWriteTxRx(port, target, ADDR_MX_GOAL_POSITION, 2, [0x00, 0x08])
+            if result != COMM_SUCCESS or error != 0:
+                return False
+        return packet.action(port, BROADCAST_ID) == COMM_SUCCESS
+
+    group_sync_write = GroupSyncWrite(port, packet, ADDR_MX_GOAL_POSITION, 2)
+    for target in dxl_ids:
+        group_sync_write.addParam(target, [0x00, 0x08])
+
+    def sync_write():
+        return group_sync_write.txPacket() == COMM_SUCCESS
+
+    group_bulk_read = GroupBulkRead(port, packet)
+    for target in dxl_ids:
+        group_bulk_read.addParam(target, ADDR_MX_PRESENT_POSITION, 7)
+
+    def bulk_read():
+        return group_bulk_read.txRxPacket() == COMM_SUCCESS
+
+    return [('ping', ping), ('read', read), ('write', write), ('reg_write_action', reg_write_action),
+            ('sync_write', sync_write), ('bulk_read', bulk_read)]
+
+
+def run_instruction(name, transaction, count):
+    latencies = []
+    failures = 0
+    start = time.perf_counter()
+    for _ in range(count):
+        t0 = time.perf_counter()
+        if not transaction():
+            failures += 1
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+    return {
+        'instruction': name,
+        'count': count,
+        'failures': failures,
+        'p50_us': percentile(latencies, 50) * 1e6,
+        'p99_us': percentile(latencies, 99) * 1e6,
+        'tps': count / elapsed,
+    }
+
+
+def run(baudrates, return_delays, dxl_ids, count, blocking):
+    results = []
+    for baudrate in baudrates:
+        baud_register = baudrate_to_register(baudrate)
+        if baud_register is None:
+            print('%8d bps skipped, an MX-28 cannot run at this baud rate' % baudrate)
+            results.append({'baudrate': baudrate, 'skipped': 'unsupported by MX-28'})
+            continue
+        servos = [MX28_Emulator(dxl_id, baud_register, 0) for dxl_id in dxl_ids]
+        pty_bus = Pty_Bus(Emulated_Bus(servos, baudrate))
+        port_name = pty_bus.start()
+        port = PortHandler(port_name)
+        port.openPort()
+        port.setBaudRate(baudrate)
+        if blocking:
+            port.setRxBlocking(True)
+        packet = PacketHandler(1.0)
+        try:
+            for return_delay in return_delays:
+                for dxl_id in dxl_ids:
+                    packet.write1ByteTxRx(port, dxl_id, ADDR_MX_RETURN_DELAY, int(return_delay / 2))
+                for name, transaction in instructions(port, packet, dxl_ids):
+                    result = run_instruction(name, transaction, count)
+                    result.update(baudrate=baudrate, return_delay_us=return_delay)
+                    results.append(result)
+                    print('%8d bps %4d us  %-17s p50 %9.1f us  p99 %9.1f us  %8.1f tps  failures %d' % (
+                        baudrate, return_delay, name, result['p50_us'], result['p99_us'], result['tps'],
+                        result['failures']))
+        finally:
+            port.closePort()
+            pty_bus.stop()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=200, help='Transactions per instruction and setting')
+    parser.add_argument('--servos', type=int, default=2, help='Number of servos on the emulated bus')
+    parser.add_argument('--baudrates', type=int, nargs='+', default=SUPPORTED_BAUDRATES, help='Baud rates to test')
+    parser.add_argument('--return-delays', type=int, nargs='+', default=[0, 100, 500],
+                        help='Servo return delays to test, in usec (2 usec resolution)')
+    parser.add_argument('--polling', action='store_true', help='Use the polling receive path instead of blocking')
+    parser.add_argument('--out', type=str, default='bench_bus.json', help='JSON file for the results')
+    args = parser.parse_args()
+
+    unsupported = [baudrate for baudrate in args.baudrates if baudrate not in SUPPORTED_BAUDRATES]
+    if unsupported:
+        parser.error('unsupported baud rates: %s' % unsupported)
+
+    results = run(args.baudrates, args.return_delays, list(range(1, args.servos + 1)), args.count,
+                  not args.polling)
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'servos': args.servos,
+        'rx_blocking': not args.polling,
+        'results': results,
+    }
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('Results written to %s' % args.out)
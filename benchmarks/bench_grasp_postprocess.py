@@ -0,0 +1,109 @@
+'''
+Post-processing time of graspNet_grasp per image, Python loops vs. NumPy.
+
+Feeds random fc8 predictions of --samples patches x 18 angles to the original
+angle smoothing loop + full sort and to Predictors.postprocess (np.roll
+smoothing, in place sigmoid, np.partition top-k and sampling) and prints the
+time per image for both.
+
+The original loop smoothes in place, so it reads neighbours it has already
+smoothed. Predictors.postprocess is a true circular convolution, it is checked
+against a loop reference of that convolution (same grasps kept), and over
+--trials random images the grasps it keeps are compared with the original's.
+
+Example run:
+    python benchmarks/bench_grasp_postprocess.py --samples 10000 --repeat 5
+'''
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Grasp_locater'))
+
+from grasp_predictor import Predictors, ANGLE_WEIGHTS, NO_KEEP
+
+
+def original_postprocess(fc8_vals):
+    # the original implementation, smoothing in place
+    num_samples, num_angle = fc8_vals.shape
+    wf = ANGLE_WEIGHTS
+    fc8_norm_vals = fc8_vals.copy()
+    for looper in range(num_samples):
+        for norm_looper in range(num_angle):
+            fc8_norm_vals[looper, norm_looper] = (wf[1]*fc8_norm_vals[looper, norm_looper] +
+                                                  wf[0]*fc8_norm_vals[looper, (norm_looper-1) % num_angle] +
+                                                  wf[2]*fc8_norm_vals[looper, (norm_looper+1) % num_angle])
+    return loop_prob_map(fc8_norm_vals)
+
+
+def loop_reference(fc8_vals):
+    # loop reference of the circular convolution, reads a copy of the input
+    num_samples, num_angle = fc8_vals.shape
+    wf = ANGLE_WEIGHTS
+    fc8_norm_vals = np.empty(fc8_vals.shape)
+    for looper in range(num_samples):
+        for norm_looper in range(num_angle):
+            fc8_norm_vals[looper, norm_looper] = (wf[1]*fc8_vals[looper, norm_looper] +
+                                                  wf[0]*fc8_vals[looper, (norm_looper-1) % num_angle] +
+                                                  wf[2]*fc8_vals[looper, (norm_looper+1) % num_angle])
+    return loop_prob_map(fc8_norm_vals)
+
+
+def loop_prob_map(fc8_norm_vals):
+    # original sigmoid, full sort, top-k and sampling
+    fc8_sig = 1 / (1 + np.exp(-fc8_norm_vals))
+    r = np.sort(fc8_sig, axis=None)
+    fc8_sig[fc8_sig < r[-NO_KEEP]] = 0.0
+    fc8_prob_map = fc8_sig/fc8_sig.sum()
+    prob_map_contig = np.ravel(fc8_prob_map)
+    smp = np.random.choice(np.array(range(prob_map_contig.size)), p=prob_map_contig)
+    return fc8_prob_map, np.unravel_index(smp, fc8_prob_map.shape)
+
+
+def timed(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--samples', type=int, default=10000, help='Number of patches per image')
+    parser.add_argument('--angles', type=int, default=18, help='Number of grasp angles')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per implementation, the fastest is reported')
+    parser.add_argument('--trials', type=int, default=20, help='Random images to compare the kept grasps on')
+    args = parser.parse_args()
+
+    fc8_vals = np.random.randn(args.samples, args.angles) * 3
+    P = Predictors(np.zeros((1, 1, 3), dtype=np.uint8))
+
+    loop_time, _ = timed(lambda: original_postprocess(fc8_vals), args.repeat)
+    numpy_time, _ = timed(lambda: P.postprocess(fc8_vals), args.repeat)
+
+    reference_prob, _ = loop_reference(fc8_vals)
+    same = np.array_equal(reference_prob > 0, P.fc8_prob_vals > 0) and np.allclose(reference_prob, P.fc8_prob_vals)
+
+    # kept grasps of the original loop that the circular convolution doesn't keep
+    differ_images = 0
+    differ_grasps = 0
+    for _ in range(args.trials):
+        trial_vals = np.random.randn(args.samples, args.angles) * 3
+        original_prob, _ = original_postprocess(trial_vals)
+        P.postprocess(trial_vals)
+        differ = np.count_nonzero((original_prob > 0) & (P.fc8_prob_vals == 0))
+        differ_images += differ > 0
+        differ_grasps += differ
+
+    print('%d samples x %d angles' % (args.samples, args.angles))
+    print('original loops %10.2f ms/image' % (loop_time * 1e3))
+    print('numpy          %10.2f ms/image   %.0fx   same grasps as the loop reference: %s'
+          % (numpy_time * 1e3, loop_time / numpy_time, same))
+    print('kept grasps differing from the original loop: %d of %d images, %.1f%% of the kept grasps'
+          % (differ_images, args.trials, 100.0 * differ_grasps / (args.trials * NO_KEEP)))
@@ -0,0 +1,68 @@
+'''
+CPU time spent per servo read, polling receive vs. blocking receive.
+
+Runs read2ByteTxRx against an emulated MX-28 served on a pty, once with the original
+spinning rxPacket and once with PortHandler.setRxBlocking(True), and prints
+wall time and host CPU time per read for both.
+
+Example run:
+    python benchmarks/bench_rx_cpu.py --reads 500 --return-delay 0.0005
+'''
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from dynamixel_sdk import *
+from Robotic_Servos import baudrate_to_register
+from Servo_Emulator import MX28_Emulator, Emulated_Bus, Pty_Bus
+
+ADDR_MX_PRESENT_POSITION = 36
+
+
+def run(port_name, baudrate, blocking, reads):
+    port = PortHandler(port_name)
+    port.openPort()
+    port.setBaudRate(baudrate)
+    if blocking and not port.setRxBlocking(True):
+        raise RuntimeError("blocking receive is not supported on this platform")
+    packet = PacketHandler(1.0)
+
+    failures = 0
+    wall_start = time.time()
+    cpu_start = time.process_time()
+    for _ in range(reads):
+        _, result, error = packet.read2ByteTxRx(port, 1, ADDR_MX_PRESENT_POSITION)
+        if result != COMM_SUCCESS or error != 0:
+            failures += 1
+    cpu_time = time.process_time() - cpu_start
+    wall_time = time.time() - wall_start
+
+    port.closePort()
+    return wall_time / reads, cpu_time / reads, failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--reads', type=int, default=500, help='Number of reads per mode')
+    parser.add_argument('--baudrate', type=int, default=57600, help='Baud rate of the bus')
+    parser.add_argument('--return-delay', type=float, default=500e-6, help='Servo return delay in seconds')
+    args = parser.parse_args()
+
+    baud_register = baudrate_to_register(args.baudrate)
+    if baud_register is None:
+        parser.error('an MX-28 cannot run at %d bps' % args.baudrate)
+    # the servo runs in a child process so process_time() only covers the host side
+    servo = MX28_Emulator(1, baud_register, int(args.return_delay / 2e-6))
+    pty_bus = Pty_Bus(Emulated_Bus([servo], args.baudrate), use_process=True)
+    port_name = pty_bus.start()
+    try:
+        for blocking in (False, True):
+            wall, cpu, failures = run(port_name, args.baudrate, blocking, args.reads)
+            print('%-9s wall %8.1f us/read   cpu %8.1f us/read   cpu/wall %5.1f%%   failures %d' % (
+                'blocking' if blocking else 'polling', wall * 1e6, cpu * 1e6, 100.0 * cpu / wall, failures))
+    finally:
+        pty_bus.stop()
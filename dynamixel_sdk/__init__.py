@@ -20,4 +20,13 @@
 # Author: Ryu Woon Jung (Leon)
 
 from .port_handler import *
-from .packet_handler import *
\ No newline at end of file
+from .latency_model import *
+from .packet_stats import *
+from .retry_policy import *
+from .packet_handler import *
+from .group_sync_write import *
+from .group_bulk_read import *
+
+import sys
+if sys.version_info >= (3, 7):
+    from .async_port_handler import *
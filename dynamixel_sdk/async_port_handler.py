@@ -0,0 +1,321 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+################################################################################
+# Copyright 2017 ROBOTIS CO., LTD.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+################################################################################
+
+# Author: Ryu Woon Jung (Leon)
+
+import asyncio
+
+from .robotis_def import *
+from .protocol1_packet_handler import PKT_ID, PKT_LENGTH, PKT_INSTRUCTION, PKT_ERROR, PKT_PARAMETER0
+
+POLL_INTERVAL = 0.001  # sec, used when the port has no file descriptor to wait on
+
+
+class AsyncPortHandler(object):
+    # asyncio front end of an opened PortHandler. Transactions from any number of
+    # coroutines are queued and run one at a time by a single worker task, so the
+    # bus is never busy for them. All access to the port must go through it.
+    def __init__(self, port, ph):
+        self.port = port
+        self.ph = ph
+        self.loop = None
+        self.queue = None
+        self.worker = None
+        self.readable = None
+        self.closed = False
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        self.readable = asyncio.Event()
+        self.worker = self.loop.create_task(self.serve())
+
+    async def close(self):
+        # the transaction in flight fails with IOError, the queued ones are cancelled
+        self.closed = True
+        self.worker.cancel()
+        try:
+            await self.worker
+        except asyncio.CancelledError:
+            pass
+        while not self.queue.empty():
+            future = self.queue.get_nowait()[-1]
+            if not future.done():
+                future.cancel()
+
+    def closedError(self):
+        return IOError("AsyncPortHandler of %s is closed" % self.port.getPortName())
+
+    def getQueueSize(self):
+        return self.queue.qsize()
+
+    async def serve(self):
+        while True:
+            txpacket, reply_ids, timeout_length, future = await self.queue.get()
+            if future.cancelled():
+                continue
+            try:
+                replies = await self.transactRetry(txpacket, reply_ids, timeout_length)
+            except asyncio.CancelledError:
+                # closed while on the bus
+                if not future.done():
+                    future.set_exception(self.closedError())
+                raise
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                continue
+            if not future.done():
+                future.set_result(replies)
+
+    async def submit(self, txpacket, reply_ids, timeout_length):
+        # queue one transaction, return [(rxpacket, result)] for the status packets of reply_ids
+        if self.closed:
+            raise self.closedError()
+        future = self.loop.create_future()
+        await self.queue.put((txpacket, reply_ids, timeout_length, future))
+        return await future
+
+    async def transactRetry(self, txpacket, reply_ids, timeout_length):
+        # transact, sent again while port.retry_policy allows it (single status packet only)
+        port = self.port
+        start_time = port.getCurrentTime()
+        attempts = 0
+        while True:
+            replies = await self.transact(txpacket, reply_ids, timeout_length)
+            attempts += 1
+
+            policy = port.retry_policy
+            if policy is None or len(reply_ids) != 1 or len(replies) != 1:
+                return replies
+            rxpacket, result = replies[0]
+            error = rxpacket[PKT_ERROR] if result == COMM_SUCCESS else 0
+            if not policy.isRetryable(txpacket[PKT_INSTRUCTION], result, error):
+                return replies
+            elapsed = port.getCurrentTime() - start_time
+            backoff = policy.getBackoff(attempts, elapsed, elapsed / attempts)
+            if backoff is None:
+                return replies
+
+            port.packet_stats.addRetry(txpacket[PKT_ID], txpacket[PKT_INSTRUCTION])
+            port.resyncPort()
+            await asyncio.sleep(backoff / 1000.0)
+
+    async def transact(self, txpacket, reply_ids, timeout_length):
+        port = self.port
+
+        total_packet_length = self.ph.makeTxPacket(txpacket)
+        if total_packet_length == 0:
+            return [(None, COMM_TX_ERROR)]
+
+        # wait for a synchronous caller to finish its transaction, then keep them off the bus while we are on it
+        while port.is_using:
+            await asyncio.sleep(POLL_INTERVAL)
+        port.is_using = True
+        try:
+            port.clearPort()
+            port.resyncPort()
+            instruction = txpacket[PKT_INSTRUCTION]
+            stats_ids = self.ph.getStatsIds(txpacket)
+            if port.writePort(txpacket) != total_packet_length:
+                for dxl_id in stats_ids:
+                    port.packet_stats.addResult(dxl_id, instruction, COMM_TX_FAIL, 0)
+                return [(None, COMM_TX_FAIL)]
+            for dxl_id in stats_ids:
+                port.packet_stats.addTransaction(dxl_id, instruction)
+            if not reply_ids:
+                return []
+
+            if len(reply_ids) == 1:
+                port.setPacketTimeout(timeout_length, reply_ids[0], instruction)
+            else:
+                port.setPacketTimeout(timeout_length)
+            replies = []
+            for dxl_id in reply_ids:
+                while True:
+                    rxpacket, result = await self.rxPacket()
+                    if result != COMM_SUCCESS or rxpacket[PKT_ID] == dxl_id:
+                        break
+                port.packet_stats.addResult(dxl_id, instruction, result,
+                                            rxpacket[PKT_ERROR] if result == COMM_SUCCESS else 0)
+                # rxpacket is a view of the port's rx packet, the next status packet overwrites it
+                replies.append((bytes(rxpacket), result))
+                if result != COMM_SUCCESS:
+                    break
+            return replies
+        finally:
+            port.is_using = False
+
+    async def rxPacket(self):
+        port = self.port
+        rxpacket = port.rx_buffer
+        rx_length = port.rx_buffer_length
+        wait_length = 6  # minimum length (HEADER0 HEADER1 ID LENGTH ERROR CHKSUM)
+
+        while True:
+            if rx_length < wait_length:
+                read_length = port.readPortInto(rxpacket, rx_length, wait_length - rx_length)
+                rx_length += read_length
+                if read_length == 0:
+                    await self.waitPort()
+
+            rx_length, wait_length, result = self.ph.parseRxPacket(rxpacket, rx_length)
+            if result != COMM_RX_WAITING:
+                break
+
+            # check timeout
+            if port.isPacketTimeout():
+                if rx_length == 0:
+                    result = COMM_RX_TIMEOUT
+                else:
+                    result = COMM_RX_CORRUPT
+                port.recordPacketTimeout()
+                break
+
+        packet = self.ph.popRxView(port, rx_length, wait_length)
+        if result == COMM_SUCCESS:
+            port.recordPacketLatency(packet[PKT_ID])
+        return packet, result
+
+    async def waitPort(self):
+        # suspend until the port is readable or the packet deadline has passed
+        time_left = (self.port.packet_timeout - self.port.getTimeSinceStart()) / 1000.0
+        if time_left <= 0.0:
+            return
+
+        fd = None
+        if self.port.canWaitPort() and self.port.ser is not None:
+            fd = self.port.ser.fileno()
+        if fd is None:
+            await asyncio.sleep(min(time_left, POLL_INTERVAL))
+            return
+
+        # the reader is only registered while waiting, so unread bytes never spin the loop
+        self.readable.clear()
+        self.loop.add_reader(fd, self.readable.set)
+        try:
+            await asyncio.wait_for(self.readable.wait(), time_left)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self.loop.remove_reader(fd)
+
+    async def ping(self, dxl_id):
+        txpacket = [0] * 6
+        txpacket[PKT_ID] = dxl_id
+        txpacket[PKT_LENGTH] = 2
+        txpacket[PKT_INSTRUCTION] = INST_PING
+
+        replies = await self.submit(txpacket, [dxl_id], 6)
+        rxpacket, result = replies[0]
+        return result, (rxpacket[PKT_ERROR] if result == COMM_SUCCESS else 0)
+
+    async def read(self, dxl_id, address, length):
+        # return : data, result, error
+        txpacket = [0] * 8
+        if dxl_id >= BROADCAST_ID:
+            return [], COMM_NOT_AVAILABLE, 0
+
+        txpacket[PKT_ID] = dxl_id
+        txpacket[PKT_LENGTH] = 4
+        txpacket[PKT_INSTRUCTION] = INST_READ
+        txpacket[PKT_PARAMETER0 + 0] = address
+        txpacket[PKT_PARAMETER0 + 1] = length
+
+        replies = await self.submit(txpacket, [dxl_id], length + 6)
+        rxpacket, result = replies[0]
+        if result != COMM_SUCCESS:
+            return [], result, 0
+        return list(rxpacket[PKT_PARAMETER0: PKT_PARAMETER0 + length]), result, rxpacket[PKT_ERROR]
+
+    async def write(self, dxl_id, address, data, instruction=INST_WRITE):
+        # return : result, error
+        length = len(data)
+        txpacket = [0] * (length + 7)
+
+        txpacket[PKT_ID] = dxl_id
+        txpacket[PKT_LENGTH] = length + 3
+        txpacket[PKT_INSTRUCTION] = instruction
+        txpacket[PKT_PARAMETER0] = address
+        txpacket[PKT_PARAMETER0 + 1: PKT_PARAMETER0 + 1 + length] = data
+
+        reply_ids = [] if dxl_id == BROADCAST_ID else [dxl_id]
+        replies = await self.submit(txpacket, reply_ids, 6)
+        if not replies:
+            return COMM_SUCCESS, 0
+        rxpacket, result = replies[0]
+        return result, (rxpacket[PKT_ERROR] if result == COMM_SUCCESS else 0)
+
+    async def reg_write(self, dxl_id, address, data):
+        return await self.write(dxl_id, address, data, INST_REG_WRITE)
+
+    async def action(self, dxl_id=BROADCAST_ID):
+        txpacket = [0] * 6
+        txpacket[PKT_ID] = dxl_id
+        txpacket[PKT_LENGTH] = 2
+        txpacket[PKT_INSTRUCTION] = INST_ACTION
+
+        reply_ids = [] if dxl_id == BROADCAST_ID else [dxl_id]
+        replies = await self.submit(txpacket, reply_ids, 6)
+        return replies[0][1] if replies else COMM_SUCCESS
+
+    async def sync_write(self, start_address, data_length, data_dict):
+        # data_dict : {dxl_id: [data_length bytes]}, return : result
+        param = []
+        for dxl_id, data in data_dict.items():
+            if len(data) != data_length:
+                return COMM_TX_ERROR
+            param.append(dxl_id)
+            param.extend(data)
+
+        txpacket = [0] * (len(param) + 8)
+        txpacket[PKT_ID] = BROADCAST_ID
+        txpacket[PKT_LENGTH] = len(param) + 4  # 4: INST START_ADDR DATA_LEN ... CHKSUM
+        txpacket[PKT_INSTRUCTION] = INST_SYNC_WRITE
+        txpacket[PKT_PARAMETER0 + 0] = start_address
+        txpacket[PKT_PARAMETER0 + 1] = data_length
+        txpacket[PKT_PARAMETER0 + 2: PKT_PARAMETER0 + 2 + len(param)] = param
+
+        replies = await self.submit(txpacket, [], 0)
+        return replies[0][1] if replies else COMM_SUCCESS
+
+    async def bulk_read(self, requests):
+        # requests : [(dxl_id, start_address, data_length)]
+        # return : {dxl_id: data}, result
+        param = []
+        wait_length = 0
+        for dxl_id, start_address, data_length in requests:
+            param.extend([data_length, dxl_id, start_address])
+            wait_length += data_length + 7
+
+        txpacket = [0] * (len(param) + 7)
+        txpacket[PKT_ID] = BROADCAST_ID
+        txpacket[PKT_LENGTH] = len(param) + 3  # 3: INST 0x00 ... CHKSUM
+        txpacket[PKT_INSTRUCTION] = INST_BULK_READ
+        txpacket[PKT_PARAMETER0 + 0] = 0x00
+        txpacket[PKT_PARAMETER0 + 1: PKT_PARAMETER0 + 1 + len(param)] = param
+
+        replies = await self.submit(txpacket, [dxl_id for dxl_id, _, _ in requests], wait_length)
+        data = {}
+        result = COMM_RX_FAIL
+        for (dxl_id, _, data_length), (rxpacket, result) in zip(requests, replies):
+            if result != COMM_SUCCESS:
+                return data, result
+            data[dxl_id] = list(rxpacket[PKT_PARAMETER0: PKT_PARAMETER0 + data_length])
+        return data, result
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+################################################################################
+# Copyright 2017 ROBOTIS CO., LTD.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+################################################################################
+
+# Author: Ryu Woon Jung (Leon)
+
+from .robotis_def import *
+
+PARAM_NUM_DATA = 0
+PARAM_NUM_ADDRESS = 1
+PARAM_NUM_LENGTH = 2
+
+
+class GroupBulkRead:
+    def __init__(self, port, ph):
+        self.port = port
+        self.ph = ph
+
+        self.last_result = False
+        self.is_param_changed = False
+        self.param = []
+        self.data_dict = {}
+
+        self.clearParam()
+
+    def makeParam(self):
+        if not self.data_dict:
+            return
+
+        self.param = []
+
+        for dxl_id in self.data_dict:
+            self.param.append(self.data_dict[dxl_id][PARAM_NUM_LENGTH])  # LEN
+            self.param.append(dxl_id)  # ID
+            self.param.append(self.data_dict[dxl_id][PARAM_NUM_ADDRESS])  # ADDR
+
+        self.is_param_changed = False
+
+    def addParam(self, dxl_id, start_address, data_length):
+        if dxl_id in self.data_dict:  # dxl_id already exist
+            return False
+
+        data = []  # [0] * data_length
+        self.data_dict[dxl_id] = [data, start_address, data_length]
+
+        self.is_param_changed = True
+        return True
+
+    def removeParam(self, dxl_id):
+        if dxl_id not in self.data_dict:  # NOT exist
+            return
+
+        del self.data_dict[dxl_id]
+
+        self.is_param_changed = True
+
+    def clearParam(self):
+        self.data_dict.clear()
+        self.param = []
+
+    def txPacket(self):
+        if len(self.data_dict.keys()) == 0:
+            return COMM_NOT_AVAILABLE
+
+        if self.is_param_changed is True or not self.param:
+            self.makeParam()
+
+        return self.ph.bulkReadTx(self.port, self.param, len(self.data_dict.keys()) * 3)
+
+    def rxPacket(self):
+        self.last_result = False
+
+        result = COMM_RX_FAIL
+
+        if len(self.data_dict.keys()) == 0:
+            return COMM_NOT_AVAILABLE
+
+        # status packets come back in the order the IDs were listed in the instruction
+        for dxl_id in self.data_dict:
+            data, result, _ = self.ph.readRx(self.port, dxl_id, self.data_dict[dxl_id][PARAM_NUM_LENGTH])
+            if result != COMM_SUCCESS:
+                return result
+            # readRx returns a view of the port's rx packet, which the next status packet overwrites
+            self.data_dict[dxl_id][PARAM_NUM_DATA] = bytearray(data)
+
+        if result == COMM_SUCCESS:
+            self.last_result = True
+
+        return result
+
+    def txRxPacket(self):
+        result = self.txPacket()
+        if result != COMM_SUCCESS:
+            return result
+
+        return self.rxPacket()
+
+    def isAvailable(self, dxl_id, address, data_length):
+        if self.last_result is False or dxl_id not in self.data_dict:
+            return False
+
+        start_addr = self.data_dict[dxl_id][PARAM_NUM_ADDRESS]
+
+        if (address < start_addr) or (start_addr + self.data_dict[dxl_id][PARAM_NUM_LENGTH] - data_length < address):
+            return False
+
+        return True
+
+    def getData(self, dxl_id, address, data_length):
+        if not self.isAvailable(dxl_id, address, data_length):
+            return 0
+
+        data = self.data_dict[dxl_id][PARAM_NUM_DATA]
+        offset = address - self.data_dict[dxl_id][PARAM_NUM_ADDRESS]
+
+        if data_length == 1:
+            return data[offset]
+        elif data_length == 2:
+            return DXL_MAKEWORD(data[offset], data[offset + 1])
+        elif data_length == 4:
+            return DXL_MAKEDWORD(DXL_MAKEWORD(data[offset + 0], data[offset + 1]),
+                                 DXL_MAKEWORD(data[offset + 2], data[offset + 3]))
+        else:
+            return 0
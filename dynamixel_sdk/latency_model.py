@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+################################################################################
+# Copyright 2017 ROBOTIS CO., LTD.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+################################################################################
+
+# Author: Ryu Woon Jung (Leon)
+
+import math
+
+LATENCY_MIN = 0.01  # msec, upper edge of the first histogram bucket
+LATENCY_BUCKETS_PER_DECADE = 8
+LATENCY_BUCKETS = 48  # up to 10 sec
+LATENCY_PERCENTILE = 99.0
+LATENCY_MARGIN = 1.5  # deadline slack = percentile * margin + floor
+LATENCY_FLOOR = 1.0  # msec, room for the OS scheduler
+LATENCY_MAX_SLACK = 34.0  # msec, the fixed slack (LATENCY_TIMER * 2 + 2), lost packets can't push it further
+LATENCY_MIN_SAMPLES = 20  # below this the fixed LATENCY_TIMER slack is used
+LATENCY_MAX_SAMPLES = 1000  # the counts are halved past this, so old samples fade out
+TIMEOUT_SAMPLE_SCALE = 2.0  # a timeout counts as a sample of twice the slack it missed
+
+
+class LatencyModel(object):
+    # histograms of the time from the end of an instruction packet to its status packet, minus
+    # the time the status packet takes on the wire, per (ID, instruction). The recent histogram
+    # decays and learns the deadlines, the total histogram counts every status packet for ever.
+    def __init__(self, percentile=LATENCY_PERCENTILE):
+        self.percentile = percentile
+        self.counts = {}
+        self.samples = {}
+        self.sums = {}  # msec, decays with the counts
+        self.timeouts = {}
+        self.total_counts = {}
+        self.total_sums = {}  # msec
+
+    def getBucket(self, latency):
+        if latency <= LATENCY_MIN:
+            return 0
+        bucket = int(math.ceil(math.log10(latency / LATENCY_MIN) * LATENCY_BUCKETS_PER_DECADE))
+        return min(bucket, LATENCY_BUCKETS - 1)
+
+    def getBucketEdge(self, bucket):
+        # upper edge of the bucket in msec
+        return LATENCY_MIN * 10 ** (bucket / float(LATENCY_BUCKETS_PER_DECADE))
+
+    def addKey(self, key):
+        if key not in self.counts:
+            self.counts[key] = [0] * LATENCY_BUCKETS
+            self.samples[key] = 0
+            self.sums[key] = 0.0
+            self.timeouts[key] = 0
+            self.total_counts[key] = [0] * LATENCY_BUCKETS
+            self.total_sums[key] = 0.0
+
+    def addSample(self, key, latency):
+        # latency of a status packet
+        self.addKey(key)
+        self.total_counts[key][self.getBucket(latency)] += 1
+        self.total_sums[key] += latency
+        self.addRecent(key, latency)
+
+    def addRecent(self, key, latency):
+        counts = self.counts[key]
+        counts[self.getBucket(latency)] += 1
+        self.samples[key] += 1
+        self.sums[key] += latency
+        if self.samples[key] > LATENCY_MAX_SAMPLES:
+            for bucket in range(LATENCY_BUCKETS):
+                counts[bucket] //= 2
+            samples = sum(counts)
+            self.sums[key] *= samples / float(self.samples[key])
+            self.samples[key] = samples
+
+    def addTimeout(self, key, slack):
+        # push the percentile up when the deadline turns out to be too short, the totals only count status packets
+        self.addKey(key)
+        self.addRecent(key, slack * TIMEOUT_SAMPLE_SCALE)
+        self.timeouts[key] += 1
+
+    def getPercentile(self, key, percentile):
+        samples = self.samples.get(key, 0)
+        if samples == 0:
+            return None
+
+        target = samples * percentile / 100.0
+        total = 0
+        for bucket, count in enumerate(self.counts[key]):
+            total += count
+            if total >= target:
+                return self.getBucketEdge(bucket)
+        return self.getBucketEdge(LATENCY_BUCKETS - 1)
+
+    def getSlack(self, key):
+        # msec to wait on top of the wire time, None until enough samples were seen
+        if self.samples.get(key, 0) < LATENCY_MIN_SAMPLES:
+            return None
+        return min(self.getPercentile(key, self.percentile) * LATENCY_MARGIN + LATENCY_FLOOR, LATENCY_MAX_SLACK)
+
+    def getHistograms(self):
+        # {(dxl_id, instruction): histogram}, latencies in msec
+        histograms = {}
+        for key, counts in self.counts.items():
+            histograms[key] = {
+                'edges_ms': [self.getBucketEdge(bucket) for bucket in range(LATENCY_BUCKETS)],
+                'counts': list(counts),
+                'samples': self.samples[key],
+                'sum_ms': self.sums[key],
+                'total_counts': list(self.total_counts[key]),
+                'total_sum_ms': self.total_sums[key],
+                'timeouts': self.timeouts[key],
+                'p50_ms': self.getPercentile(key, 50.0),
+                'p99_ms': self.getPercentile(key, 99.0),
+                'slack_ms': self.getSlack(key),
+            }
+        return histograms
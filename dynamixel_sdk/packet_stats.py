@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+################################################################################
+# Copyright 2017 ROBOTIS CO., LTD.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+################################################################################
+
+# Author: Ryu Woon Jung (Leon)
+
+from .robotis_def import *
+
+
+class PacketStats(object):
+    # counters of the instruction packets sent and of their failures, per (ID, instruction),
+    # broadcast packets are counted under BROADCAST_ID, except a BULK_READ, which is counted
+    # once per servo it reads, like the failures of its status packets
+    def __init__(self):
+        self.transactions = {}  # (dxl_id, instruction) -> count
+        self.comm_errors = {}  # (dxl_id, instruction, COMM_* result) -> count
+        self.hardware_errors = {}  # (dxl_id, error bit) -> count
+        self.retries = {}  # (dxl_id, instruction) -> count
+
+    def increment(self, counters, key):
+        counters[key] = counters.get(key, 0) + 1
+
+    def addTransaction(self, dxl_id, instruction):
+        self.increment(self.transactions, (dxl_id, instruction))
+
+    def addResult(self, dxl_id, instruction, result, error):
+        # result and error of a status packet, one count per error bit set
+        if result != COMM_SUCCESS:
+            self.increment(self.comm_errors, (dxl_id, instruction, result))
+            return
+
+        bit = 1
+        while error >= bit:
+            if error & bit:
+                self.increment(self.hardware_errors, (dxl_id, bit))
+            bit <<= 1
+
+    def addRetry(self, dxl_id, instruction):
+        self.increment(self.retries, (dxl_id, instruction))
+
+    def getErrorRates(self):
+        # {dxl_id: failed transactions / transactions}, every attempt of a retried one counts
+        sent = {}
+        failed = {}
+        for (dxl_id, instruction), count in self.transactions.items():
+            sent[dxl_id] = sent.get(dxl_id, 0) + count
+        for (dxl_id, instruction, result), count in self.comm_errors.items():
+            failed[dxl_id] = failed.get(dxl_id, 0) + count
+        return dict((dxl_id, failed.get(dxl_id, 0) / float(count)) for dxl_id, count in sent.items() if count)
+
+    def getCounters(self):
+        return {
+            'transactions': dict(self.transactions),
+            'comm_errors': dict(self.comm_errors),
+            'hardware_errors': dict(self.hardware_errors),
+            'retries': dict(self.retries),
+        }
@@ -22,10 +22,18 @@
 import time
 import serial
 import sys
+import select
 import platform
 
+from .latency_model import LatencyModel
+from .packet_stats import PacketStats
+from .retry_policy import RetryPolicy
+
 LATENCY_TIMER = 16
 DEFAULT_BAUDRATE = 1000000
+RXBUFFER_LEN = 1024
+SUPPORTED_BAUDRATES = [9600, 19200, 38400, 57600, 115200, 230400, 460800, 500000, 576000, 921600, 1000000, 1152000,
+                       2000000, 2500000, 3000000, 3500000, 4000000]
 
 
 class PortHandler(object):
@@ -40,6 +48,27 @@ class PortHandler(object):
         self.port_name = port_name
         self.ser = None
 
+        self.rx_blocking = False
+        self.rx_buffer = bytearray(RXBUFFER_LEN)
+        self.rx_buffer_view = memoryview(self.rx_buffer)
+        self.rx_buffer_length = 0
+        self.rx_packet = memoryview(bytearray(RXBUFFER_LEN))  # last status packet, see popRxView
+
+        self.tx_templates = {}  # reusable instruction packets, see getTxTemplate
+
+        # status packet latencies, learned per (ID, instruction) to set the packet timeouts
+        self.latency_model = LatencyModel()
+        self.packet_key = None
+        self.packet_wire_time = 0.0
+        self.packet_slack = 0.0
+
+        # transaction and error counters, see getPacketStats
+        self.packet_stats = PacketStats()
+        self.packet_instruction = None  # instruction of the last packet sent
+
+        # idempotent transactions are sent again after a lost or corrupted packet, None turns it off
+        self.retry_policy = RetryPolicy()
+
     def openPort(self):
         return self.setBaudRate(self.baudrate)
 
@@ -79,17 +108,81 @@ class PortHandler(object):
         else:
             return [ord(ch) for ch in self.ser.read(length)]
 
+    def readPortInto(self, buffer, offset, length):
+        # read everything already waiting (at least up to length) into buffer[offset:]
+        length = min(max(length, self.getBytesAvailable()), len(buffer) - offset)
+        data = self.readPort(length)
+        buffer[offset:offset + len(data)] = data
+        return len(data)
+
+    def setRxBlocking(self, blocking):
+        if blocking and not self.canWaitPort():
+            return False
+        self.rx_blocking = blocking
+        return True
+
+    def canWaitPort(self):
+        # select() does not work on serial handles under Windows
+        return platform.system() != 'Windows' and self.ser is not None and hasattr(self.ser, 'fileno')
+
+    def waitPort(self):
+        # sleep until the port is readable or the packet deadline has passed
+        time_left = self.packet_timeout - self.getTimeSinceStart()
+        if time_left <= 0.0:
+            return False
+        readable, _, _ = select.select([self.ser.fileno()], [], [], time_left / 1000.0)
+        return len(readable) > 0
+
     def writePort(self, packet):
         return self.ser.write(packet)
 
-    def setPacketTimeout(self, packet_length):
+    def setPacketTimeout(self, packet_length, dxl_id=None, instruction=None):
+        # wire time of the status packet plus the latency learned for (dxl_id, instruction)
         self.packet_start_time = self.getCurrentTime()
-        self.packet_timeout = (self.tx_time_per_byte * packet_length) + (LATENCY_TIMER * 2.0) + 2.0
+        self.packet_wire_time = self.tx_time_per_byte * packet_length
+        self.packet_key = None if dxl_id is None else (dxl_id, instruction)
+
+        slack = None if self.packet_key is None else self.latency_model.getSlack(self.packet_key)
+        if slack is None:
+            # nothing learned yet, or several status packets: assume the worst USB latency
+            slack = (LATENCY_TIMER * 2.0) + 2.0
+        self.packet_slack = slack
+        self.packet_timeout = self.packet_wire_time + slack
 
     def setPacketTimeoutMillis(self, msec):
         self.packet_start_time = self.getCurrentTime()
+        self.packet_key = None
         self.packet_timeout = msec
 
+    def recordPacketLatency(self, dxl_id):
+        # the status packet of dxl_id arrived, learn how long it took
+        if self.packet_key is not None and self.packet_key[0] == dxl_id:
+            self.latency_model.addSample(self.packet_key, self.getTimeSinceStart() - self.packet_wire_time)
+            self.packet_key = None
+
+    def recordPacketTimeout(self):
+        if self.packet_key is not None:
+            self.latency_model.addTimeout(self.packet_key, self.packet_slack)
+            self.packet_key = None
+
+    def getLatencyHistograms(self):
+        return self.latency_model.getHistograms()
+
+    def getPacketStats(self):
+        return self.packet_stats.getCounters()
+
+    def getErrorRates(self):
+        return self.packet_stats.getErrorRates()
+
+    def setRetryPolicy(self, retry_policy):
+        self.retry_policy = retry_policy
+
+    def resyncPort(self):
+        # drop the bytes received so far, e.g. a status packet that came after its timeout
+        # or the rest of a corrupted one
+        self.ser.reset_input_buffer()
+        self.rx_buffer_length = 0
+
     def isPacketTimeout(self):
         if self.getTimeSinceStart() > self.packet_timeout:
             self.packet_timeout = 0
@@ -98,7 +191,8 @@ class PortHandler(object):
         return False
 
     def getCurrentTime(self):
-        return round(time.time() * 1000000000) / 1000000.0
+        # monotonic, so the timeouts survive changes of the wall clock
+        return round(time.monotonic() * 1000000000) / 1000000.0
 
     def getTimeSinceStart(self):
         time_since = self.getCurrentTime() - self.packet_start_time
@@ -123,14 +217,14 @@ class PortHandler(object):
         self.is_open = True
 
         self.ser.reset_input_buffer()
+        self.rx_buffer_length = 0
 
         self.tx_time_per_byte = (1000.0 / self.baudrate) * 10.0
 
         return True
 
     def getCFlagBaud(self, baudrate):
-        if baudrate in [9600, 19200, 38400, 57600, 115200, 230400, 460800, 500000, 576000, 921600, 1000000, 1152000,
-                        2000000, 2500000, 3000000, 3500000, 4000000]:
+        if baudrate in SUPPORTED_BAUDRATES:
             return baudrate
         else:
             return -1            
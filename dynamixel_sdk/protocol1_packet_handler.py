@@ -19,6 +19,8 @@
 
 # Author: Ryu Woon Jung (Leon)
 
+import time
+
 from .robotis_def import *
 
 TXPACKET_MAX_LEN = 250
@@ -93,116 +95,220 @@ class Protocol1PacketHandler(object):
 
         return ""
 
-    def txPacket(self, port, txpacket):
+    def makeTxPacket(self, txpacket):
+        # add the header and the checksum, return the total packet length (0 if it is too long)
         checksum = 0
         total_packet_length = txpacket[PKT_LENGTH] + 4  # 4: HEADER0 HEADER1 ID LENGTH
 
-        if port.is_using:
-            return COMM_PORT_BUSY
-        port.is_using = True
-
         # check max packet length
         if total_packet_length > TXPACKET_MAX_LEN:
-            port.is_using = False
-            return COMM_TX_ERROR
+            return 0
 
         # make packet header
         txpacket[PKT_HEADER0] = 0xFF
         txpacket[PKT_HEADER1] = 0xFF
 
         # add a checksum to the packet
-        for idx in range(2, total_packet_length - 1):  # except header, checksum
-            checksum += txpacket[idx]
+        checksum = sum(txpacket[2: total_packet_length - 1])  # except header, checksum
 
         txpacket[total_packet_length - 1] = ~checksum & 0xFF
 
+        return total_packet_length
+
+    def getTxTemplate(self, port, dxl_id, instruction, fixed_params, param_length):
+        # instruction packet reused by every call with the same arguments, only the parameters after
+        # fixed_params and the checksum get patched (see patchTxTemplate)
+        # templates live on the port, so handlers shared by several ports never patch each other's packets
+        # return : memoryview of the packet, checksum of its fixed bytes
+        key = (dxl_id, instruction, param_length) + fixed_params
+        template = port.tx_templates.get(key)
+        if template is None:
+            txpacket = bytearray(param_length + 6)  # 6: HEADER0 HEADER1 ID LENGTH INST ... CHKSUM
+            txpacket[PKT_ID] = dxl_id
+            txpacket[PKT_LENGTH] = param_length + 2  # 2: INST ... CHKSUM
+            txpacket[PKT_INSTRUCTION] = instruction
+            txpacket[PKT_PARAMETER0: PKT_PARAMETER0 + len(fixed_params)] = bytearray(fixed_params)
+            self.makeTxPacket(txpacket)
+            template = (memoryview(txpacket), sum(txpacket[2: -1]))
+            port.tx_templates[key] = template
+        return template
+
+    def patchTxTemplate(self, template, offset, data, length):
+        # copy data[0:length] into the template at offset and fix its checksum
+        txpacket, checksum = template
+        txpacket.obj[offset: offset + length] = data if len(data) == length else data[0: length]
+        txpacket[-1] = ~(checksum + sum(txpacket[offset: offset + length])) & 0xFF
+        return txpacket
+
+    def txPacket(self, port, txpacket):
+        if port.is_using:
+            return COMM_PORT_BUSY
+        port.is_using = True
+
+        if isinstance(txpacket, memoryview):
+            # template from getTxTemplate, header and checksum are already in place
+            total_packet_length = len(txpacket) if len(txpacket) <= TXPACKET_MAX_LEN else 0
+        else:
+            total_packet_length = self.makeTxPacket(txpacket)
+        if total_packet_length == 0:
+            port.is_using = False
+            return COMM_TX_ERROR
+
         #print "[TxPacket] %r" % txpacket
 
-        # tx packet
+        # tx packet, whatever was received before belongs to an earlier transaction (e.g. a status
+        # packet that came after its timeout) and would be taken as the answer to this one
         port.clearPort()
+        port.resyncPort()
         written_packet_length = port.writePort(txpacket)
+        port.packet_instruction = txpacket[PKT_INSTRUCTION]
+        stats_ids = self.getStatsIds(txpacket)
         if total_packet_length != written_packet_length:
             port.is_using = False
+            for dxl_id in stats_ids:
+                port.packet_stats.addResult(dxl_id, port.packet_instruction, COMM_TX_FAIL, 0)
             return COMM_TX_FAIL
 
+        for dxl_id in stats_ids:
+            port.packet_stats.addTransaction(dxl_id, port.packet_instruction)
         return COMM_SUCCESS
 
+    def getStatsIds(self, txpacket):
+        # IDs the packet is counted under in the packet stats: a BULK_READ counts once per servo it reads,
+        # like its status packets and their failures, other packets under their own ID
+        if txpacket[PKT_INSTRUCTION] != INST_BULK_READ:
+            return [txpacket[PKT_ID]]
+        # parameters: 0x00, then length, ID and address per servo
+        return list(txpacket[PKT_PARAMETER0 + 2:PKT_PARAMETER0 + txpacket[PKT_LENGTH] - 2:3])
+
+    def parseRxPacket(self, rxpacket, rx_length):
+        # look for a status packet at the start of rxpacket[0:rx_length], dropping the bytes in front of its header
+        # return : rx_length left after dropping, length of the packet, COMM_SUCCESS/COMM_RX_CORRUPT
+        #          or COMM_RX_WAITING while more bytes are needed
+        wait_length = 6  # minimum length (HEADER0 HEADER1 ID LENGTH ERROR CHKSUM)
+
+        while rx_length >= wait_length:
+            # find packet header
+            idx = rxpacket.find(b'\xff\xff', 0, rx_length)
+            if idx < 0:
+                idx = rx_length - 1
+
+            if idx != 0:
+                # remove unnecessary packets
+                rxpacket[0: rx_length - idx] = rxpacket[idx: rx_length]
+                rx_length -= idx
+                continue
+
+            if (rxpacket[PKT_ID] > 0xFD) or (rxpacket[PKT_LENGTH] > RXPACKET_MAX_LEN) or (
+                    rxpacket[PKT_ERROR] > 0x7F):
+                # unavailable ID or unavailable Length or unavailable Error
+                # remove the first byte in the packet
+                rxpacket[0: rx_length - 1] = rxpacket[1: rx_length]
+                rx_length -= 1
+                continue
+
+            # re-calculate the exact length of the rx packet
+            wait_length = rxpacket[PKT_LENGTH] + PKT_LENGTH + 1
+            if rx_length < wait_length:
+                break
+
+            # calculate checksum
+            checksum = ~sum(memoryview(rxpacket)[2: wait_length - 1]) & 0xFF  # except header, checksum
+
+            # verify checksum
+            if rxpacket[wait_length - 1] == checksum:
+                return rx_length, wait_length, COMM_SUCCESS
+            else:
+                return rx_length, wait_length, COMM_RX_CORRUPT
+
+        return rx_length, wait_length, COMM_RX_WAITING
+
+    def popRxPacket(self, port, rx_length, wait_length):
+        # take the status packet out of the port's rx buffer, keeping whatever arrived after it
+        # for the next call (e.g. BulkRead)
+        return bytes(self.popRxView(port, rx_length, wait_length))
+
+    def popRxView(self, port, rx_length, wait_length):
+        # popRxPacket without the copy, for the handlers
+        # return : memoryview of the packet, only valid until the next status packet on this port
+        rxpacket = port.rx_buffer_view
+        if rx_length >= wait_length:
+            packet_length = wait_length
+            port.rx_buffer_length = rx_length - wait_length
+        else:
+            packet_length = rx_length
+            port.rx_buffer_length = 0
+
+        port.rx_packet[0: packet_length] = rxpacket[0: packet_length]
+        rxpacket[0: port.rx_buffer_length] = rxpacket[packet_length: rx_length]
+        return port.rx_packet[0: packet_length]
+
     def rxPacket(self, port):
-        rxpacket = []
+        rxpacket, result = self.rxView(port)
+        return bytes(rxpacket), result
+
+    def rxView(self, port):
+        # rxPacket returning a view of the port's rx packet, only valid until the next status packet
+        rxpacket = port.rx_buffer
 
         result = COMM_TX_FAIL
-        checksum = 0
-        rx_length = 0
+        rx_length = port.rx_buffer_length  # bytes left over from the previous status packet
         wait_length = 6  # minimum length (HEADER0 HEADER1 ID LENGTH ERROR CHKSUM)
 
         while True:
-            rxpacket.extend(port.readPort(wait_length - rx_length))
-            rx_length = len(rxpacket)
-            if rx_length >= wait_length:
-                # find packet header
-                for idx in range(0, (rx_length - 1)):
-                    if (rxpacket[idx] == 0xFF) and (rxpacket[idx + 1] == 0xFF):
-                        break
-
-                if idx == 0:  # found at the beginning of the packet
-                    if (rxpacket[PKT_ID] > 0xFD) or (rxpacket[PKT_LENGTH] > RXPACKET_MAX_LEN) or (
-                            rxpacket[PKT_ERROR] > 0x7F):
-                        # unavailable ID or unavailable Length or unavailable Error
-                        # remove the first byte in the packet
-                        del rxpacket[0]
-                        rx_length -= 1
-                        continue
-
-                    # re-calculate the exact length of the rx packet
-                    if wait_length != (rxpacket[PKT_LENGTH] + PKT_LENGTH + 1):
-                        wait_length = rxpacket[PKT_LENGTH] + PKT_LENGTH + 1
-                        continue
-
-                    if rx_length < wait_length:
-                        # check timeout
-                        if port.isPacketTimeout():
-                            if rx_length == 0:
-                                result = COMM_RX_TIMEOUT
-                            else:
-                                result = COMM_RX_CORRUPT
-                            break
-                        else:
-                            continue
-
-                    # calculate checksum
-                    for i in range(2, wait_length - 1):  # except header, checksum
-                        checksum += rxpacket[i]
-                    checksum = ~checksum & 0xFF
-
-                    # verify checksum
-                    if rxpacket[wait_length - 1] == checksum:
-                        result = COMM_SUCCESS
-                    else:
-                        result = COMM_RX_CORRUPT
-                    break
+            if rx_length < wait_length:
+                read_length = port.readPortInto(rxpacket, rx_length, wait_length - rx_length)
+                rx_length += read_length
+                if read_length == 0 and port.rx_blocking:
+                    port.waitPort()
+
+            rx_length, wait_length, result = self.parseRxPacket(rxpacket, rx_length)
+            if result != COMM_RX_WAITING:
+                break
 
+            # check timeout
+            if port.isPacketTimeout():
+                if rx_length == 0:
+                    result = COMM_RX_TIMEOUT
                 else:
-                    # remove unnecessary packets
-                    del rxpacket[0: idx]
-                    rx_length -= idx
+                    result = COMM_RX_CORRUPT
+                port.recordPacketTimeout()
+                break
 
-            else:
-                # check timeout
-                if port.isPacketTimeout():
-                    if rx_length == 0:
-                        result = COMM_RX_TIMEOUT
-                    else:
-                        result = COMM_RX_CORRUPT
-                    break
+        packet = self.popRxView(port, rx_length, wait_length)
+        if result == COMM_SUCCESS:
+            port.recordPacketLatency(packet[PKT_ID])
 
         port.is_using = False
 
-        #print "[RxPacket] %r" % rxpacket
+        #print "[RxPacket] %r" % packet
 
-        return rxpacket, result
+        return packet, result
 
     # NOT for BulkRead
     def txRxPacket(self, port, txpacket):
+        # send again while port.retry_policy allows it
+        start_time = port.getCurrentTime()
+        attempts = 0
+        while True:
+            rxpacket, result, error = self.txRxPacketOnce(port, txpacket)
+            attempts += 1
+
+            policy = port.retry_policy
+            if policy is None or not policy.isRetryable(txpacket[PKT_INSTRUCTION], result, error):
+                break
+            elapsed = port.getCurrentTime() - start_time
+            backoff = policy.getBackoff(attempts, elapsed, elapsed / attempts)
+            if backoff is None:
+                break
+
+            port.packet_stats.addRetry(txpacket[PKT_ID], txpacket[PKT_INSTRUCTION])
+            port.resyncPort()
+            time.sleep(backoff / 1000.0)
+
+        return rxpacket, result, error
+
+    def txRxPacketOnce(self, port, txpacket):
         rxpacket = None
         error = 0
 
@@ -222,33 +328,43 @@ class Protocol1PacketHandler(object):
 
         # set packet timeout
         if txpacket[PKT_INSTRUCTION] == INST_READ:
-            port.setPacketTimeout(txpacket[PKT_PARAMETER0 + 1] + 6)
+            port.setPacketTimeout(txpacket[PKT_PARAMETER0 + 1] + 6, txpacket[PKT_ID], INST_READ)
         else:
-            port.setPacketTimeout(6)  # HEADER0 HEADER1 ID LENGTH ERROR CHECKSUM
+            # HEADER0 HEADER1 ID LENGTH ERROR CHECKSUM
+            port.setPacketTimeout(6, txpacket[PKT_ID], txpacket[PKT_INSTRUCTION])
 
         # rx packet
         while True:
-            rxpacket, result = self.rxPacket(port)
-            if result != COMM_SUCCESS or txpacket[PKT_ID] == rxpacket[PKT_ID]:
+            rxpacket, result = self.rxView(port)
+            if result != COMM_SUCCESS:
+                break
+            if txpacket[PKT_INSTRUCTION] == INST_READ:
+                if self.isReadStatus(rxpacket, txpacket[PKT_ID], txpacket[PKT_PARAMETER0 + 1]):
+                    break
+            elif txpacket[PKT_ID] == rxpacket[PKT_ID]:
                 break
 
         if result == COMM_SUCCESS and txpacket[PKT_ID] == rxpacket[PKT_ID]:
             error = rxpacket[PKT_ERROR]
+        port.packet_stats.addResult(txpacket[PKT_ID], txpacket[PKT_INSTRUCTION], result, error)
 
-        return rxpacket, result, error
+        return bytes(rxpacket), result, error
+
+    def isReadStatus(self, rxpacket, dxl_id, length):
+        # status packet of dxl_id answering a READ of length bytes, a late answer to an earlier READ
+        # with another length is not one (an error status may come without parameters)
+        if rxpacket[PKT_ID] != dxl_id:
+            return False
+        return rxpacket[PKT_LENGTH] == length + 2 or (rxpacket[PKT_LENGTH] == 2 and rxpacket[PKT_ERROR] != 0)
 
     def ping(self, port, dxl_id):
         model_number = 0
         error = 0
 
-        txpacket = [0] * 6
-
         if dxl_id >= BROADCAST_ID:
             return model_number, COMM_NOT_AVAILABLE, error
 
-        txpacket[PKT_ID] = dxl_id
-        txpacket[PKT_LENGTH] = 2
-        txpacket[PKT_INSTRUCTION] = INST_PING
+        txpacket, _ = self.getTxTemplate(port, dxl_id, INST_PING, (), 0)
 
         rxpacket, result, error = self.txRxPacket(port, txpacket)
 
@@ -260,15 +376,43 @@ class Protocol1PacketHandler(object):
         return model_number, result, error
 
     def broadcastPing(self, port):
-        data_list = None
-        return data_list, COMM_NOT_AVAILABLE
+        # every servo on the bus answers a PING to BROADCAST_ID at the same time, so with several
+        # servos the status packets collide; only reliable on a bus with a single servo
+        # return : {dxl_id: error}, result (COMM_RX_CORRUPT if only broken status packets arrived)
+        data_list = {}
+        corrupt = False
 
-    def action(self, port, dxl_id):
-        txpacket = [0] * 6
+        txpacket, _ = self.getTxTemplate(port, BROADCAST_ID, INST_PING, (), 0)
 
-        txpacket[PKT_ID] = dxl_id
-        txpacket[PKT_LENGTH] = 2
-        txpacket[PKT_INSTRUCTION] = INST_ACTION
+        result = self.txPacket(port, txpacket)
+        if result != COMM_SUCCESS:
+            port.is_using = False
+            return data_list, result
+
+        # 6 bytes per status packet, after a return delay of up to 508 usec
+        wait_length = 6 * MAX_ID
+        port.setPacketTimeoutMillis((wait_length * port.tx_time_per_byte) + (0.508 * MAX_ID) + 16.0)
+
+        while True:
+            rxpacket, result = self.rxView(port)
+            if result == COMM_SUCCESS:
+                data_list[rxpacket[PKT_ID]] = rxpacket[PKT_ERROR]
+            elif result == COMM_RX_TIMEOUT or port.packet_timeout == 0:
+                # nothing more before the deadline (isPacketTimeout clears packet_timeout)
+                corrupt = corrupt or result == COMM_RX_CORRUPT
+                break
+            else:
+                corrupt = True
+
+        port.is_using = False
+
+        if len(data_list) == 0:
+            return data_list, COMM_RX_CORRUPT if corrupt else COMM_RX_TIMEOUT
+
+        return data_list, COMM_SUCCESS
+
+    def action(self, port, dxl_id):
+        txpacket, _ = self.getTxTemplate(port, dxl_id, INST_ACTION, (), 0)
 
         _, result, _ = self.txRxPacket(port, txpacket)
 
@@ -289,23 +433,16 @@ class Protocol1PacketHandler(object):
         return result, error
 
     def readTx(self, port, dxl_id, address, length):
-
-        txpacket = [0] * 8
-
         if dxl_id >= BROADCAST_ID:
             return COMM_NOT_AVAILABLE
 
-        txpacket[PKT_ID] = dxl_id
-        txpacket[PKT_LENGTH] = 4
-        txpacket[PKT_INSTRUCTION] = INST_READ
-        txpacket[PKT_PARAMETER0 + 0] = address
-        txpacket[PKT_PARAMETER0 + 1] = length
+        txpacket, _ = self.getTxTemplate(port, dxl_id, INST_READ, (address, length), 2)
 
         result = self.txPacket(port, txpacket)
 
         # set packet timeout
         if result == COMM_SUCCESS:
-            port.setPacketTimeout(length + 6)
+            port.setPacketTimeout(length + 6, dxl_id, INST_READ)
 
         return result
 
@@ -317,36 +454,32 @@ class Protocol1PacketHandler(object):
         data = []
 
         while True:
-            rxpacket, result = self.rxPacket(port)
+            rxpacket, result = self.rxView(port)
 
-            if result != COMM_SUCCESS or rxpacket[PKT_ID] == dxl_id:
+            if result != COMM_SUCCESS or self.isReadStatus(rxpacket, dxl_id, length):
                 break
 
         if result == COMM_SUCCESS and rxpacket[PKT_ID] == dxl_id:
             error = rxpacket[PKT_ERROR]
 
-            data.extend(rxpacket[PKT_PARAMETER0: PKT_PARAMETER0 + length])
+            data = bytes(rxpacket[PKT_PARAMETER0: PKT_PARAMETER0 + length])
+        port.packet_stats.addResult(dxl_id, port.packet_instruction, result, error)
 
         return data, result, error
 
     def readTxRx(self, port, dxl_id, address, length):
-        txpacket = [0] * 8
         data = []
 
         if dxl_id >= BROADCAST_ID:
             return data, COMM_NOT_AVAILABLE, 0
 
-        txpacket[PKT_ID] = dxl_id
-        txpacket[PKT_LENGTH] = 4
-        txpacket[PKT_INSTRUCTION] = INST_READ
-        txpacket[PKT_PARAMETER0 + 0] = address
-        txpacket[PKT_PARAMETER0 + 1] = length
+        txpacket, _ = self.getTxTemplate(port, dxl_id, INST_READ, (address, length), 2)
 
         rxpacket, result, error = self.txRxPacket(port, txpacket)
         if result == COMM_SUCCESS:
             error = rxpacket[PKT_ERROR]
 
-            data.extend(rxpacket[PKT_PARAMETER0: PKT_PARAMETER0 + length])
+            data = rxpacket[PKT_PARAMETER0: PKT_PARAMETER0 + length]
 
         return data, result, error
 
@@ -392,14 +525,8 @@ class Protocol1PacketHandler(object):
         return data_read, result, error
 
     def writeTxOnly(self, port, dxl_id, address, length, data):
-        txpacket = [0] * (length + 7)
-
-        txpacket[PKT_ID] = dxl_id
-        txpacket[PKT_LENGTH] = length + 3
-        txpacket[PKT_INSTRUCTION] = INST_WRITE
-        txpacket[PKT_PARAMETER0] = address
-
-        txpacket[PKT_PARAMETER0 + 1: PKT_PARAMETER0 + 1 + length] = data[0: length]
+        template = self.getTxTemplate(port, dxl_id, INST_WRITE, (address,), length + 1)
+        txpacket = self.patchTxTemplate(template, PKT_PARAMETER0 + 1, data, length)
 
         result = self.txPacket(port, txpacket)
         port.is_using = False
@@ -407,14 +534,9 @@ class Protocol1PacketHandler(object):
         return result
 
     def writeTxRx(self, port, dxl_id, address, length, data):
-        txpacket = [0] * (length + 7)
-
-        txpacket[PKT_ID] = dxl_id
-        txpacket[PKT_LENGTH] = length + 3
-        txpacket[PKT_INSTRUCTION] = INST_WRITE
-        txpacket[PKT_PARAMETER0] = address
+        template = self.getTxTemplate(port, dxl_id, INST_WRITE, (address,), length + 1)
+        txpacket = self.patchTxTemplate(template, PKT_PARAMETER0 + 1, data, length)
 
-        txpacket[PKT_PARAMETER0 + 1: PKT_PARAMETER0 + 1 + length] = data[0: length]
         rxpacket, result, error = self.txRxPacket(port, txpacket)
 
         return result, error
@@ -450,14 +572,8 @@ class Protocol1PacketHandler(object):
         return self.writeTxRx(port, dxl_id, address, 4, data_write)
 
     def regWriteTxOnly(self, port, dxl_id, address, length, data):
-        txpacket = [0] * (length + 7)
-
-        txpacket[PKT_ID] = dxl_id
-        txpacket[PKT_LENGTH] = length + 3
-        txpacket[PKT_INSTRUCTION] = INST_REG_WRITE
-        txpacket[PKT_PARAMETER0] = address
-
-        txpacket[PKT_PARAMETER0 + 1: PKT_PARAMETER0 + 1 + length] = data[0: length]
+        template = self.getTxTemplate(port, dxl_id, INST_REG_WRITE, (address,), length + 1)
+        txpacket = self.patchTxTemplate(template, PKT_PARAMETER0 + 1, data, length)
 
         result = self.txPacket(port, txpacket)
         port.is_using = False
@@ -465,14 +581,8 @@ class Protocol1PacketHandler(object):
         return result
 
     def regWriteTxRx(self, port, dxl_id, address, length, data):
-        txpacket = [0] * (length + 7)
-
-        txpacket[PKT_ID] = dxl_id
-        txpacket[PKT_LENGTH] = length + 3
-        txpacket[PKT_INSTRUCTION] = INST_REG_WRITE
-        txpacket[PKT_PARAMETER0] = address
-
-        txpacket[PKT_PARAMETER0 + 1: PKT_PARAMETER0 + 1 + length] = data[0: length]
+        template = self.getTxTemplate(port, dxl_id, INST_REG_WRITE, (address,), length + 1)
+        txpacket = self.patchTxTemplate(template, PKT_PARAMETER0 + 1, data, length)
 
         _, result, error = self.txRxPacket(port, txpacket)
 
@@ -482,31 +592,17 @@ class Protocol1PacketHandler(object):
         return COMM_NOT_AVAILABLE
 
     def syncWriteTxOnly(self, port, start_address, data_length, param, param_length):
-        txpacket = [0] * (param_length + 8)
-        # 8: HEADER0 HEADER1 ID LEN INST START_ADDR DATA_LEN ... CHKSUM
-
-        txpacket[PKT_ID] = BROADCAST_ID
-        txpacket[PKT_LENGTH] = param_length + 4  # 4: INST START_ADDR DATA_LEN ... CHKSUM
-        txpacket[PKT_INSTRUCTION] = INST_SYNC_WRITE
-        txpacket[PKT_PARAMETER0 + 0] = start_address
-        txpacket[PKT_PARAMETER0 + 1] = data_length
-
-        txpacket[PKT_PARAMETER0 + 2: PKT_PARAMETER0 + 2 + param_length] = param[0: param_length]
+        template = self.getTxTemplate(port, BROADCAST_ID, INST_SYNC_WRITE, (start_address, data_length),
+                                      param_length + 2)  # 2: START_ADDR DATA_LEN
+        txpacket = self.patchTxTemplate(template, PKT_PARAMETER0 + 2, param, param_length)
 
         _, result, _ = self.txRxPacket(port, txpacket)
 
         return result
 
     def bulkReadTx(self, port, param, param_length):
-        txpacket = [0] * (param_length + 7)
-        # 7: HEADER0 HEADER1 ID LEN INST 0x00 ... CHKSUM
-
-        txpacket[PKT_ID] = BROADCAST_ID
-        txpacket[PKT_LENGTH] = param_length + 3  # 3: INST 0x00 ... CHKSUM
-        txpacket[PKT_INSTRUCTION] = INST_BULK_READ
-        txpacket[PKT_PARAMETER0 + 0] = 0x00
-
-        txpacket[PKT_PARAMETER0 + 1: PKT_PARAMETER0 + 1 + param_length] = param[0: param_length]
+        template = self.getTxTemplate(port, BROADCAST_ID, INST_BULK_READ, (0x00,), param_length + 1)
+        txpacket = self.patchTxTemplate(template, PKT_PARAMETER0 + 1, param, param_length)
 
         result = self.txPacket(port, txpacket)
         if result == COMM_SUCCESS:
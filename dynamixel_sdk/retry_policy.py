@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+################################################################################
+# Copyright 2017 ROBOTIS CO., LTD.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+################################################################################
+
+# Author: Ryu Woon Jung (Leon)
+
+from .robotis_def import *
+from .protocol1_packet_handler import ERRBIT_CHECKSUM
+
+RETRY_ATTEMPTS = 3  # attempts per transaction, the first one included
+RETRY_BACKOFF = 0.5  # msec before the second attempt, doubled for every further one
+RETRY_DEADLINE = 100.0  # msec from the start of the first attempt, no attempt may end past it
+RETRY_INSTRUCTIONS = (INST_PING, INST_READ, INST_WRITE, INST_REG_WRITE)  # idempotent, safe to send twice
+RETRY_RESULTS = (COMM_RX_TIMEOUT, COMM_RX_CORRUPT)
+RETRY_ERRORS = ERRBIT_CHECKSUM  # the servo got a corrupted instruction packet and ignored it
+
+
+class RetryPolicy(object):
+    # when to send a transaction again after a lost or corrupted packet
+    def __init__(self, attempts=RETRY_ATTEMPTS, backoff=RETRY_BACKOFF, deadline=RETRY_DEADLINE,
+                 instructions=RETRY_INSTRUCTIONS):
+        self.attempts = attempts
+        self.backoff = backoff
+        self.deadline = deadline
+        self.instructions = instructions
+
+    def isRetryable(self, instruction, result, error):
+        if instruction not in self.instructions:
+            return False
+        return result in RETRY_RESULTS or (result == COMM_SUCCESS and (error & RETRY_ERRORS) != 0)
+
+    def getBackoff(self, attempts, elapsed, attempt_time):
+        # msec to wait before the next attempt, after attempts of them took elapsed msec in total,
+        # None if there is none left or if it would not end before the deadline
+        if attempts >= self.attempts:
+            return None
+        backoff = self.backoff * (2 ** (attempts - 1))
+        if elapsed + backoff + attempt_time > self.deadline:
+            return None
+        return backoff
@@ -2,8 +2,12 @@
 very simple code of instantiation
 '''
 
+import logging
 from UCD_Hand import *
 
+# show the port messages of the servo stack
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+
 #%%
 # Check the com port in your device manager
 model = PT_O('COM5',2)
@@ -0,0 +1,52 @@
+'''
+AsyncPortHandler.close must resolve every transaction, the one on the bus too.
+Run with "python -m pytest tests".
+'''
+import os
+import sys
+import asyncio
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Servo_Emulator import *
+
+
+class Async_Close_Test(unittest.TestCase):
+    def setUp(self):
+        self.servo = MX28_Emulator(1)
+        self.port = EmulatedPortHandler(Emulated_Bus([self.servo]))
+        self.port.openPort()
+        self.port.setBaudRate(57600)
+        self.port.setRetryPolicy(None)
+
+    def test_transaction_in_flight_fails(self):
+        async def run():
+            aport = AsyncPortHandler(self.port, openpacket())
+            await aport.start()
+            data, dxl_result, dxl_error = await aport.read(1, ADDR_MX_PRESENT_POSITION, 2)
+            self.assertEqual(dxl_result, COMM_SUCCESS)
+
+            # the servo never answers, so the read waits for its timeout when close() comes
+            self.servo.inject_fault('timeout')
+            read = asyncio.ensure_future(aport.read(1, ADDR_MX_PRESENT_POSITION, 2))
+            await asyncio.sleep(0)
+            await asyncio.sleep(0.001)
+            await aport.close()
+            with self.assertRaisesRegex(IOError, 'is closed'):
+                await asyncio.wait_for(read, 1.0)
+            self.assertFalse(self.port.is_using)
+        asyncio.run(run())
+
+    def test_submit_after_close_fails(self):
+        async def run():
+            aport = AsyncPortHandler(self.port, openpacket())
+            await aport.start()
+            await aport.close()
+            with self.assertRaisesRegex(IOError, 'is closed'):
+                await asyncio.wait_for(aport.read(1, ADDR_MX_PRESENT_POSITION, 2), 1.0)
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
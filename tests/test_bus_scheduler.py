@@ -0,0 +1,92 @@
+'''
+Priority order of Bus_Scheduler and coalescing of the queued reads into one
+READ or BULK_READ. Run with "python -m pytest tests".
+'''
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Servo_Emulator import *
+from Bus_Scheduler import *
+
+
+class Bus_Scheduler_Test(unittest.TestCase):
+    def setUp(self):
+        self.servos = [MX28_Emulator(1), MX28_Emulator(2)]
+        self.servos[1].position = 1000.0
+        self.servos[1].update_present()
+        port = EmulatedPortHandler(Emulated_Bus(self.servos))
+        port.openPort()
+        port.setBaudRate(57600)
+        self.scheduler = Bus_Scheduler(port, openpacket())
+
+        # hold the bus thread so the next transactions queue up
+        self.release = threading.Event()
+        self.busy = threading.Event()
+        def hold(port, packet):
+            self.busy.set()
+            self.release.wait()
+        self.scheduler.submit(hold)
+        self.busy.wait()
+
+    def tearDown(self):
+        self.release.set()
+        self.scheduler.close()
+
+    def test_priority_order(self):
+        order = []
+        def job(name):
+            return lambda port, packet: order.append(name)
+        futures = [self.scheduler.submit_read(1, ADDR_MX_PRESENT_POSITION, 2),
+                   self.scheduler.submit(job('telemetry'), PRIORITY_TELEMETRY),
+                   self.scheduler.submit(job('motion 1'), PRIORITY_MOTION),
+                   self.scheduler.submit(job('stop'), PRIORITY_STOP),
+                   self.scheduler.submit(job('motion 2'), PRIORITY_MOTION)]
+        futures[0].add_done_callback(lambda future: order.append('read'))
+        self.release.set()
+        for future in futures:
+            future.result(timeout=1.0)
+        self.assertEqual(order, ['stop', 'motion 1', 'motion 2', 'telemetry', 'read'])
+        self.assertEqual(self.scheduler.metrics()['wait_ms']['stop']['count'], 1)
+
+    def test_reads_of_one_servo_coalesce_into_a_read(self):
+        position = self.scheduler.submit_read(2, ADDR_MX_PRESENT_POSITION, 2)
+        voltage = self.scheduler.submit_read(2, ADDR_MX_VOLTAGE, 1)
+        sent = sum(self.scheduler.port.getPacketStats()['transactions'].values())
+        self.release.set()
+
+        self.assertEqual(position.result(timeout=1.0), ([0xE8, 0x03], COMM_SUCCESS, 0))
+        self.assertEqual(voltage.result(timeout=1.0), ([120], COMM_SUCCESS, 0))
+        self.assertEqual(sum(self.scheduler.port.getPacketStats()['transactions'].values()), sent + 1)
+        self.assertEqual(self.scheduler.metrics()['coalesced_reads'], 1)
+
+    def test_reads_of_many_servos_coalesce_into_a_bulk_read(self):
+        reads = [self.scheduler.submit_read(1, ADDR_MX_PRESENT_POSITION, 2),
+                 self.scheduler.submit_read(2, ADDR_MX_PRESENT_POSITION, 2),
+                 self.scheduler.submit_read(2, ADDR_MX_MOVING, 1)]
+        written = []
+        write_port = self.scheduler.port.writePort
+        def record(packet):
+            written.append(bytearray(packet)[4])
+            return write_port(packet)
+        self.scheduler.port.writePort = record
+        self.release.set()
+
+        self.assertEqual([read.result(timeout=1.0)[0] for read in reads], [[0x00, 0x08], [0xE8, 0x03], [0]])
+        self.assertEqual(written, [INST_BULK_READ])
+        self.assertEqual(self.scheduler.metrics()['coalesced_reads'], 2)
+
+    def test_closed_scheduler_fails_the_queued_jobs(self):
+        queued = self.scheduler.submit(lambda port, packet: None)
+        self.release.set()
+        self.scheduler.close()
+        self.assertTrue(queued.done())
+        with self.assertRaisesRegex(IOError, 'is closed'):
+            self.scheduler.submit(lambda port, packet: None).result()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+'''
+Bus_Tuning on an emulated bus: the scan and the switch of the baud rate.
+Run with "python -m pytest tests".
+'''
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Servo_Emulator import *
+import Bus_Tuning
+from Bus_Tuning import scan_bus, tune_bus, BAUDRATE_WRITES
+
+
+class Bus_Tuning_Test(unittest.TestCase):
+    def setUp(self):
+        self.servos = [MX28_Emulator(1), MX28_Emulator(2), MX28_Emulator(7, baud_register=1)]
+        self.port = EmulatedPortHandler(Emulated_Bus(self.servos))
+        self.port.openPort()
+        self.port.setBaudRate(57600)
+        self.packet = openpacket()
+        # pinging all 254 IDs takes a while, the servos are below 10
+        patcher = mock.patch('Bus_Tuning.SCAN_IDS', range(10))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def miss_after_scan(self, servo, count):
+        # servo misses the next count instruction packets after the scan of tune_bus
+        def scan(port, packet, baudrates=None):
+            found = scan_bus(port, packet, baudrates)
+            servo.miss_instructions(count)
+            return found
+        return mock.patch('Bus_Tuning.scan_bus', scan)
+
+    def test_scan_finds_colliding_servos(self):
+        found = scan_bus(self.port, self.packet, [1000000, 57600])
+        self.assertEqual(found, {1: 57600, 2: 57600, 7: 1000000})
+
+    def test_servo_that_missed_the_broadcast_is_moved(self):
+        with self.miss_after_scan(self.servos[1], BAUDRATE_WRITES):
+            baudrate, return_delay = tune_bus(self.port, self.packet, [1000000, 57600], [0, 250], count=5)
+        self.assertEqual(baudrate, 1000000)
+        self.assertEqual([servo.baudrate for servo in self.servos], [1000000] * 3)
+
+    def test_bus_is_not_left_split(self):
+        # servo 2 misses the broadcasts and the ping that would find it at the old baud rate
+        self.port.setRetryPolicy(None)
+        del self.port.bus.servos[7]
+        with self.miss_after_scan(self.servos[1], BAUDRATE_WRITES + 1):
+            baudrate, return_delay = tune_bus(self.port, self.packet, [1000000, 57600], [0, 250], count=5)
+        self.assertEqual(baudrate, 57600)
+        self.assertEqual([servo.table[ADDR_MX_BAUD_RATE] for servo in self.servos[:2]], [baudrate_to_register(57600)] * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+'''
+Contact_Detector on synthetic load traces and PT_O.grasp on an emulated bus.
+Run with "python -m pytest tests".
+'''
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Servo_Emulator import *
+import UCD_Hand
+from UCD_Hand import Contact_Detector, CONTACT_WARMUP, CONTACT_SAMPLES
+
+
+def first_contact(detector, loads):
+    # index of the sample that reported the contact, None if there was none
+    for index, load in enumerate(loads):
+        if detector.update(load):
+            return index
+    return None
+
+
+class Contact_Detector_Test(unittest.TestCase):
+    def test_free_motion(self):
+        self.assertIsNone(first_contact(Contact_Detector(300), [60, 62, 58, 61] * 20))
+
+    def test_knee(self):
+        loads = [60] * 20 + [60 + 40 * i for i in range(1, 10)]
+        detector = Contact_Detector(1000)
+        index = first_contact(detector, loads)
+        self.assertIsNotNone(index)
+        self.assertEqual(detector.knee, index - CONTACT_SAMPLES + 1)
+        self.assertGreaterEqual(detector.knee, 20)
+
+    def test_force_limit(self):
+        detector = Contact_Detector(300)
+        self.assertEqual(first_contact(detector, [60] * 10 + [350]), 10)
+        self.assertEqual(detector.knee, 10)
+
+    def test_spike_during_warmup(self):
+        # the load peaks above the force limit while the fingers speed up
+        loads = [400] + [60] * 30
+        self.assertIsNone(first_contact(Contact_Detector(300), loads))
+
+    def test_contact_from_the_start(self):
+        # already touching: the limit counts right after the warmup
+        self.assertEqual(first_contact(Contact_Detector(300), [400] * 20), CONTACT_WARMUP)
+
+    def test_negative_load(self):
+        # the direction bit doesn't matter
+        self.assertEqual(first_contact(Contact_Detector(300), [-60] * 10 + [-350]), 10)
+
+
+@unittest.skipIf(os.name != 'posix', "Pty_Bus needs a pseudo terminal")
+class Grasp_Test(unittest.TestCase):
+    def setUp(self):
+        self.emulated = MX28_Emulator(1)
+        self.pty_bus = Pty_Bus(Emulated_Bus([self.emulated]))
+        port_name = self.pty_bus.start()
+        load_calibration = UCD_Hand.load_calibration
+        UCD_Hand.load_calibration = lambda: (2400, 1900)
+        try:
+            self.gripper = UCD_Hand.PT_O(port_name, 1)
+        finally:
+            UCD_Hand.load_calibration = load_calibration
+
+    def tearDown(self):
+        self.gripper.disconnect()
+        self.pty_bus.stop()
+
+    def test_grasp_object(self):
+        self.emulated.set_obstacle(2200)
+        result = self.gripper.grasp(force=300, timeout=2.0)
+        self.assertTrue(result['contact'])
+        self.assertLessEqual(abs(result['position'] - 2200), UCD_Hand.POSITION_TOLERANCE)
+        self.assertGreaterEqual(result['detect_ms'], 0)
+        # held at the force, full torque again on the next move
+        self.assertEqual(self.emulated.read_value(ADDR_MX_TORQUE_LIMIT, 2), 300)
+        self.gripper.open(speed=300).result(2.0)
+        self.assertEqual(self.emulated.read_value(ADDR_MX_TORQUE_LIMIT, 2), UCD_Hand.MAX_TORQUE)
+
+    def test_grasp_nothing(self):
+        result = self.gripper.grasp(force=300, speed=300, timeout=2.0)
+        self.assertFalse(result['contact'])
+        self.assertLessEqual(abs(result['position'] - 2400), UCD_Hand.POSITION_TOLERANCE)
+        self.assertEqual(self.emulated.read_value(ADDR_MX_TORQUE_LIMIT, 2), UCD_Hand.MAX_TORQUE)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+'''
+Layers of the NumPy graspNet backend against loop references of the
+TensorFlow ops, and the dense model against the patch model. Run with
+"python -m pytest tests".
+'''
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Grasp_locater'))
+
+from grasp_numpy import *
+
+
+def loop_conv2d(x, kernel, biases, s_h, s_w, pad_h, pad_w, group):
+    # one output value at a time, pad_h and pad_w are the (before, after) padding
+    k_h, k_w, c_g, c_o = kernel.shape
+    x = np.pad(x, ((0, 0), pad_h, pad_w, (0, 0)))
+    h_o = (x.shape[1] - k_h) // s_h + 1
+    w_o = (x.shape[2] - k_w) // s_w + 1
+    c_og = c_o // group
+    out = np.zeros((x.shape[0], h_o, w_o, c_o))
+    for n in range(x.shape[0]):
+        for i in range(h_o):
+            for j in range(w_o):
+                window = x[n, i * s_h:i * s_h + k_h, j * s_w:j * s_w + k_w]
+                for o in range(c_o):
+                    g = o // c_og
+                    out[n, i, j, o] = np.sum(window[:, :, g * c_g:(g + 1) * c_g] * kernel[:, :, :, o]) + biases[o]
+    return out
+
+
+def loop_lrn(x, depth_radius, bias, alpha, beta):
+    out = np.zeros(x.shape)
+    for c in range(x.shape[3]):
+        window = x[..., max(c - depth_radius, 0):c + depth_radius + 1].astype(np.float64)
+        out[..., c] = x[..., c] / (bias + alpha * np.sum(window ** 2, axis=3)) ** beta
+    return out
+
+
+def loop_max_pool(x, k_h, k_w, s_h, s_w):
+    h_o = (x.shape[1] - k_h) // s_h + 1
+    w_o = (x.shape[2] - k_w) // s_w + 1
+    out = np.zeros((x.shape[0], h_o, w_o, x.shape[3]))
+    for i in range(h_o):
+        for j in range(w_o):
+            out[:, i, j] = x[:, i * s_h:i * s_h + k_h, j * s_w:j * s_w + k_w].max(axis=(1, 2))
+    return out
+
+
+def small_weights(random):
+    # the graspNet layers with fewer channels, the group splits stay the same
+    shapes = {'conv1W': (11, 11, 3, 8), 'conv2W': (5, 5, 4, 16), 'conv3W': (3, 3, 16, 12),
+              'conv4W': (3, 3, 6, 12), 'conv5W': (3, 3, 6, 8), 'fc6W': (6 * 6 * 8, 32), 'fc7W': (32, 16),
+              'fc8W': (16, 18)}
+    weights = {}
+    for name, shape in shapes.items():
+        weights[name] = random.normal(0, 1.0 / np.sqrt(np.prod(shape[:-1])), size=shape).astype(np.float32)
+        weights[name[:-1] + 'b'] = random.normal(0, 0.1, size=shape[-1]).astype(np.float32)
+    return weights
+
+
+class Grasp_Numpy_Test(unittest.TestCase):
+    def setUp(self):
+        self.random = np.random.RandomState(0)
+
+    def test_same_padding(self):
+        # conv1 of a 224 patch: 56 outputs, tf puts the odd pixel after the image
+        self.assertEqual(same_padding(224, 11, 4), (3, 4))
+        self.assertEqual(same_padding(13, 3, 1), (1, 1))
+        self.assertEqual(same_padding(4, 11, 4), (3, 4))
+
+    def test_conv2d(self):
+        x = self.random.randn(2, 9, 11, 4).astype(np.float32)
+        kernel = self.random.randn(3, 5, 2, 6).astype(np.float32)
+        biases = self.random.randn(6).astype(np.float32)
+        np.testing.assert_allclose(conv2d(x, kernel, biases, 2, 3, padding="SAME", group=2),
+                                   loop_conv2d(x, kernel, biases, 2, 3, same_padding(9, 3, 2),
+                                               same_padding(11, 5, 3), 2), rtol=1e-4, atol=1e-4)
+        kernel = self.random.randn(3, 3, 4, 5).astype(np.float32)
+        biases = self.random.randn(5).astype(np.float32)
+        np.testing.assert_allclose(conv2d(x, kernel, biases, 1, 1),
+                                   loop_conv2d(x, kernel, biases, 1, 1, (0, 0), (0, 0), 1), rtol=1e-4, atol=1e-4)
+
+    def test_local_response_normalization(self):
+        x = self.random.randn(2, 3, 4, 10).astype(np.float32) * 10
+        np.testing.assert_allclose(local_response_normalization(x, depth_radius=2, alpha=2e-05, beta=0.75, bias=1.0),
+                                   loop_lrn(x, 2, 1.0, 2e-05, 0.75), rtol=1e-5)
+        np.testing.assert_allclose(local_response_normalization(x), loop_lrn(x, 5, 1.0, 1.0, 0.5), rtol=1e-5)
+
+    def test_max_pool(self):
+        x = self.random.randn(2, 13, 13, 3).astype(np.float32)
+        np.testing.assert_array_equal(max_pool(x, 3, 3, 2, 2), loop_max_pool(x, 3, 3, 2, 2))
+
+    def test_dense_model_matches_the_patch_model(self):
+        # a 224x224 image is a single cell of the dense map
+        M = model(small_weights(self.random))
+        image = self.random.uniform(-111, 144, size=(1, 224, 224, 3)).astype(np.float32)
+        fc8 = M.gen_model(image)
+        self.assertEqual(fc8.shape, (1, 18))
+        dense = M.gen_dense_model(image)
+        self.assertEqual(dense.shape, (1, 1, 1, 18))
+        np.testing.assert_allclose(dense[0, 0, 0], fc8[0], rtol=1e-4, atol=1e-4)
+
+    def test_batches_are_chunked(self):
+        G = grasp_obj()
+        G.M = model(small_weights(self.random))
+        Is = self.random.uniform(-111, 144, size=(CHUNK_SIZE + 3, 224, 224, 3)).astype(np.float32)
+        np.testing.assert_allclose(G.test_one_batch(Is), G.M.gen_model(Is), rtol=1e-4, atol=1e-4)
+
+
+if __name__ == '__main__':
+    unittest.main()
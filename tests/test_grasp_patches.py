@@ -0,0 +1,69 @@
+'''
+Bulk patch sampling of Predictors: the integral image contrast matches the
+pixels, and the resized patches match a plain crop and resize. Run with
+"python -m pytest tests".
+'''
+import os
+import sys
+import unittest
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Grasp_locater'))
+
+from grasp_predictor import Predictors, MIN_PATCH_STD
+
+PATCH_SIZE = 60
+IMAGE_SIZE = 32
+
+
+class Grasp_Patches_Test(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(0)
+        # plain left half, noisy right half
+        I = np.full((120, 160, 3), 100, dtype=np.uint8)
+        I[:, 80:] = np.random.randint(0, 256, size=(120, 80, 3))
+        self.predictor = Predictors(I)
+
+    def test_patch_std(self):
+        self.predictor.init_integral()
+        tops = np.array([0, 10, 50, 57])
+        lefts = np.array([0, 30, 90, 97])
+        expected = [self.predictor.I[top:top + PATCH_SIZE, left:left + PATCH_SIZE].astype(np.float64).std()
+                    for top, left in zip(tops, lefts)]
+        np.testing.assert_allclose(self.predictor.patch_std(tops, lefts, PATCH_SIZE), expected, atol=1e-6)
+
+    def test_patches_have_contrast(self):
+        self.predictor.init_integral()
+        tops, lefts = self.predictor.sample_patches(50, PATCH_SIZE)
+        self.assertTrue(np.all(self.predictor.patch_std(tops, lefts, PATCH_SIZE) > MIN_PATCH_STD))
+        self.assertTrue(np.all(tops + PATCH_SIZE < self.predictor.I_h))
+        self.assertTrue(np.all(lefts + PATCH_SIZE < self.predictor.I_w))
+
+    def test_plain_image(self):
+        # no patch has enough contrast, the sampling must still end
+        predictor = Predictors(np.full((120, 160, 3), 100, dtype=np.uint8))
+        patch_hs, patch_ws, patch_Is, patch_Is_resized = predictor.prepare_patches(8, PATCH_SIZE, IMAGE_SIZE)
+        self.assertEqual(len(patch_Is), 8)
+        np.testing.assert_array_equal(patch_Is_resized, -11)
+
+    def test_prepare_patches(self):
+        patch_hs, patch_ws, patch_Is, patch_Is_resized = self.predictor.prepare_patches(16, PATCH_SIZE, IMAGE_SIZE)
+        self.assertEqual(patch_Is_resized.shape, (16, IMAGE_SIZE, IMAGE_SIZE, 3))
+        self.assertEqual(patch_Is_resized.dtype, np.float32)
+        half_patch_size = PATCH_SIZE // 2 + 1
+        for patch_h, patch_w, patch_I, patch_I_resized in zip(patch_hs, patch_ws, patch_Is, patch_Is_resized):
+            top, left = patch_h - half_patch_size, patch_w - half_patch_size
+            crop = self.predictor.I[top:top + PATCH_SIZE, left:left + PATCH_SIZE]
+            np.testing.assert_array_equal(patch_I, crop)
+            expected = cv2.resize(crop.astype(np.float32), (IMAGE_SIZE, IMAGE_SIZE),
+                                  interpolation=cv2.INTER_CUBIC) - 111
+            np.testing.assert_allclose(patch_I_resized, expected, atol=1e-4)
+
+        # the buffer is reused by the next call with the same number of samples
+        self.assertIs(self.predictor.prepare_patches(16, PATCH_SIZE, IMAGE_SIZE)[3], patch_Is_resized)
+
+
+if __name__ == '__main__':
+    unittest.main()
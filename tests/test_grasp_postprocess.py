@@ -0,0 +1,82 @@
+'''
+Predictors.postprocess (np.roll smoothing and np.partition top-k) against a
+loop reference of the circular convolution, full sort and sampling. Run with
+"python -m pytest tests".
+'''
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Grasp_locater'))
+
+from grasp_predictor import Predictors, ANGLE_WEIGHTS, NO_KEEP
+
+
+def loop_smooth(fc8_vals):
+    # every angle with its two neighbours, wrapping around, read from a copy of the input
+    num_samples, num_angle = fc8_vals.shape
+    wf = ANGLE_WEIGHTS
+    fc8_norm_vals = np.empty(fc8_vals.shape)
+    for looper in range(num_samples):
+        for norm_looper in range(num_angle):
+            fc8_norm_vals[looper, norm_looper] = (wf[1]*fc8_vals[looper, norm_looper] +
+                                                  wf[0]*fc8_vals[looper, (norm_looper-1) % num_angle] +
+                                                  wf[2]*fc8_vals[looper, (norm_looper+1) % num_angle])
+    return fc8_norm_vals
+
+
+def loop_prob_map(fc8_norm_vals):
+    # sigmoid, full sort and top-k as in the original code
+    fc8_sig = 1 / (1 + np.exp(-fc8_norm_vals))
+    r = np.sort(fc8_sig, axis=None)
+    fc8_sig[fc8_sig < r[-NO_KEEP]] = 0.0
+    return fc8_sig/fc8_sig.sum()
+
+
+class Grasp_Postprocess_Test(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(0)
+        self.predictor = Predictors(np.zeros((10, 10, 3), dtype=np.uint8))
+        self.fc8_vals = np.random.randn(128, 18)
+
+    def test_smooth_angles(self):
+        np.testing.assert_allclose(self.predictor.smooth_angles(self.fc8_vals), loop_smooth(self.fc8_vals))
+
+    def test_prob_map(self):
+        fc8_norm_vals = loop_smooth(self.fc8_vals)
+        prob_map = self.predictor.to_prob_map(fc8_norm_vals)
+        np.testing.assert_allclose(prob_map, loop_prob_map(fc8_norm_vals))
+        self.assertEqual(np.count_nonzero(prob_map), NO_KEEP)
+
+    def test_postprocess(self):
+        fc8_vals = self.fc8_vals.copy()
+        for _ in range(20):
+            patch_id, theta_id = self.predictor.postprocess(fc8_vals)
+            self.assertGreater(loop_prob_map(loop_smooth(self.fc8_vals))[patch_id, theta_id], 0)
+        # the predictions are left as they are, the buffers are reused
+        np.testing.assert_array_equal(fc8_vals, self.fc8_vals)
+        norm_vals = self.predictor.fc8_norm_vals
+        self.predictor.postprocess(fc8_vals)
+        self.assertIs(self.predictor.fc8_norm_vals, norm_vals)
+        np.testing.assert_allclose(self.predictor.fc8_prob_vals, loop_prob_map(loop_smooth(self.fc8_vals)))
+
+    def test_sampling_follows_the_map(self):
+        # two kept grasps, drawn about as often as their probability says
+        prob_map = np.zeros((4, 18))
+        prob_map[1, 3] = 0.25
+        prob_map[2, 17] = 0.75
+        draws = [self.predictor.sample_from_map(prob_map) for _ in range(2000)]
+        self.assertEqual(set(draws), set([(1, 3), (2, 17)]))
+        self.assertAlmostEqual(draws.count((2, 17)) / 2000.0, 0.75, delta=0.05)
+
+    def test_fewer_values_than_kept(self):
+        fc8_vals = np.random.randn(1, 18)
+        prob_map = self.predictor.to_prob_map(self.predictor.smooth_angles(fc8_vals))
+        self.assertEqual(np.count_nonzero(prob_map), 18)
+        self.assertAlmostEqual(prob_map.sum(), 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+'''
+Grasp_Server batching, its error path and the socket protocol, with a
+stand-in learner. Run with "python -m pytest tests".
+'''
+import os
+import sys
+import json
+import socket
+import struct
+import threading
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Grasp_locater'))
+
+from grasp_server import Grasp_Server, Grasp_Socket_Server, request_grasps, send_message, recv_message
+
+
+class Stand_In_Learner():
+    # scores angle t of a patch by its contrast times -(t - 9)^2, so angle 9 always wins
+    BATCH_SIZE = 64
+    IMAGE_SIZE = 32
+    NUM_CHANNELS = 3
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.batches = []
+
+    def test_one_batch(self, Is):
+        if self.fail:
+            raise RuntimeError("inference failed")
+        self.batches.append(Is.copy())
+        return -np.abs(Is).mean(axis=(1, 2, 3))[:, np.newaxis] * (np.arange(18) - 9) ** 2 / 1000.0
+
+
+def random_image(seed=0):
+    return np.random.RandomState(seed).randint(0, 255, (200, 200, 3)).astype(np.uint8)
+
+
+class Grasp_Server_Test(unittest.TestCase):
+    def test_requests_share_batches(self):
+        learner = Stand_In_Learner()
+        # a long budget, only a full batch starts the inference
+        server = Grasp_Server(learner, latency_budget=10.0)
+        try:
+            futures = [server.submit(random_image(seed), num_samples=32, patch_size=60, nbest=5) for seed in range(4)]
+            results = [future.result(5) for future in futures]
+        finally:
+            server.close()
+        self.assertEqual(len(learner.batches), 2)
+        metrics = server.metrics()
+        self.assertEqual(metrics['batches'], 2)
+        self.assertEqual(metrics['completed_requests'], 4)
+        self.assertEqual(metrics['batch_fill']['mean'], 1.0)
+        for grasps in results:
+            self.assertEqual(len(grasps), 5)
+            scores = [grasp['score'] for grasp in grasps]
+            self.assertEqual(scores, sorted(scores, reverse=True))
+            self.assertTrue(all(grasp['theta'] == 9 for grasp in grasps))
+
+    def test_partial_batch_runs_after_budget(self):
+        learner = Stand_In_Learner()
+        server = Grasp_Server(learner, latency_budget=0.01)
+        try:
+            grasps = server.grasp(random_image(), num_samples=10, patch_size=60, nbest=3)
+        finally:
+            server.close()
+        self.assertEqual(len(grasps), 3)
+        self.assertEqual(server.metrics()['batch_fill']['mean'], 10 / 64.0)
+
+    def test_inference_error_fails_the_requests(self):
+        server = Grasp_Server(Stand_In_Learner(fail=True), latency_budget=0.01)
+        try:
+            future = server.submit(random_image(), num_samples=10, patch_size=60)
+            with self.assertRaisesRegex(RuntimeError, 'inference failed'):
+                future.result(5)
+        finally:
+            server.close()
+
+    def test_submit_after_close_is_cancelled(self):
+        server = Grasp_Server(Stand_In_Learner())
+        server.close()
+        self.assertTrue(server.submit(random_image(), num_samples=10, patch_size=60).cancelled())
+
+
+class Grasp_Socket_Test(unittest.TestCase):
+    def setUp(self):
+        self.server = Grasp_Server(Stand_In_Learner(), latency_budget=0.01)
+        self.socket_server = Grasp_Socket_Server(('127.0.0.1', 0), self.server)
+        self.address = self.socket_server.server_address
+        self.thread = threading.Thread(target=self.socket_server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.socket_server.shutdown()
+        self.socket_server.server_close()
+        self.server.close()
+
+    def raw_request(self, data, shutdown=False):
+        # send raw bytes, return the reply
+        sock = socket.create_connection(self.address)
+        sock.settimeout(5)
+        try:
+            sock.sendall(data)
+            if shutdown:
+                sock.shutdown(socket.SHUT_WR)
+            return recv_message(sock)
+        finally:
+            sock.close()
+
+    def test_request(self):
+        grasps = request_grasps(self.address, random_image(), num_samples=10, patch_size=60, nbest=2)
+        self.assertEqual(len(grasps), 2)
+
+    def test_malformed_json(self):
+        data = b'{"shape": [2, 2'
+        reply = self.raw_request(struct.pack('>I', len(data)) + data)
+        self.assertIn('Malformed header', reply['error'])
+
+    def test_missing_and_invalid_shape(self):
+        for header in ({'nbest': 3}, {'shape': [2, -2, 3]}, {'shape': 'big'}, [1, 2]):
+            data = json.dumps(header).encode('utf-8')
+            reply = self.raw_request(struct.pack('>I', len(data)) + data)
+            self.assertIn('error', reply)
+
+    def test_short_body(self):
+        data = json.dumps({'shape': [10, 10, 3]}).encode('utf-8')
+        reply = self.raw_request(struct.pack('>I', len(data)) + data + b'\0' * 20, shutdown=True)
+        self.assertIn('Connection closed', reply['error'])
+
+
+if __name__ == '__main__':
+    unittest.main()
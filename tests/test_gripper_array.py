@@ -0,0 +1,61 @@
+'''
+GripperArray on an emulated bus: tick() reports motion until every gripper has
+reached its goal and flags the grippers whose read failed. Run with
+"python -m pytest tests" (POSIX only, the bus is served on a pseudo terminal).
+'''
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Servo_Emulator import *
+from UCD_Hand import GripperArray
+
+TICK_TIMEOUT = 5.0  # sec
+
+
+@unittest.skipIf(os.name != 'posix', "Pty_Bus needs a pseudo terminal")
+class Gripper_Array_Test(unittest.TestCase):
+    def setUp(self):
+        self.servos = [MX28_Emulator(1), MX28_Emulator(2)]
+        self.pty_bus = Pty_Bus(Emulated_Bus(self.servos))
+        port_name = self.pty_bus.start()
+        self.grippers = GripperArray([(port_name, 1), (port_name, 2)], limits=[(2300, 2000), (2200, 1900)])
+
+    def tearDown(self):
+        self.grippers.shutdown()
+        self.pty_bus.stop()
+
+    def test_tick_until_settled(self):
+        self.assertEqual(self.grippers.position.tolist(), [2048, 2048])
+        self.assertEqual(self.grippers.goals.tolist(), [2048, 2048])
+        self.assertFalse(self.grippers.tick())
+
+        self.grippers.close()
+        self.assertTrue(self.grippers.tick())
+        deadline = time.monotonic() + TICK_TIMEOUT
+        while self.grippers.tick():
+            self.assertLess(time.monotonic(), deadline)
+
+        self.assertTrue(self.grippers.read_ok.all())
+        self.assertFalse(self.grippers.moving.any())
+        self.assertEqual([servo.read_value(ADDR_MX_GOAL_POSITION, 2) for servo in self.servos], [2300, 2200])
+        for position, goal in zip(self.grippers.position, [2300, 2200]):
+            self.assertLessEqual(abs(position - goal), POSITION_TOLERANCE)
+
+    def test_failed_read(self):
+        self.servos[1].timeout_rate = 1.0
+        self.grippers.open([0])
+        self.assertIsNone(self.grippers.tick())
+        self.assertFalse(self.grippers.read_ok.any())
+
+        self.servos[1].timeout_rate = 0.0
+        self.assertTrue(self.grippers.tick())
+        self.assertTrue(self.grippers.read_ok.all())
+        self.assertEqual(self.grippers.moving.tolist(), [True, False])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+'''
+SYNC_WRITE and BULK_READ packets of sync_write_goal and bulk_read_status. Run
+with "python -m pytest tests".
+'''
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Servo_Emulator import *
+
+
+class Group_Packets_Test(unittest.TestCase):
+    def setUp(self):
+        self.servos = [MX28_Emulator(1), MX28_Emulator(2)]
+        self.port = EmulatedPortHandler(Emulated_Bus(self.servos))
+        self.port.openPort()
+        self.port.setBaudRate(57600)
+        self.packet = openpacket()
+
+        # keep a copy of every instruction packet
+        self.written = []
+        write_port = self.port.writePort
+        def record(packet):
+            self.written.append(bytes(bytearray(packet)))
+            return write_port(packet)
+        self.port.writePort = record
+
+    def test_sync_write_packet(self):
+        self.assertTrue(sync_write_goal(self.port, self.packet, {1: (1000, 100, 500), 2: (3000, 0x123, 1023)}))
+        self.assertEqual(len(self.written), 1)
+
+        params = [ADDR_MX_GOAL_POSITION, 6,
+                  1, 0xE8, 0x03, 0x64, 0x00, 0xF4, 0x01,
+                  2, 0xB8, 0x0B, 0x23, 0x01, 0xFF, 0x03]
+        expected = bytearray([0xFF, 0xFF, BROADCAST_ID, len(params) + 2, INST_SYNC_WRITE] + params)
+        expected.append(checksum(expected))
+        self.assertEqual(self.written[0], bytes(expected))
+
+        for servo, (position, speed, torque) in zip(self.servos, [(1000, 100, 500), (3000, 0x123, 1023)]):
+            self.assertEqual(servo.read_value(ADDR_MX_GOAL_POSITION, 2), position)
+            self.assertEqual(servo.read_value(ADDR_MX_MOVING_SPEED, 2), speed)
+            self.assertEqual(servo.read_value(ADDR_MX_TORQUE_LIMIT, 2), torque)
+
+    def test_bulk_read_packet(self):
+        self.servos[0].position = 1000.0
+        self.servos[1].voltage = 11.1
+        for servo in self.servos:
+            servo.update_present()
+
+        status = bulk_read_status(self.port, self.packet, [1, 2])
+        self.assertEqual(len(self.written), 1)
+        params = [0x00,
+                  MX_STATE_LENGTH, 1, ADDR_MX_PRESENT_POSITION,
+                  MX_STATE_LENGTH, 2, ADDR_MX_PRESENT_POSITION]
+        expected = bytearray([0xFF, 0xFF, BROADCAST_ID, len(params) + 2, INST_BULK_READ] + params)
+        expected.append(checksum(expected))
+        self.assertEqual(self.written[0], bytes(expected))
+
+        self.assertEqual(status[1]['position'], 1000)
+        self.assertEqual(status[2]['position'], 2048)
+        self.assertEqual([status[servo_id]['voltage'] for servo_id in (1, 2)], [12.0, 11.1])
+        self.assertEqual([status[servo_id]['moving'] for servo_id in (1, 2)], [0, 0])
+
+    def test_bulk_read_missing_servo(self):
+        self.port.setRetryPolicy(None)
+        self.assertIsNone(bulk_read_status(self.port, self.packet, [1, 3]))
+
+
+if __name__ == '__main__':
+    unittest.main()
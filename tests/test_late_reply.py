@@ -0,0 +1,56 @@
+'''
+A status packet that arrives after its learned timeout must not be taken as the
+answer to the next transaction. Run with "python -m pytest tests".
+'''
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Servo_Emulator import *
+
+
+class Late_Reply_Test(unittest.TestCase):
+    def setUp(self):
+        self.servo = MX28_Emulator(1)
+        self.port = EmulatedPortHandler(Emulated_Bus([self.servo]))
+        self.port.openPort()
+        self.port.setBaudRate(57600)
+        # a retry would resend the same READ, the late packet must be dropped on its own
+        self.port.setRetryPolicy(None)
+        self.packet = openpacket()
+
+    def test_late_reply_is_dropped(self):
+        # learn a slack below LATE_DELAY, it is capped at LATENCY_MAX_SLACK
+        for _ in range(40):
+            self.packet.read2ByteTxRx(self.port, 1, ADDR_MX_PRESENT_POSITION)
+        self.assertLess(self.port.latency_model.getSlack((1, INST_READ)), LATE_DELAY * 1000.0)
+
+        self.servo.inject_fault('late')
+        position, dxl_result, dxl_error = self.packet.read2ByteTxRx(self.port, 1, ADDR_MX_PRESENT_POSITION)
+        self.assertEqual(dxl_result, COMM_RX_TIMEOUT)
+        time.sleep(LATE_DELAY * 1.5)  # the late position is in the input buffer now
+
+        load, dxl_result, dxl_error = self.packet.read2ByteTxRx(self.port, 1, ADDR_MX_LOAD)
+        self.assertEqual(dxl_result, COMM_SUCCESS)
+        self.assertEqual(load, 0)
+        position, dxl_result, dxl_error = self.packet.read2ByteTxRx(self.port, 1, ADDR_MX_PRESENT_POSITION)
+        self.assertEqual((position, dxl_result), (2048, COMM_SUCCESS))
+
+    def test_bulk_read_keeps_its_status_packets(self):
+        # the status packets of one BULK_READ follow each other, none may be dropped between them
+        self.servo2 = MX28_Emulator(2)
+        self.port.bus.add_servo(self.servo2)
+        param = [2, 1, ADDR_MX_PRESENT_POSITION, 2, 2, ADDR_MX_PRESENT_POSITION]
+        self.assertEqual(self.packet.bulkReadTx(self.port, param, len(param)), COMM_SUCCESS)
+        time.sleep(0.01)  # both status packets are in the input buffer
+        for servo_id in (1, 2):
+            data, dxl_result, dxl_error = self.packet.readRx(self.port, servo_id, 2)
+            self.assertEqual((bytes(data), dxl_result), (b'\x00\x08', COMM_SUCCESS))
+        self.port.is_using = False
+
+
+if __name__ == '__main__':
+    unittest.main()
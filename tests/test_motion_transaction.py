@@ -0,0 +1,60 @@
+'''
+REG_WRITE/ACTION through Motion_Transaction: staged servos only move on the
+ACTION, an aborted transaction leaves them where they are. Run with
+"python -m pytest tests".
+'''
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Servo_Emulator import *
+
+
+class Motion_Transaction_Test(unittest.TestCase):
+    def setUp(self):
+        self.emulated = [MX28_Emulator(1), MX28_Emulator(2)]
+        self.port = EmulatedPortHandler(Emulated_Bus(self.emulated))
+        self.port.openPort()
+        self.port.setBaudRate(57600)
+        self.packet = openpacket()
+        self.servos = [Robotis_Servo(self.port, self.packet, servo_id) for servo_id in (1, 2)]
+        for servo in self.servos:
+            servo.init_joint_mode(1, 4094)
+
+    def goals(self):
+        return [servo.read_value(ADDR_MX_GOAL_POSITION, 2) for servo in self.emulated]
+
+    def test_servos_move_on_action(self):
+        with Motion_Transaction(self.port, self.packet) as motion:
+            self.assertEqual(motion.stage(self.servos[0], 1500, 100), 1)
+            self.assertEqual(motion.stage(self.servos[1], 1200), 1)
+            self.assertEqual(self.goals(), [2048, 2048])
+            self.assertEqual([servo.read_value(ADDR_MX_REGISTERED, 1) for servo in self.emulated], [1, 1])
+
+        self.assertEqual(self.goals(), [1500, 1200])
+        self.assertEqual(self.emulated[0].read_value(ADDR_MX_MOVING_SPEED, 2), 100)
+        self.assertEqual([servo.read_value(ADDR_MX_REGISTERED, 1) for servo in self.emulated], [0, 0])
+        self.assertEqual(self.servos[0].read_goal_position(), 1500)
+
+    def test_staging_again_replaces_the_write(self):
+        with Motion_Transaction(self.port, self.packet) as motion:
+            motion.stage(self.servos[0], 1500)
+            motion.stage(self.servos[0], 1000)
+            self.assertEqual(motion.staged, [self.servos[0]])
+        self.assertEqual(self.goals(), [1000, 2048])
+
+    def test_aborted_transaction_does_not_move(self):
+        with self.assertRaises(RuntimeError):
+            with Motion_Transaction(self.port, self.packet) as motion:
+                motion.stage(self.servos[0], 1500)
+                raise RuntimeError("planning failed")
+
+        # an ACTION sent later, e.g. by another transaction, must not start the aborted move
+        self.assertEqual(self.packet.action(self.port, BROADCAST_ID), COMM_SUCCESS)
+        self.assertEqual(self.goals(), [2048, 2048])
+
+
+if __name__ == '__main__':
+    unittest.main()
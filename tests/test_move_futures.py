@@ -0,0 +1,65 @@
+'''
+Futures of PT_O close/open/moveto on an emulated bus: they resolve once the
+fingers have settled, fail on their timeout and are cancelled on disconnect.
+Run with "python -m pytest tests" (POSIX only, the bus is served on a pseudo
+terminal).
+'''
+import os
+import sys
+import unittest
+from concurrent.futures import CancelledError
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Servo_Emulator import *
+import UCD_Hand
+
+MOVE_TIMEOUT = 5.0  # sec
+
+
+@unittest.skipIf(os.name != 'posix', "Pty_Bus needs a pseudo terminal")
+class Move_Futures_Test(unittest.TestCase):
+    def setUp(self):
+        self.emulated = MX28_Emulator(1)
+        self.pty_bus = Pty_Bus(Emulated_Bus([self.emulated]))
+        port_name = self.pty_bus.start()
+        load_calibration = UCD_Hand.load_calibration
+        UCD_Hand.load_calibration = lambda: (2400, 1900)
+        try:
+            self.gripper = UCD_Hand.PT_O(port_name, 1)
+        finally:
+            UCD_Hand.load_calibration = load_calibration
+
+    def tearDown(self):
+        self.gripper.disconnect()
+        self.pty_bus.stop()
+
+    def test_close_resolves_when_settled(self):
+        move = self.gripper.close(speed=300, timeout=MOVE_TIMEOUT)
+        self.assertFalse(move.done())
+        state = move.result(MOVE_TIMEOUT)
+        self.assertLessEqual(abs(state.position - 2400), UCD_Hand.POSITION_TOLERANCE)
+        self.assertIs(self.gripper.wait_until_settled(), state)
+
+        state = self.gripper.moveto(2000, speed=300).result(MOVE_TIMEOUT)
+        self.assertLessEqual(abs(state.position - 2000), UCD_Hand.POSITION_TOLERANCE)
+
+    def test_move_times_out(self):
+        move = self.gripper.close(speed=20, timeout=0.2)
+        with self.assertRaises(TimeoutError):
+            move.result(MOVE_TIMEOUT)
+
+    def test_disconnect_cancels_the_move(self):
+        move = self.gripper.open(speed=20)
+        scheduler = self.gripper.scheduler
+        self.gripper.disconnect()
+        self.assertTrue(move.cancelled())
+        with self.assertRaises(CancelledError):
+            self.gripper.wait_until_settled()
+        # the port went away with its last gripper
+        with self.assertRaisesRegex(IOError, 'is closed'):
+            scheduler.read(1, ADDR_MX_PRESENT_POSITION, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+'''
+RetryPolicy on the emulator: idempotent transactions are sent again after a
+lost or corrupted status packet and after a checksum error, ACTION never is.
+Run with "python -m pytest tests".
+'''
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Servo_Emulator import *
+
+
+class Retry_Policy_Test(unittest.TestCase):
+    def setUp(self):
+        self.servo = MX28_Emulator(1)
+        self.port = EmulatedPortHandler(Emulated_Bus([self.servo]))
+        self.port.openPort()
+        self.port.setBaudRate(57600)
+        self.packet = openpacket()
+
+    def counters(self, name):
+        return self.port.getPacketStats()[name]
+
+    def test_retry_after_timeout(self):
+        self.servo.inject_fault('timeout')
+        position, dxl_result, dxl_error = self.packet.read2ByteTxRx(self.port, 1, ADDR_MX_PRESENT_POSITION)
+        self.assertEqual((position, dxl_result, dxl_error), (2048, COMM_SUCCESS, 0))
+        self.assertEqual(self.counters('retries'), {(1, INST_READ): 1})
+        self.assertEqual(self.counters('comm_errors'), {(1, INST_READ, COMM_RX_TIMEOUT): 1})
+
+    def test_retry_after_corrupt_status(self):
+        self.servo.inject_fault('corrupt')
+        position, dxl_result, dxl_error = self.packet.read2ByteTxRx(self.port, 1, ADDR_MX_PRESENT_POSITION)
+        self.assertEqual((position, dxl_result, dxl_error), (2048, COMM_SUCCESS, 0))
+        self.assertEqual(self.counters('retries'), {(1, INST_READ): 1})
+
+    def test_retry_after_checksum_error(self):
+        # the servo gets one corrupted instruction packet and answers with the checksum error bit
+        write_port = self.port.writePort
+        corrupted = []
+        def corrupt_once(packet):
+            packet = bytearray(packet)
+            if not corrupted:
+                packet[-1] ^= 0xFF
+                corrupted.append(bytes(packet))
+            return write_port(packet)
+        self.port.writePort = corrupt_once
+
+        dxl_result, dxl_error = self.packet.write2ByteTxRx(self.port, 1, ADDR_MX_MOVING_SPEED, 200)
+        self.assertEqual((dxl_result, dxl_error), (COMM_SUCCESS, 0))
+        self.assertEqual(self.servo.read_value(ADDR_MX_MOVING_SPEED, 2), 200)
+        self.assertEqual(self.counters('retries'), {(1, INST_WRITE): 1})
+        self.assertEqual(self.counters('hardware_errors'), {(1, ERRBIT_CHECKSUM): 1})
+
+    def test_attempts_run_out(self):
+        # the timeouts before any latency is learned would hit the default deadline first
+        self.port.setRetryPolicy(RetryPolicy(deadline=1000.0))
+        self.servo.inject_fault('timeout', RETRY_ATTEMPTS)
+        position, dxl_result, dxl_error = self.packet.read2ByteTxRx(self.port, 1, ADDR_MX_PRESENT_POSITION)
+        self.assertEqual(dxl_result, COMM_RX_TIMEOUT)
+        self.assertEqual(self.counters('retries'), {(1, INST_READ): RETRY_ATTEMPTS - 1})
+
+    def test_action_is_not_retried(self):
+        # a second ACTION could start a move staged after the first one
+        self.servo.inject_fault('timeout')
+        self.assertEqual(self.packet.action(self.port, 1), COMM_RX_TIMEOUT)
+        self.assertEqual(self.counters('retries'), {})
+
+    def test_no_attempt_past_the_deadline(self):
+        policy = RetryPolicy(attempts=5, backoff=1.0, deadline=10.0)
+        self.assertEqual(policy.getBackoff(1, 2.0, 2.0), 1.0)
+        self.assertEqual(policy.getBackoff(2, 5.0, 2.5), 2.0)
+        self.assertIsNone(policy.getBackoff(3, 8.0, 2.7))
+        self.assertIsNone(policy.getBackoff(5, 0.0, 0.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+'''
+The Prometheus latency histogram must be cumulative, the recent window is
+published as gauges. Run with "python -m pytest tests".
+'''
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Servo_Emulator import *
+from Servo_Metrics import prometheus_snapshot
+from dynamixel_sdk.latency_model import LatencyModel, LATENCY_MAX_SAMPLES
+
+
+def histogram_count(text):
+    # value of the first dynamixel_status_latency_ms_count sample
+    for line in text.splitlines():
+        if line.startswith('dynamixel_status_latency_ms_count'):
+            return int(line.split()[-1])
+
+
+class Latency_Histogram_Test(unittest.TestCase):
+    def test_totals_never_decay(self):
+        model = LatencyModel()
+        key = (1, INST_READ)
+        for i in range(3 * LATENCY_MAX_SAMPLES):
+            model.addSample(key, 0.5)
+        model.addTimeout(key, 2.0)
+        histogram = model.getHistograms()[key]
+        self.assertEqual(sum(histogram['total_counts']), 3 * LATENCY_MAX_SAMPLES)
+        self.assertAlmostEqual(histogram['total_sum_ms'], 1.5 * LATENCY_MAX_SAMPLES)
+        self.assertLessEqual(histogram['samples'], LATENCY_MAX_SAMPLES + 1)
+
+    def test_snapshot_counts_increase(self):
+        port = EmulatedPortHandler(Emulated_Bus([MX28_Emulator(1)]))
+        port.openPort()
+        port.setBaudRate(57600)
+        packet = openpacket()
+        counts = []
+        for _ in range(3):
+            for _ in range(LATENCY_MAX_SAMPLES // 2 + 1):
+                packet.read2ByteTxRx(port, 1, ADDR_MX_PRESENT_POSITION)
+            text = prometheus_snapshot([port])
+            counts.append(histogram_count(text))
+        self.assertEqual(counts, sorted(counts))
+        self.assertEqual(counts[-1], 3 * (LATENCY_MAX_SAMPLES // 2 + 1))
+        self.assertIn('# TYPE dynamixel_status_latency_recent_ms gauge', text)
+        self.assertIn('dynamixel_status_slack_ms{', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
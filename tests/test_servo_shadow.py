@@ -0,0 +1,56 @@
+'''
+Shadow of the control table in Robotis_Servo: static registers are served and
+skipped from it, registers changed by group writes are not. Run with
+"python -m pytest tests".
+'''
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Servo_Emulator import *
+
+
+class Shadow_Test(unittest.TestCase):
+    def setUp(self):
+        self.emulated = MX28_Emulator(1)
+        self.port = EmulatedPortHandler(Emulated_Bus([self.emulated]))
+        self.port.openPort()
+        self.port.setBaudRate(57600)
+        self.packet = openpacket()
+        self.servo = Robotis_Servo(self.port, self.packet, 1)
+
+    def transactions(self):
+        return sum(self.port.getPacketStats()['transactions'].values())
+
+    def test_static_register_read_once(self):
+        self.assertEqual(self.servo.read_register(ADDR_MX_CW_LIMIT, 2), self.emulated.read_value(ADDR_MX_CW_LIMIT, 2))
+        sent = self.transactions()
+        self.servo.read_register(ADDR_MX_CW_LIMIT, 2)
+        self.assertEqual(self.transactions(), sent)
+
+    def test_equal_write_skipped_until_invalidated(self):
+        self.servo.init_multiturn_mode()
+        sent = self.transactions()
+        self.servo.init_multiturn_mode()
+        self.assertEqual(self.transactions(), sent)
+
+        # changed by another program
+        self.packet.write2ByteTxRx(self.port, 1, ADDR_MX_CW_LIMIT, 0)
+        self.servo.invalidate_cache(ADDR_MX_CW_LIMIT, 2)
+        self.servo.init_multiturn_mode()
+        self.assertEqual(self.emulated.read_value(ADDR_MX_CW_LIMIT, 2), 4095)
+
+    def test_speed_written_after_sync_write(self):
+        self.servo.init_multiturn_mode()
+        self.servo.multiturn_set_speed(100)
+        sync_write_goal(self.port, self.packet, {1: (2048, 300, 1023)})
+        self.assertEqual(self.emulated.read_value(ADDR_MX_MOVING_SPEED, 2), 300)
+        # the shadow still holds 100, the write must not be skipped
+        self.servo.multiturn_set_speed(100)
+        self.assertEqual(self.emulated.read_value(ADDR_MX_MOVING_SPEED, 2), 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
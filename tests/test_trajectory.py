@@ -0,0 +1,77 @@
+'''
+Trajectory_Executor on the emulator: every goal of a profile is sent on time,
+a late tick skips to the goal of the current time. Run with
+"python -m pytest tests".
+'''
+import os
+import sys
+import time
+import types
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from Servo_Emulator import *
+from Trajectory import *
+
+RATE = 100
+
+
+class Trajectory_Test(unittest.TestCase):
+    def setUp(self):
+        self.emulated = MX28_Emulator(1)
+        port = EmulatedPortHandler(Emulated_Bus([self.emulated]))
+        port.openPort()
+        port.setBaudRate(57600)
+        servo = Robotis_Servo(port, openpacket(), 1)
+        servo.init_multiturn_mode()
+        # the executor only needs the servo and the working range of PT_O
+        self.gripper = types.SimpleNamespace(servo=servo, open_limit=2048, close_limit=2448)
+        self.executor = Trajectory_Executor(self.gripper, rate=RATE)
+
+    def test_min_jerk_profile(self):
+        profile = min_jerk_profile(2048, 2448, 0.5, RATE)
+        self.assertEqual(len(profile), 51)
+        self.assertEqual((profile[0], profile[-1]), (2048, 2448))
+        self.assertTrue(np.all(np.diff(profile) >= 0))
+        # no speed at both ends
+        self.assertLess(profile[1] - profile[0], 1)
+        self.assertLess(profile[-1] - profile[-2], 1)
+
+    def test_sample_profile(self):
+        profile = sample_profile([0.0, 0.1, 0.2], [2048, 2148, 2148], RATE)
+        np.testing.assert_allclose(profile, [2048 + 10 * k for k in range(11)] + [2148] * 10)
+
+    def test_profile_is_followed(self):
+        profile = min_jerk_profile(2048, 2448, 0.3, RATE)
+        self.assertEqual(self.executor.run(profile), 1)
+        metrics = self.executor.metrics()
+        self.assertEqual(metrics['ticks'] + metrics['skipped_goals'], len(profile))
+        self.assertEqual(self.emulated.read_value(ADDR_MX_GOAL_POSITION, 2), 2448)
+        self.assertLess(metrics['tracking_error_max'], 50)
+
+    def test_late_tick_skips_goals(self):
+        read_state = self.gripper.servo.read_state
+        def slow_read_state():
+            if self.executor.ticks == 5:
+                time.sleep(5.5 / RATE)
+            return read_state()
+        self.gripper.servo.read_state = slow_read_state
+
+        profile = sample_profile([0.0, 0.2], [2048, 2248], RATE)
+        self.executor.run(profile)
+        metrics = self.executor.metrics()
+        self.assertGreaterEqual(metrics['missed_deadlines'], 1)
+        self.assertGreaterEqual(metrics['skipped_goals'], 4)
+        self.assertEqual(metrics['ticks'] + metrics['skipped_goals'], len(profile))
+        self.assertEqual(self.emulated.read_value(ADDR_MX_GOAL_POSITION, 2), 2248)
+
+    def test_profile_out_of_range(self):
+        self.assertEqual(self.executor.run([2048, 2500]), 0)
+        self.assertEqual(self.executor.ticks, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()